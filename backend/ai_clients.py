@@ -0,0 +1,96 @@
+"""
+Long-lived AI provider clients.
+Created once at startup and closed at shutdown so every frame reuses pooled
+keep-alive (and, when available, HTTP/2) connections instead of paying a new
+TCP and TLS handshake. Base URLs are configurable so both providers can be
+pointed at a local stub server.
+"""
+
+from typing import Any, Optional
+import importlib.util
+import os
+import httpx
+
+from logs import get_logger
+
+logger = get_logger("AI Sentry")
+
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class AIClients:
+    def __init__(self, gemini_api_key: Optional[str], openrouter_api_key: Optional[str]):
+        self.gemini_api_key = gemini_api_key
+        self.openrouter_api_key = openrouter_api_key
+        self.http2 = os.getenv("AI_HTTP2", "1") != "0" and _http2_available()
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", "30")),
+        )
+        self.timeout = httpx.Timeout(
+            float(os.getenv("AI_HTTP_TIMEOUT", "30")),
+            connect=float(os.getenv("AI_HTTP_CONNECT_TIMEOUT", "5")),
+        )
+        self.openrouter: Optional[httpx.AsyncClient] = None
+        self.gemini_client: Any = None
+        # The models API of the Gemini client, used for generate_content
+        self.gemini: Any = None
+
+    async def start(self):
+        if self.openrouter_api_key and self.openrouter is None:
+            self.openrouter = httpx.AsyncClient(
+                base_url=OPENROUTER_BASE_URL,
+                headers={
+                    "Authorization": f"Bearer {self.openrouter_api_key}",
+                    "Content-Type": "application/json",
+                },
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout,
+            )
+            logger.info("OpenRouter client ready (%s, http2=%s)", OPENROUTER_BASE_URL, self.http2)
+
+        if self.gemini_api_key and self.gemini_client is None:
+            try:
+                from google import genai
+                from google.genai import types
+                http_options = types.HttpOptions(
+                    base_url=GEMINI_BASE_URL,
+                    timeout=int(self.timeout.read * 1000),
+                )
+                self.gemini_client = genai.Client(api_key=self.gemini_api_key, http_options=http_options)
+                self.gemini = self.gemini_client.models
+                logger.info("Gemini AI initialized successfully")
+            except ImportError as e:
+                logger.warning("google-genai package not installed - %s. Run: pip install google-genai>=1.59.0", e)
+            except Exception as e:
+                logger.warning("Failed to initialize Gemini: %s. Check if GEMINI_API_KEY is valid", e)
+
+    async def close(self):
+        if self.openrouter is not None:
+            await self.openrouter.aclose()
+            self.openrouter = None
+        if self.gemini_client is not None:
+            close = getattr(self.gemini_client, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception as e:
+                    logger.warning("Failed to close Gemini client: %s", e)
+            self.gemini_client = None
+            self.gemini = None
+
+    def stats(self) -> dict:
+        return {
+            "http2": self.http2,
+            "openrouter_base_url": OPENROUTER_BASE_URL,
+            "gemini_base_url": GEMINI_BASE_URL,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+        }
@@ -0,0 +1,244 @@
+"""
+Alert aggregation for AI Sentry.
+Each stream has a small state machine instead of one alert per positive
+frame: an alert opens once ALERT_OPEN_HITS of the last ALERT_WINDOW_FRAMES
+analyzed frames were positive, further detections update that alert (at most
+once per ALERT_UPDATE_INTERVAL_SECONDS unless a new threat type appears), and
+it closes after ALERT_QUIET_SECONDS without a detection. A stream's state is
+dropped once it has had no open alert and no frames for that long. Recent
+alerts are kept in a bounded ring buffer so a reconnecting dashboard can
+catch up.
+"""
+
+from typing import Callable, Deque, Dict, List, Optional
+from collections import OrderedDict, deque
+from datetime import datetime
+import asyncio
+import os
+import time
+import uuid
+
+from logs import get_logger
+
+logger = get_logger("AI Sentry")
+
+ALERT_OPENED = "alert_opened"
+ALERT_UPDATED = "alert_updated"
+ALERT_CLOSED = "alert_closed"
+
+# Display names for detection types, in the order they are listed
+THREAT_LABELS = {"suspect": "Suspect Detected", "gun": "NERF Toy Blaster Detected"}
+
+
+def threat_label(detection_types: List[str]) -> str:
+    """Combined alert message, e.g. "Suspect Detected + NERF Toy Blaster Detected"."""
+    order = list(THREAT_LABELS)
+    ranked = sorted(detection_types, key=lambda t: order.index(t) if t in order else len(order))
+    return " + ".join(THREAT_LABELS.get(t, t) for t in ranked)
+
+
+class _Alert:
+    def __init__(self, stream_id: str, latitude: float, longitude: float, detection_types: List[str]):
+        self.id = uuid.uuid4().hex[:12]
+        self.stream_id = stream_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.detection_types: List[str] = list(detection_types)
+        self.opened_at = datetime.now().isoformat()
+        self.updated_at = self.opened_at
+        self.closed_at: Optional[str] = None
+        self.detections = 0
+        self.last_seen = time.monotonic()
+        self.last_sent = self.last_seen
+        self.dirty = False
+
+    def event(self, event_type: str) -> dict:
+        return {
+            "type": event_type,
+            "alert_id": self.id,
+            "stream_id": self.stream_id,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "threat_type": threat_label(self.detection_types),
+            "detection_types": list(self.detection_types),
+            "detections": self.detections,
+            # timestamp is when the alert opened, as it was for single alerts
+            "timestamp": self.opened_at,
+            "updated_at": self.updated_at,
+            "closed_at": self.closed_at,
+        }
+
+
+class _StreamAlerts:
+    def __init__(self, window: int):
+        self.recent: Deque[bool] = deque(maxlen=window)
+        self.pending_types: List[str] = []
+        self.alert: Optional[_Alert] = None
+        self.last_frame = time.monotonic()
+
+
+class AlertAggregator:
+    def __init__(self, emit: Callable[[dict], None]):
+        self.emit = emit
+        self.open_hits = max(1, int(os.getenv("ALERT_OPEN_HITS", "2")))
+        self.window = max(self.open_hits, int(os.getenv("ALERT_WINDOW_FRAMES", "3")))
+        self.quiet_seconds = float(os.getenv("ALERT_QUIET_SECONDS", "30"))
+        self.update_interval = float(os.getenv("ALERT_UPDATE_INTERVAL_SECONDS", "5"))
+        self.history_size = int(os.getenv("ALERT_HISTORY_SIZE", "200"))
+        self.streams: Dict[str, _StreamAlerts] = {}
+        # alert_id -> latest event for that alert (local and from other workers), oldest first
+        self.history: "OrderedDict[str, dict]" = OrderedDict()
+        self.task: Optional[asyncio.Task] = None
+        self.frames = 0
+        self.opened = 0
+        self.updates_sent = 0
+        self.updates_coalesced = 0
+        self.closed = 0
+
+    def _send(self, alert: _Alert, event_type: str):
+        alert.last_sent = time.monotonic()
+        alert.dirty = False
+        event = alert.event(event_type)
+        # emit may add to the event (e.g. nearby cameras); history keeps what dashboards got
+        self.emit(event)
+        self.remember(event)
+
+    def remember(self, event: dict):
+        """Keep the latest state of an alert in the ring buffer."""
+        alert_id = event["alert_id"]
+        self.history.pop(alert_id, None)
+        self.history[alert_id] = {k: v for k, v in event.items() if k != "type"}
+        while len(self.history) > self.history_size:
+            self.history.popitem(last=False)
+
+    def observe(self, stream_id: str, latitude: float, longitude: float, detection_types: List[str]) -> Optional[str]:
+        """Feed one analyzed frame. Returns the ID of the stream's open alert, if any."""
+        self.frames += 1
+        state = self.streams.get(stream_id)
+        if state is None:
+            state = self.streams[stream_id] = _StreamAlerts(self.window)
+        state.last_frame = time.monotonic()
+        positive = bool(detection_types)
+        state.recent.append(positive)
+        alert = state.alert
+
+        if alert is None:
+            if not positive:
+                if not any(state.recent):
+                    state.pending_types = []
+                return None
+            for t in detection_types:
+                if t not in state.pending_types:
+                    state.pending_types.append(t)
+            if sum(state.recent) < self.open_hits:
+                return None
+            alert = state.alert = _Alert(stream_id, latitude, longitude, state.pending_types)
+            alert.detections = sum(state.recent)
+            state.pending_types = []
+            self.opened += 1
+            logger.info("Alert %s opened on %s: %s", alert.id, stream_id, threat_label(alert.detection_types))
+            self._send(alert, ALERT_OPENED)
+            return alert.id
+
+        if not positive:
+            return alert.id
+        now = time.monotonic()
+        new_types = [t for t in detection_types if t not in alert.detection_types]
+        alert.detection_types.extend(new_types)
+        alert.detections += 1
+        alert.last_seen = now
+        alert.latitude, alert.longitude = latitude, longitude
+        alert.updated_at = datetime.now().isoformat()
+        if new_types or now - alert.last_sent >= self.update_interval:
+            self.updates_sent += 1
+            self._send(alert, ALERT_UPDATED)
+        else:
+            # Sent by tick() once the interval has passed, if no close comes first
+            alert.dirty = True
+            self.updates_coalesced += 1
+        return alert.id
+
+    def is_hot(self, stream_id: str) -> bool:
+        """Whether the stream has an open alert or a positive frame among its recent ones."""
+        state = self.streams.get(stream_id)
+        return state is not None and (state.alert is not None or any(state.recent))
+
+    def close_stream(self, stream_id: str):
+        """Close a stream's alert right away (e.g. the broadcast ended)."""
+        state = self.streams.pop(stream_id, None)
+        if state is not None and state.alert is not None:
+            self._close(state.alert)
+
+    def _close(self, alert: _Alert):
+        alert.closed_at = datetime.now().isoformat()
+        self.closed += 1
+        logger.info("Alert %s closed on %s after %d detections", alert.id, alert.stream_id, alert.detections)
+        self._send(alert, ALERT_CLOSED)
+
+    def tick(self):
+        """Close quiet alerts, send coalesced updates that are due and forget idle streams."""
+        now = time.monotonic()
+        for stream_id, state in list(self.streams.items()):
+            alert = state.alert
+            if alert is None:
+                # Streams analyzed here but broadcast elsewhere never get close_stream()
+                if now - state.last_frame >= self.quiet_seconds:
+                    del self.streams[stream_id]
+                continue
+            if now - alert.last_seen >= self.quiet_seconds:
+                state.alert = None
+                state.recent.clear()
+                self._close(alert)
+            elif alert.dirty and now - alert.last_sent >= self.update_interval:
+                self.updates_sent += 1
+                self._send(alert, ALERT_UPDATED)
+
+    def recent(self, limit: int = 50, stream_id: Optional[str] = None, open_only: bool = False) -> List[dict]:
+        """Most recently changed alerts first."""
+        alerts = []
+        for alert in reversed(self.history.values()):
+            if stream_id is not None and alert["stream_id"] != stream_id:
+                continue
+            if open_only and alert["closed_at"] is not None:
+                continue
+            alerts.append(alert)
+            if len(alerts) >= limit:
+                break
+        return alerts
+
+    async def _run(self):
+        interval = max(0.2, min(1.0, self.quiet_seconds / 10))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("Alert tick failed: %s", e)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def stats(self) -> dict:
+        return {
+            "open_hits": self.open_hits,
+            "window_frames": self.window,
+            "quiet_seconds": self.quiet_seconds,
+            "frames": self.frames,
+            "open": sum(1 for s in self.streams.values() if s.alert is not None),
+            "streams": len(self.streams),
+            "opened": self.opened,
+            "updates_sent": self.updates_sent,
+            "updates_coalesced": self.updates_coalesced,
+            "closed": self.closed,
+            "history": len(self.history),
+        }
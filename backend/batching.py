@@ -0,0 +1,141 @@
+"""
+Cross-stream micro-batching for AI Sentry.
+Frames from different streams arriving within a short window are sent to a
+provider as one multi-image request; per-image GUN/SUSPECT verdicts are
+parsed back and handed to each waiting caller.
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+from dataclasses import dataclass
+import asyncio
+import os
+import re
+
+from logs import get_logger
+from preprocess import Frame
+from providers import ProviderRouter
+
+logger = get_logger("AI Sentry")
+
+_VERDICT_LINE = re.compile(r"IMAGE\s*#?\s*(\d+)\s*[:\-=]\s*(.+)", re.IGNORECASE)
+
+
+def parse_batch_answer(text: str, count: int) -> Optional[List[str]]:
+    """Per-image verdicts from 'IMAGE n: ...' lines, or None if any image is missing."""
+    verdicts: Dict[int, str] = {}
+    for line in text.splitlines():
+        match = _VERDICT_LINE.search(line)
+        if match:
+            verdicts[int(match.group(1))] = match.group(2).strip().upper()
+    if any(i not in verdicts for i in range(1, count + 1)):
+        return None
+    return [verdicts[i] for i in range(1, count + 1)]
+
+
+@dataclass
+class _BatchItem:
+    stream_id: str
+    frame: Frame
+    future: asyncio.Future
+
+
+class FrameBatcher:
+    def __init__(self, router: ProviderRouter):
+        self.router = router
+        self.enabled = os.getenv("AI_BATCH_ENABLED", "0") == "1"
+        self.window = float(os.getenv("AI_BATCH_WINDOW_MS", "150")) / 1000
+        self.max_size = int(os.getenv("AI_BATCH_MAX_SIZE", "4"))
+        self.fallback_single = os.getenv("AI_BATCH_FALLBACK_SINGLE", "1") != "0"
+        self.items: List[_BatchItem] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        # Running batches, referenced so the loop cannot garbage-collect them mid-flight
+        self.tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.batched_frames = 0
+        self.fallbacks = 0
+
+    async def analyze(self, stream_id: str, frame: Frame) -> Tuple[str, str]:
+        """Analyze a frame, batched with other streams' frames when enabled. Returns (answer, provider)."""
+        if not self.enabled or self.max_size <= 1:
+            return await self.router.analyze(frame)
+
+        future = asyncio.get_running_loop().create_future()
+        self.items.append(_BatchItem(stream_id, frame, future))
+        if len(self.items) >= self.max_size:
+            self._flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        items, self.items = self.items, []
+        if items:
+            task = asyncio.create_task(self._run(items))
+            self.tasks.add(task)
+            task.add_done_callback(lambda t: self._done(t, items))
+
+    def _done(self, task: asyncio.Task, items: List[_BatchItem]):
+        self.tasks.discard(task)
+        error = None if task.cancelled() else task.exception()
+        if error is not None:
+            logger.error("Batch of %d frames failed: %r", len(items), error)
+        # Don't leave callers waiting on a batch that died or was cancelled
+        for item in items:
+            if item.future.done():
+                continue
+            if error is not None:
+                item.future.set_exception(error)
+            else:
+                item.future.cancel()
+
+    async def _run(self, items: List[_BatchItem]):
+        if len(items) == 1:
+            await self._run_single(items[0])
+            return
+
+        try:
+            text, provider = await self.router.analyze_batch([i.frame for i in items])
+            verdicts = parse_batch_answer(text, len(items))
+            if verdicts is None:
+                raise Exception(f"Could not parse batched answer: {text[:200]!r}")
+        except Exception as e:
+            if not self.fallback_single:
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                return
+            logger.warning("Batch of %d failed (%s), falling back to single-frame requests", len(items), e)
+            self.fallbacks += 1
+            await asyncio.gather(*(self._run_single(item) for item in items))
+            return
+
+        self.batches += 1
+        self.batched_frames += len(items)
+        for item, verdict in zip(items, verdicts):
+            if not item.future.done():
+                item.future.set_result((verdict, provider))
+
+    async def _run_single(self, item: _BatchItem):
+        try:
+            result = await self.router.analyze(item.frame)
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window * 1000,
+            "max_size": self.max_size,
+            "fallback_single": self.fallback_single,
+            "batches": self.batches,
+            "batched_frames": self.batched_frames,
+            "fallbacks": self.fallbacks,
+            "waiting": len(self.items),
+        }
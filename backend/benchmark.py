@@ -0,0 +1,481 @@
+"""
+In-process benchmark for the signaling server.
+Drives the FastAPI app directly over ASGI (no sockets): K dashboards, N
+broadcasters with M viewers each exchanging offers, answers, ICE candidates
+and location updates, a burst of alerts, and frames posted to /analyze-frame
+(or streamed over /ws/frames) against a deterministic fake AI provider. Prints one JSON document so runs
+can be compared between commits:
+
+    cd backend && python benchmark.py --broadcasters 20 --viewers 3 --dashboards 10 --output bench.json
+"""
+
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--broadcasters", type=int, default=10, help="streams broadcasting at once")
+    parser.add_argument("--viewers", type=int, default=2, help="viewers per stream")
+    parser.add_argument("--dashboards", type=int, default=10, help="dashboard connections")
+    parser.add_argument("--ice", type=int, default=5, help="ICE candidates sent each way per viewer")
+    parser.add_argument("--location-updates", type=int, default=5, help="update_location messages per broadcaster")
+    parser.add_argument("--alerts", type=int, default=100, help="alerts broadcast in the fan-out phase")
+    parser.add_argument("--frames", type=int, default=200, help="frames posted to /analyze-frame")
+    parser.add_argument("--frame-concurrency", type=int, default=16, help="frame requests in flight at once")
+    parser.add_argument("--frame-transport", choices=("http", "ws"), default="http",
+                        help="post frames to /analyze-frame, or stream them over one /ws/frames socket per stream")
+    parser.add_argument("--frame-bytes", type=int, default=20000, help="size of each posted frame")
+    parser.add_argument("--frame-size", help="post real JPEGs of this size, e.g. 1280x720 (needs Pillow), "
+                                             "instead of --frame-bytes of random data")
+    parser.add_argument("--provider-latency-ms", type=float, default=50, help="fake provider response time")
+    parser.add_argument("--provider-jitter-ms", type=float, default=10, help="uniform jitter added to the latency")
+    parser.add_argument("--threat-ratio", type=float, default=0.05, help="fraction of frames the fake provider flags")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for any one phase")
+    parser.add_argument("--format", choices=("json", "msgpack"), default="json", help="WebSocket wire format")
+    parser.add_argument("--ice-batch", action="store_true", help="let the server batch trickle ICE candidates")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    return parser.parse_args(argv)
+
+
+def summarize(samples: List[float]) -> dict:
+    """Latency percentiles in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Counters:
+    """Named counters that phases can wait on."""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.targets: Dict[str, tuple] = {}
+        self.latencies: Dict[str, List[float]] = {}
+
+    def add(self, name: str, latency: Optional[float] = None):
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if latency is not None:
+            self.latencies.setdefault(name, []).append(latency)
+        target = self.targets.get(name)
+        if target is not None and self.counts[name] >= target[0]:
+            target[1].set()
+
+    async def wait(self, name: str, count: int, timeout: float):
+        event = asyncio.Event()
+        self.targets[name] = (count, event)
+        if self.counts.get(name, 0) >= count:
+            event.set()
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Timed out waiting for {count} {name} (got {self.counts.get(name, 0)})")
+        finally:
+            del self.targets[name]
+
+
+class ASGIWebSocket:
+    """A WebSocket client that talks to the ASGI app directly."""
+
+    def __init__(self, app, path: str, on_message, query: str = ""):
+        self.app = app
+        self.path = path
+        self.query = query
+        self.on_message = on_message
+        self.inbound: asyncio.Queue = asyncio.Queue()
+        self.accepted = asyncio.Event()
+        self.closed = False
+        self.tasks: List[asyncio.Task] = []
+
+    async def _send(self, message: dict):
+        if message["type"] == "websocket.accept":
+            self.accepted.set()
+        elif message["type"] == "websocket.send":
+            if message.get("text") is not None:
+                decoded = json.loads(message["text"])
+            else:
+                import msgpack
+                decoded = msgpack.unpackb(message["bytes"])
+            if decoded.get("type") == "ping":
+                # Answer heartbeats like the browser clients, so long runs are not reaped
+                self.send({"type": "pong"})
+                return
+            self.on_message(self, decoded)
+        elif message["type"] == "websocket.close":
+            self.closed = True
+            self.accepted.set()
+
+    async def connect(self):
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": self.path,
+            "raw_path": self.path.encode(),
+            "query_string": self.query.encode(),
+            "headers": [(b"host", b"benchmark")],
+            "client": ("127.0.0.1", 0),
+            "server": ("benchmark", 80),
+            "subprotocols": [],
+        }
+        self.tasks.append(asyncio.create_task(self.app(scope, self.inbound.get, self._send)))
+        await self.inbound.put({"type": "websocket.connect"})
+        await self.accepted.wait()
+
+    def send(self, message: dict):
+        self.inbound.put_nowait({"type": "websocket.receive", "text": json.dumps(message)})
+
+    def send_bytes(self, data: bytes):
+        self.inbound.put_nowait({"type": "websocket.receive", "bytes": data})
+
+    async def close(self):
+        await self.inbound.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class FakeProvider:
+    """Deterministic stand-in for Gemini/OpenRouter with configurable latency."""
+
+    def __init__(self, latency: float, jitter: float, threat_ratio: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.threat_ratio = threat_ratio
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.bytes_sent = 0
+
+    def verdict(self, image_data: bytes) -> str:
+        # Same frame bytes always get the same answer
+        return "GUN" if (sum(image_data[:64]) % 1000) / 1000 < self.threat_ratio else "CLEAR"
+
+    async def analyze(self, frame) -> str:
+        self.calls += 1
+        self.bytes_sent += len(frame.base64)
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+        return self.verdict(frame.data)
+
+    async def analyze_batch(self, frames: list) -> str:
+        self.calls += 1
+        self.bytes_sent += sum(len(frame.base64) for frame in frames)
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+        return "\n".join(f"IMAGE {i}: {self.verdict(frame.data)}" for i, frame in enumerate(frames, 1))
+
+
+def jpeg_frame(size: str, rng: random.Random) -> bytes:
+    """A camera-like JPEG: smooth gradients plus some noise."""
+    import io
+    from PIL import Image
+
+    width, height = (int(n) for n in size.lower().split("x"))
+    small = Image.new("RGB", (16, 9))
+    small.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(16 * 9)])
+    img = small.resize((width, height), Image.BILINEAR)
+    noise = Image.effect_noise((width, height), 24).convert("RGB")
+    img = Image.blend(img, noise, 0.15)
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=92)
+    return out.getvalue()
+
+
+async def run(args: argparse.Namespace, main) -> dict:
+    import httpx
+    from providers import Provider, ProviderRouter
+
+    rng = random.Random(args.seed)
+    counters = Counters()
+    results: Dict[str, object] = {}
+
+    fake = FakeProvider(args.provider_latency_ms / 1000, args.provider_jitter_ms / 1000, args.threat_ratio, args.seed)
+    router = ProviderRouter([Provider("fake", fake.analyze, analyze_batch=fake.analyze_batch)])
+    main.provider_router = router
+    main.frame_batcher.router = router
+    # /analyze-frame refuses frames when no real provider key is configured
+    main.OPENROUTER_API_KEY = main.OPENROUTER_API_KEY or "benchmark"
+
+    viewer_ids: Dict[str, List[str]] = {}
+    query = f"format={args.format}" + ("&ice_batch=1" if args.ice_batch else "")
+
+    def on_dashboard(ws, message):
+        counters.add(f"dashboard_{message.get('type')}")
+
+    def on_broadcaster(ws, message):
+        kind = message.get("type")
+        if kind == "viewer_joined":
+            viewer_ids.setdefault(ws.path.rsplit("/", 1)[1], []).append(message["viewer_id"])
+            counters.add("viewer_joined")
+        elif kind == "answer":
+            counters.add("answer", time.perf_counter() - float(message["sdp"]))
+        elif kind == "ice_candidate":
+            counters.add("ice_to_broadcaster", time.perf_counter() - message["candidate"]["sent"])
+        elif kind == "ice_candidates":
+            for candidate in message["candidates"]:
+                counters.add("ice_to_broadcaster", time.perf_counter() - candidate["sent"])
+        else:
+            counters.add(kind)
+
+    def on_viewer(ws, message):
+        kind = message.get("type")
+        if kind == "offer":
+            counters.add("offer", time.perf_counter() - float(message["sdp"]))
+            # Answer straight away, like a browser would
+            ws.send({"type": "answer", "sdp": repr(time.perf_counter())})
+        elif kind == "ice_candidate":
+            counters.add("ice_to_viewer", time.perf_counter() - message["candidate"]["sent"])
+        elif kind == "ice_candidates":
+            for candidate in message["candidates"]:
+                counters.add("ice_to_viewer", time.perf_counter() - candidate["sent"])
+        else:
+            counters.add(kind)
+
+    await main.app.router.startup()
+    try:
+        # Connections, measuring traced memory per connection
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+
+        dashboards = [ASGIWebSocket(main.app, "/ws/dashboard", on_dashboard, query) for _ in range(args.dashboards)]
+        for ws in dashboards:
+            await ws.connect()
+        await counters.wait("dashboard_stream_list", args.dashboards, args.timeout)
+
+        stream_ids = [f"bench-{i}" for i in range(args.broadcasters)]
+        broadcasters = [ASGIWebSocket(main.app, f"/ws/broadcast/{sid}", on_broadcaster, query) for sid in stream_ids]
+        for ws in broadcasters:
+            await ws.connect()
+            ws.send({
+                "type": "start_stream",
+                "latitude": rng.uniform(40.6, 40.8),
+                "longitude": rng.uniform(-74.0, -73.9),
+                "notes": "benchmark",
+            })
+        await counters.wait("stream_started", args.broadcasters, args.timeout)
+        await counters.wait("dashboard_stream_added", args.broadcasters * args.dashboards, args.timeout)
+
+        viewers = [
+            ASGIWebSocket(main.app, f"/ws/view/{sid}", on_viewer, query)
+            for sid in stream_ids for _ in range(args.viewers)
+        ]
+        for ws in viewers:
+            await ws.connect()
+        await counters.wait("viewer_joined", len(viewers), args.timeout)
+
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        connections = len(dashboards) + len(broadcasters) + len(viewers)
+        results["connections"] = {
+            "dashboards": len(dashboards),
+            "broadcasters": len(broadcasters),
+            "viewers": len(viewers),
+            "traced_bytes_per_connection": round((after - before) / max(1, connections)),
+        }
+
+        # Signaling: offer -> answer, then ICE both ways, with location updates interleaved
+        viewer_by_id = {}
+        for sid in stream_ids:
+            for viewer_ws, viewer_id in zip([v for v in viewers if v.path.endswith("/" + sid)], viewer_ids.get(sid, [])):
+                viewer_by_id[viewer_id] = viewer_ws
+
+        start = time.perf_counter()
+        for ws, sid in zip(broadcasters, stream_ids):
+            for viewer_id in viewer_ids.get(sid, []):
+                ws.send({"type": "offer", "viewer_id": viewer_id, "sdp": repr(time.perf_counter())})
+        await counters.wait("answer", len(viewers), args.timeout)
+
+        for ws, sid in zip(broadcasters, stream_ids):
+            for i in range(args.location_updates):
+                ws.send({"type": "update_location", "latitude": 40.7 + i * 1e-3, "longitude": -73.95})
+            for viewer_id in viewer_ids.get(sid, []):
+                viewer_ws = viewer_by_id[viewer_id]
+                for i in range(args.ice):
+                    ws.send({"type": "ice_candidate", "viewer_id": viewer_id,
+                             "candidate": {"candidate": f"candidate:{i}", "sent": time.perf_counter()}})
+                    viewer_ws.send({"type": "ice_candidate",
+                                    "candidate": {"candidate": f"candidate:{i}", "sent": time.perf_counter()}})
+        await counters.wait("ice_to_viewer", len(viewers) * args.ice, args.timeout)
+        await counters.wait("ice_to_broadcaster", len(viewers) * args.ice, args.timeout)
+        signaling_elapsed = time.perf_counter() - start
+        if args.location_updates and stream_ids:
+            # Location updates reach dashboards on the next ticker flush
+            await counters.wait("dashboard_stream_positions", args.dashboards, args.timeout)
+        signaling_messages = len(viewers) * (2 + 2 * args.ice) + args.broadcasters * args.location_updates
+        results["signaling"] = {
+            "offer": summarize(counters.latencies.get("offer", [])),
+            "answer": summarize(counters.latencies.get("answer", [])),
+            "ice_to_viewer": summarize(counters.latencies.get("ice_to_viewer", [])),
+            "ice_to_broadcaster": summarize(counters.latencies.get("ice_to_broadcaster", [])),
+            "messages": signaling_messages,
+            "messages_per_second": round(signaling_messages / signaling_elapsed, 1),
+        }
+
+        # Fan-out: one alert to every dashboard, many times
+        alerts_before = counters.counts.get("dashboard_alert_opened", 0)
+        start = time.perf_counter()
+        for i in range(args.alerts):
+            main.broadcast_alert({
+                "type": "alert_opened", "alert_id": f"bench-{i}",
+                "stream_id": stream_ids[i % len(stream_ids)] if stream_ids else "bench",
+                "latitude": 40.7, "longitude": -73.95, "threat_type": "Benchmark",
+                "timestamp": "", "closed_at": None,
+            })
+        await counters.wait("dashboard_alert_opened", alerts_before + args.alerts * args.dashboards, args.timeout)
+        elapsed = time.perf_counter() - start
+        results["fanout"] = {
+            "alerts": args.alerts,
+            "deliveries": args.alerts * args.dashboards,
+            "deliveries_per_second": round(args.alerts * args.dashboards / elapsed, 1),
+            "position_batches_received": counters.counts.get("dashboard_stream_positions", 0),
+        }
+
+        # Frame analysis through the real endpoint against the fake provider
+        frame_latencies: List[float] = []
+        failures = 0
+        superseded = 0
+        semaphore = asyncio.Semaphore(args.frame_concurrency)
+        if args.frame_size:
+            frames = [jpeg_frame(args.frame_size, rng) for _ in range(min(args.frames, 8))]
+        else:
+            frames = [bytes(rng.getrandbits(8) for _ in range(64)) + b"\0" * max(0, args.frame_bytes - 64)
+                      for _ in range(min(args.frames, 64))]
+        if args.frame_transport == "ws":
+            # One socket per stream, each sending its next frame when the previous result arrives
+            replies: Dict[str, asyncio.Queue] = {}
+
+            def on_frames(ws, message):
+                counters.add(f"frames_{message.get('type')}")
+                if message.get("type") in ("result", "error"):
+                    replies[ws.path].put_nowait(message)
+
+            sockets = [ASGIWebSocket(main.app, f"/ws/frames/{sid}", on_frames) for sid in stream_ids or ["bench"]]
+            for ws in sockets:
+                replies[ws.path] = asyncio.Queue()
+                await ws.connect()
+
+            async def stream_frames(index: int, ws: ASGIWebSocket):
+                nonlocal failures
+                for i in range(index, args.frames, len(sockets)):
+                    sent = time.perf_counter()
+                    ws.send_bytes(frames[i % len(frames)])
+                    reply = await asyncio.wait_for(replies[ws.path].get(), args.timeout)
+                    if reply["type"] == "result":
+                        frame_latencies.append(time.perf_counter() - sent)
+                    else:
+                        failures += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(stream_frames(i, ws) for i, ws in enumerate(sockets)))
+            elapsed = time.perf_counter() - start
+            for ws in sockets:
+                await ws.close()
+        else:
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                async def post_frame(i: int):
+                    nonlocal failures, superseded
+                    async with semaphore:
+                        sent = time.perf_counter()
+                        response = await client.post(
+                            "/analyze-frame",
+                            data={"stream_id": stream_ids[i % len(stream_ids)] if stream_ids else "bench"},
+                            files={"frame": ("frame.jpg", frames[i % len(frames)], "image/jpeg")},
+                        )
+                        if response.status_code == 200 and response.json().get("status") == "superseded":
+                            # Replaced by a newer frame of the same stream, never analyzed
+                            superseded += 1
+                        elif response.status_code == 200:
+                            frame_latencies.append(time.perf_counter() - sent)
+                        else:
+                            failures += 1
+
+                start = time.perf_counter()
+                await asyncio.gather(*(post_frame(i) for i in range(args.frames)))
+                elapsed = time.perf_counter() - start
+        results["frames"] = {
+            "posted": args.frames,
+            "failed": failures,
+            "superseded": superseded,
+            "provider_calls": fake.calls,
+            "provider_base64_bytes": fake.bytes_sent,
+            "preprocess": main.frame_preprocessor.stats(),
+            "alerts": main.alert_aggregator.stats(),
+            "transport": args.frame_transport,
+            "rate_messages": counters.counts.get("frames_rate", 0),
+            "frames_per_second": round(len(frame_latencies) / elapsed, 1) if elapsed else None,
+            "latency": summarize(frame_latencies),
+        }
+
+        for ws in viewers + broadcasters + dashboards:
+            await ws.close()
+    finally:
+        await main.app.router.shutdown()
+    return results
+
+
+def main_cli(argv: Optional[List[str]] = None) -> dict:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="alertstream-bench-")
+    # Keep the benchmark self-contained: no real AI keys, no shared bus, scratch database
+    os.environ.update({
+        "GEMINI_API_KEY": "",
+        "OPENROUTER_API_KEY": "",
+        "STATE_BUS_URL": "",
+        "RECORDINGS_DB": os.path.join(workdir, "recordings.db"),
+        "RETENTION_INTERVAL_SECONDS": "0",
+    })
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Startup banners go to stderr so stdout is only the JSON result
+    with contextlib.redirect_stdout(sys.stderr):
+        import main as server
+        results = asyncio.run(run(args, server))
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,388 @@
+"""
+Pub/sub state bus shared by every worker process.
+Signaling, stream-list changes and alerts are published here so that a
+viewer on one worker can reach a broadcaster on another and every dashboard
+sees every alert. The in-process bus is used for a single worker; the Redis
+bus speaks just enough of the Redis protocol (RESP) for PUBLISH/SUBSCRIBE.
+Every worker heartbeats on the bus; one that goes silent for
+STATE_BUS_PEER_TIMEOUT_SECONDS (killed, or cut off from Redis) is reported
+lost so the others can drop the state it owned.
+"""
+
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import unquote, urlsplit
+from collections import deque
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from logs import get_logger
+
+logger = get_logger("Bus")
+
+Handler = Callable[[dict], Awaitable[None]]
+
+BUS_PREFIX = os.getenv("STATE_BUS_PREFIX", "alertstream")
+BUS_QUEUE_SIZE = int(os.getenv("STATE_BUS_QUEUE_SIZE", "10000"))
+BUS_HEARTBEAT_SECONDS = float(os.getenv("STATE_BUS_HEARTBEAT_SECONDS", "5"))
+BUS_PEER_TIMEOUT_SECONDS = float(os.getenv("STATE_BUS_PEER_TIMEOUT_SECONDS", "15"))
+
+HEARTBEAT_CHANNEL = "heartbeat"
+
+
+class Bus:
+    """Base class: local subscribers, ordered dispatch and origin filtering."""
+
+    kind = "base"
+
+    def __init__(self, worker_id: Optional[str] = None, prefix: str = BUS_PREFIX):
+        self.worker_id = worker_id or os.getenv("WORKER_ID") or uuid.uuid4().hex[:8]
+        self.prefix = prefix
+        self.handlers: Dict[str, Handler] = {}
+        # Called whenever the bus (re)connects or a lost worker reappears, e.g. to ask other workers for their state
+        self.on_ready: Optional[Callable[[], None]] = None
+        # Called with the worker_id of a worker that stopped heartbeating, in order with its messages
+        self.on_peer_lost: Optional[Callable[[str], Awaitable[None]]] = None
+        self.heartbeat_interval = BUS_HEARTBEAT_SECONDS
+        self.peer_timeout = BUS_PEER_TIMEOUT_SECONDS
+        # worker_id -> when we last heard from it
+        self.peers: Dict[str, float] = {}
+        self.lost: Set[str] = set()
+        self.inbox: "asyncio.Queue[tuple]" = None
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.heartbeat: Optional[asyncio.Task] = None
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self.handler_errors = 0
+        self.peers_lost = 0
+
+    def channel(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    def subscribe(self, name: str, handler: Handler):
+        """Register the handler for messages other workers publish on a channel. Call before start()."""
+        self.handlers[self.channel(name)] = handler
+
+    def publish(self, name: str, message: dict):
+        """Send a message to every other worker. Never blocks; delivery is best effort."""
+        raise NotImplementedError
+
+    def encode(self, message: dict) -> str:
+        return json.dumps({"origin": self.worker_id, "message": message})
+
+    def deliver(self, channel: str, payload: str):
+        """Queue a received payload for the dispatcher, skipping our own messages."""
+        try:
+            envelope = json.loads(payload)
+        except ValueError:
+            return
+        origin = envelope.get("origin")
+        if origin == self.worker_id:
+            return
+        if origin is not None:
+            self._seen(origin)
+        if channel not in self.handlers:
+            return
+        self.received += 1
+        self.inbox.put_nowait((channel, self.handlers[channel], envelope.get("message")))
+
+    def _seen(self, worker_id: str):
+        self.peers[worker_id] = time.monotonic()
+        if worker_id in self.lost:
+            # Its state was dropped when it went silent; have it announced again
+            self.lost.discard(worker_id)
+            logger.info("Worker %s is back", worker_id)
+            if self.on_ready is not None:
+                self.on_ready()
+
+    def expire_peers(self):
+        """Report workers not heard from within the peer timeout as lost."""
+        deadline = time.monotonic() - self.peer_timeout
+        for worker_id, last_seen in list(self.peers.items()):
+            if last_seen >= deadline:
+                continue
+            del self.peers[worker_id]
+            self.lost.add(worker_id)
+            self.peers_lost += 1
+            logger.warning("Worker %s stopped heartbeating, dropping its state", worker_id)
+            if self.on_peer_lost is not None:
+                # Through the inbox so it is applied after the worker's earlier messages
+                self.inbox.put_nowait(("peer_lost", self.on_peer_lost, worker_id))
+
+    def send_heartbeat(self):
+        self.publish(HEARTBEAT_CHANNEL, {})
+
+    async def _heartbeat(self):
+        while True:
+            self.send_heartbeat()
+            await asyncio.sleep(self.heartbeat_interval)
+            self.expire_peers()
+
+    async def _dispatch(self):
+        # One message at a time so each worker applies changes in publish order
+        while True:
+            channel, handler, message = await self.inbox.get()
+            try:
+                await handler(message)
+            except Exception as e:
+                self.handler_errors += 1
+                logger.error("Handler for %s failed: %s", channel, e)
+
+    async def start(self):
+        self.inbox = asyncio.Queue()
+        self.dispatcher = asyncio.create_task(self._dispatch())
+        if self.heartbeat_interval > 0:
+            self.heartbeat = asyncio.create_task(self._heartbeat())
+
+    def subscribed_channels(self) -> List[str]:
+        return [self.channel(HEARTBEAT_CHANNEL), *self.handlers]
+
+    async def close(self):
+        if self.heartbeat is not None:
+            self.heartbeat.cancel()
+            try:
+                await self.heartbeat
+            except asyncio.CancelledError:
+                pass
+            self.heartbeat = None
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            try:
+                await self.dispatcher
+            except asyncio.CancelledError:
+                pass
+            self.dispatcher = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "worker_id": self.worker_id,
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+            "handler_errors": self.handler_errors,
+            "peers": sorted(self.peers),
+            "peers_lost": self.peers_lost,
+        }
+
+
+class InProcessBroker:
+    """Connects in-process buses; each bus gets its own broker unless one is shared."""
+
+    def __init__(self):
+        self.buses: List["InProcessBus"] = []
+
+
+class InProcessBus(Bus):
+    kind = "in_process"
+
+    def __init__(self, worker_id: Optional[str] = None, prefix: str = BUS_PREFIX, broker: Optional[InProcessBroker] = None):
+        super().__init__(worker_id, prefix)
+        self.broker = broker or InProcessBroker()
+
+    async def start(self):
+        await super().start()
+        self.broker.buses.append(self)
+        if self.on_ready is not None:
+            self.on_ready()
+
+    async def close(self):
+        if self in self.broker.buses:
+            self.broker.buses.remove(self)
+        await super().close()
+
+    def publish(self, name: str, message: dict):
+        channel, payload = self.channel(name), self.encode(message)
+        self.published += 1
+        for bus in self.broker.buses:
+            if bus is not self:
+                bus.deliver(channel, payload)
+
+
+class RedisError(Exception):
+    pass
+
+
+def encode_command(*args: str) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg.encode() if isinstance(arg, str) else arg
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by Redis")
+    prefix, body = line[:1], line[1:-2]
+    if prefix == b"+":
+        return body.decode()
+    if prefix == b"-":
+        raise RedisError(body.decode())
+    if prefix == b":":
+        return int(body)
+    if prefix == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b"*":
+        length = int(body)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unexpected reply: {line!r}")
+
+
+class RedisBus(Bus):
+    """PUBLISH/SUBSCRIBE over two plain connections, reconnecting with backoff."""
+
+    kind = "redis"
+
+    def __init__(self, url: str, worker_id: Optional[str] = None, prefix: str = BUS_PREFIX):
+        super().__init__(worker_id, prefix)
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.username = unquote(parts.username) if parts.username else None
+        self.password = unquote(parts.password) if parts.password else None
+        self.ssl = parts.scheme == "rediss"
+        self.outbox: "deque[tuple]" = deque()
+        self.in_flight = 0
+        self.outbox_ready: Optional[asyncio.Event] = None
+        self.tasks: List[asyncio.Task] = []
+        self.connected = False
+        self.reconnects = 0
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+        if self.password:
+            auth = ["AUTH", self.username, self.password] if self.username else ["AUTH", self.password]
+            writer.write(encode_command(*auth))
+            await writer.drain()
+            await read_reply(reader)
+        return reader, writer
+
+    async def _with_reconnect(self, name: str, session: Callable[[], Awaitable[None]]):
+        delay = 0.5
+        while True:
+            try:
+                await session()
+                delay = 0.5
+            except asyncio.CancelledError:
+                raise
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, RedisError) as e:
+                self.reconnects += 1
+                logger.warning("Redis %s connection lost (%s), retrying in %.1fs", name, e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10.0)
+
+    async def _subscriber(self):
+        reader, writer = await self._connect()
+        try:
+            writer.write(encode_command("SUBSCRIBE", *self.subscribed_channels()))
+            await writer.drain()
+            while True:
+                reply = await read_reply(reader)
+                if not isinstance(reply, list) or not reply:
+                    continue
+                kind = reply[0].decode() if isinstance(reply[0], bytes) else reply[0]
+                if kind == "subscribe":
+                    if not self.connected and self.on_ready is not None:
+                        self.on_ready()
+                    self.connected = True
+                elif kind == "message":
+                    self.deliver(reply[1].decode(), reply[2].decode())
+        finally:
+            # Connected means subscribed: we see other workers' messages (the publisher reconnects on its own)
+            self.connected = False
+            writer.close()
+
+    async def _publisher(self):
+        reader, writer = await self._connect()
+        try:
+            while True:
+                await self.outbox_ready.wait()
+                if reader.at_eof():
+                    # Closed while idle; keep the queued messages for the next connection
+                    raise ConnectionError("Connection closed by Redis")
+                # Pipeline everything queued so far, then collect the replies
+                batch = list(self.outbox)
+                self.outbox.clear()
+                self.outbox_ready.clear()
+                if not batch:
+                    continue
+                self.in_flight = len(batch)
+                try:
+                    writer.write(b"".join(encode_command("PUBLISH", channel, payload) for channel, payload in batch))
+                    await writer.drain()
+                    for _ in batch:
+                        await read_reply(reader)
+                except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                    self.dropped += len(batch)
+                    raise
+                finally:
+                    self.in_flight = 0
+                self.published += len(batch)
+        finally:
+            writer.close()
+
+    async def start(self):
+        await super().start()
+        self.outbox_ready = asyncio.Event()
+        if self.outbox:
+            self.outbox_ready.set()
+        self.tasks = [
+            asyncio.create_task(self._with_reconnect("subscriber", self._subscriber)),
+            asyncio.create_task(self._with_reconnect("publisher", self._publisher)),
+        ]
+        logger.info("Worker %s using Redis at %s:%d", self.worker_id, self.host, self.port)
+
+    async def close(self, drain_seconds: float = 1.0):
+        # Give queued messages (e.g. this worker's streams going away) a chance to go out
+        deadline = asyncio.get_running_loop().time() + drain_seconds
+        while (self.outbox or self.in_flight) and self.connected and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.02)
+        for task in self.tasks:
+            task.cancel()
+        for task in self.tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.tasks = []
+        self.connected = False
+        await super().close()
+
+    def send_heartbeat(self):
+        # Queued heartbeats would only crowd real messages out of the outbox during an outage
+        if self.connected:
+            super().send_heartbeat()
+
+    def publish(self, name: str, message: dict):
+        if len(self.outbox) >= BUS_QUEUE_SIZE:
+            self.outbox.popleft()
+            self.dropped += 1
+        self.outbox.append((self.channel(name), self.encode(message)))
+        if self.outbox_ready is not None:
+            self.outbox_ready.set()
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "connected": self.connected,
+            "reconnects": self.reconnects,
+            "queued": len(self.outbox),
+        }
+
+
+def create_bus(url: Optional[str] = None) -> Bus:
+    """Redis bus when STATE_BUS_URL is a redis:// URL, otherwise the in-process bus."""
+    url = url if url is not None else os.getenv("STATE_BUS_URL", "")
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBus(url)
+    return InProcessBus()
@@ -0,0 +1,235 @@
+"""
+Dashboard fan-out engine.
+Every dashboard connection gets its own bounded outbound queue drained by a
+dedicated writer task, so one slow or half-dead socket never delays delivery
+to the other dispatch consoles. Dashboards with a subscription filter only
+receive the messages routed to them and build their own snapshots.
+"""
+
+from fastapi import WebSocket
+from typing import Callable, Deque, Dict, Iterable, Optional, Tuple, Union
+from dataclasses import dataclass
+from collections import deque
+import asyncio
+import os
+import time
+import uuid
+
+from logs import get_logger
+import wire
+
+logger = get_logger("Fanout")
+
+# Message kinds. Stream-list snapshots and deltas may be dropped for slow
+# consumers (a dashboard that sees a sequence gap asks for a resync); alerts
+# are never dropped.
+KIND_SNAPSHOT = "snapshot"
+KIND_DELTA = "delta"
+KIND_ALERT = "alert"
+
+
+@dataclass
+class FanoutPolicy:
+    max_queue: int = 32
+    evict_after_seconds: float = 10.0
+    send_timeout_seconds: float = 5.0
+
+    @classmethod
+    def from_env(cls) -> "FanoutPolicy":
+        return cls(
+            max_queue=int(os.getenv("DASHBOARD_QUEUE_SIZE", "32")),
+            evict_after_seconds=float(os.getenv("DASHBOARD_EVICT_AFTER_SECONDS", "10")),
+            send_timeout_seconds=float(os.getenv("DASHBOARD_SEND_TIMEOUT_SECONDS", "5")),
+        )
+
+
+class DashboardConnection:
+    """A dashboard WebSocket with its own outbound queue and writer task."""
+
+    def __init__(self, websocket: WebSocket, hub: "FanoutHub", fmt: str = wire.JSON):
+        self.id = uuid.uuid4().hex[:12]
+        self.websocket = websocket
+        self.format = fmt
+        self.hub = hub
+        self.queue: Deque[Tuple[str, wire.Outbound, float]] = deque()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.sending_since: Optional[float] = None
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        # Builds this dashboard's own stream_list; set while it has a subscription filter
+        self.snapshot: Optional[Callable[[], str]] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._writer())
+
+    def backlog_seconds(self, now: Optional[float] = None) -> float:
+        """Age of the oldest message not yet delivered to this dashboard."""
+        now = now if now is not None else time.monotonic()
+        oldest = self.sending_since
+        if self.queue and (oldest is None or self.queue[0][2] < oldest):
+            oldest = self.queue[0][2]
+        return now - oldest if oldest is not None else 0.0
+
+    def enqueue(self, kind: str, message: Union[str, wire.Outbound]) -> bool:
+        """Queue a message. Returns False if the consumer should be evicted."""
+        if self.closed:
+            return False
+        if not isinstance(message, wire.Outbound):
+            message = wire.Outbound(message)
+        now = time.monotonic()
+        if self.backlog_seconds(now) > self.hub.policy.evict_after_seconds:
+            return False
+
+        if self.snapshot is not None and kind != KIND_SNAPSHOT and len(self.queue) >= self.hub.policy.max_queue:
+            # Filtered dashboards skip sequence numbers by design, so they cannot notice a
+            # dropped delta; replace their backlog with a fresh snapshot instead
+            self.enqueue(KIND_SNAPSHOT, self.snapshot())
+            if kind == KIND_DELTA:
+                # The snapshot already includes this change
+                self.dropped += 1
+                return True
+
+        if kind == KIND_SNAPSHOT and self.queue:
+            # A full snapshot supersedes every stream-list message still queued
+            kept = deque(item for item in self.queue if item[0] == KIND_ALERT)
+            self.dropped += len(self.queue) - len(kept)
+            self.queue = kept
+
+        if len(self.queue) >= self.hub.policy.max_queue and self.snapshot is None:
+            # Drop the oldest droppable message; alerts stay queued regardless.
+            for i, (queued_kind, _, _) in enumerate(self.queue):
+                if queued_kind != KIND_ALERT:
+                    del self.queue[i]
+                    self.dropped += 1
+                    break
+
+        self.queue.append((kind, message, now))
+        self.wakeup.set()
+        return True
+
+    async def _writer(self):
+        try:
+            while True:
+                while not self.queue:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                kind, message, enqueued_at = self.queue.popleft()
+                self.sending_since = enqueued_at
+                await asyncio.wait_for(
+                    wire.send(self.websocket, self.format, message),
+                    timeout=self.hub.policy.send_timeout_seconds,
+                )
+                self.sending_since = None
+                self.sent += 1
+                if self.hub.on_sent is not None:
+                    self.hub.on_sent(kind, time.monotonic() - enqueued_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug("Dashboard %s send failed: %r", self.id, e)
+            self.hub.evict(self)
+
+    def stats(self) -> dict:
+        return {
+            "id": self.id,
+            "format": self.format,
+            "queue_depth": len(self.queue),
+            "backlog_seconds": round(self.backlog_seconds(), 3),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "filtered": self.snapshot is not None,
+            "connected_at": self.connected_at,
+        }
+
+
+class FanoutHub:
+    """Registry of dashboard connections with non-blocking publish."""
+
+    def __init__(self, policy: Optional[FanoutPolicy] = None, on_sent: Optional[Callable[[str, float], None]] = None):
+        self.policy = policy or FanoutPolicy()
+        # Called with (kind, seconds from enqueue until the send completed) for each delivered message
+        self.on_sent = on_sent
+        self.connections: Dict[str, DashboardConnection] = {}
+        # Dashboards without a subscription filter, which get every message
+        self.unfiltered: Dict[str, DashboardConnection] = {}
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def add(self, websocket: WebSocket, fmt: str = wire.JSON) -> DashboardConnection:
+        conn = DashboardConnection(websocket, self, fmt)
+        self.connections[conn.id] = conn
+        self.unfiltered[conn.id] = conn
+        conn.start()
+        return conn
+
+    def discard(self, conn: DashboardConnection):
+        """Forget a connection and stop its writer (used on clean disconnect)."""
+        conn.closed = True
+        self.connections.pop(conn.id, None)
+        self.unfiltered.pop(conn.id, None)
+        if conn.task and conn.task is not asyncio.current_task():
+            conn.task.cancel()
+
+    def evict(self, conn: DashboardConnection):
+        """Drop a lagging or broken consumer and close its socket."""
+        if conn.closed:
+            return
+        logger.warning("Evicting dashboard %s (queue=%d, backlog=%.1fs)", conn.id, len(conn.queue), conn.backlog_seconds())
+        self.discard(conn)
+        self.evicted += 1
+        asyncio.create_task(self._close(conn.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    def set_filter(self, conn: DashboardConnection, snapshot: Optional[Callable[[], str]]):
+        """Filter a dashboard (it then builds its own snapshots), or with None make it receive everything again."""
+        conn.snapshot = snapshot
+        if snapshot is None:
+            if not conn.closed:
+                self.unfiltered[conn.id] = conn
+        else:
+            self.unfiltered.pop(conn.id, None)
+
+    def publish(self, kind: str, text: str, subscribers: Iterable[str] = ()) -> int:
+        """Queue a pre-serialized message without awaiting sends.
+
+        It goes to every unfiltered dashboard plus the filtered ones listed in
+        subscribers. Returns the number of dashboards it was queued for.
+        """
+        # Shared by every connection, so it is encoded at most once per wire format
+        message = wire.Outbound(text)
+        targets = list(self.unfiltered.values())
+        for conn_id in subscribers:
+            conn = self.connections.get(conn_id)
+            if conn is not None and conn.snapshot is not None:
+                targets.append(conn)
+        for conn in targets:
+            if not conn.enqueue(kind, message):
+                self.evict(conn)
+        return len(targets)
+
+    def stats(self) -> dict:
+        return {
+            "connections": [conn.stats() for conn in self.connections.values()],
+            "filtered": len(self.connections) - len(self.unfiltered),
+            "evicted": self.evicted,
+            "policy": {
+                "max_queue": self.policy.max_queue,
+                "evict_after_seconds": self.policy.evict_after_seconds,
+                "send_timeout_seconds": self.policy.send_timeout_seconds,
+            },
+        }
+
+    async def close_all(self):
+        for conn in list(self.connections.values()):
+            self.discard(conn)
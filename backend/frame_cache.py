@@ -0,0 +1,111 @@
+"""
+Perceptual-hash cache for AI Sentry results.
+Fixed cameras send nearly identical frames; a frame whose difference hash is
+within a small Hamming distance of a recent frame from the same stream reuses
+that frame's analysis instead of calling a provider again.
+"""
+
+from typing import Dict, Optional
+from collections import OrderedDict
+import io
+import os
+import time
+
+from logs import get_logger
+
+logger = get_logger("AI Sentry")
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+    logger.warning("Pillow not installed - frame cache disabled (pip install Pillow)")
+
+HASH_SIZE = 8
+
+
+def dhash(image_data: bytes) -> Optional[int]:
+    """64-bit difference hash of an encoded image, or None if it cannot be decoded."""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            img.draft("L", (HASH_SIZE * 4, HASH_SIZE * 4))
+            return dhash_image(img)
+    except Exception:
+        return None
+
+
+def dhash_image(img: "Image.Image") -> int:
+    """64-bit difference hash of an already decoded image."""
+    # One byte per pixel in mode "L"
+    pixels = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE)).tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class FrameCache:
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        max_distance: Optional[int] = None,
+        max_entries_per_stream: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.ttl = ttl_seconds if ttl_seconds is not None else float(os.getenv("FRAME_CACHE_TTL_SECONDS", "30"))
+        self.max_distance = max_distance if max_distance is not None else int(os.getenv("FRAME_CACHE_MAX_DISTANCE", "5"))
+        self.max_entries = max_entries_per_stream or int(os.getenv("FRAME_CACHE_SIZE", "16"))
+        if enabled is None:
+            enabled = os.getenv("FRAME_CACHE_ENABLED", "1") != "0"
+        self.enabled = enabled and Image is not None
+        # stream_id -> hash -> (expires_at, result), least recently used first
+        self.entries: Dict[str, "OrderedDict[int, tuple]"] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, stream_id: str, frame_hash: Optional[int]) -> Optional[dict]:
+        """Cached result for a frame close enough to a recent one, if any."""
+        if not self.enabled or frame_hash is None:
+            return None
+        entries = self.entries.get(stream_id)
+        now = time.monotonic()
+        if entries:
+            for key in [k for k, (expires_at, _) in entries.items() if expires_at <= now]:
+                del entries[key]
+            best_key, best_distance = None, self.max_distance + 1
+            for key in entries:
+                distance = bin(key ^ frame_hash).count("1")
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+            if best_key is not None:
+                entries.move_to_end(best_key)
+                self.hits += 1
+                return entries[best_key][1]
+        self.misses += 1
+        return None
+
+    def store(self, stream_id: str, frame_hash: Optional[int], result: dict):
+        if not self.enabled or frame_hash is None:
+            return
+        entries = self.entries.setdefault(stream_id, OrderedDict())
+        entries[frame_hash] = (time.monotonic() + self.ttl, result)
+        entries.move_to_end(frame_hash)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def discard(self, stream_id: str):
+        self.entries.pop(stream_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "streams": len(self.entries),
+        }
@@ -0,0 +1,135 @@
+"""
+Adaptive frame sampling for the WebSocket frame-ingest channel.
+Broadcasters push frames over /ws/frames/{stream_id} and sample at whatever
+interval the server last sent. Each stream's base interval is short while it
+has a recent detection or open alert and long when idle; all intervals are
+then stretched by the same factor when the frames requested would exceed
+what the AI providers can analyze (concurrency / latency) or frames are
+already queueing, so busy periods slow every stream down proportionally.
+"""
+
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import os
+
+from inference import InferenceEngine
+from logs import get_logger
+from providers import ProviderRouter
+
+logger = get_logger("AI Sentry")
+
+REASON_ACTIVE = "detection"
+REASON_IDLE = "idle"
+REASON_LOAD = "load"
+REASON_UNAVAILABLE = "unavailable"
+
+
+class RateController:
+    def __init__(self, engine: InferenceEngine, router: Callable[[], ProviderRouter], is_hot: Callable[[str], bool]):
+        self.engine = engine
+        # Called each time so a swapped router (e.g. in the benchmark) is picked up
+        self.router = router
+        self.is_hot = is_hot
+        self.min_interval = float(os.getenv("FRAME_INTERVAL_MIN_MS", "500")) / 1000
+        self.active_interval = float(os.getenv("FRAME_INTERVAL_ACTIVE_MS", "1000")) / 1000
+        self.idle_interval = float(os.getenv("FRAME_INTERVAL_IDLE_MS", "5000")) / 1000
+        self.max_interval = float(os.getenv("FRAME_INTERVAL_MAX_MS", "30000")) / 1000
+        # Share of provider capacity the sampled frames may use
+        self.target_utilization = float(os.getenv("FRAME_TARGET_UTILIZATION", "0.8"))
+        self.default_latency = float(os.getenv("FRAME_DEFAULT_LATENCY_MS", "2000")) / 1000
+        self.update_seconds = float(os.getenv("FRAME_RATE_UPDATE_SECONDS", "2"))
+        # stream_id -> coroutine sending a rate message to that stream's ingest socket
+        self.channels: Dict[str, Callable[[dict], Awaitable[None]]] = {}
+        self.intervals: Dict[str, float] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.scale = 1.0
+        self.rate_messages = 0
+
+    def _latency(self) -> Optional[float]:
+        """Typical provider latency, or None if no provider can take frames."""
+        candidates = self.router().ranked()
+        if not candidates:
+            return None
+        samples = [p.health.p50() for p in candidates if p.health.p50() is not None]
+        return min(samples) if samples else self.default_latency
+
+    def _base(self, stream_id: str) -> Tuple[float, str]:
+        if self.is_hot(stream_id):
+            return self.active_interval, REASON_ACTIVE
+        return self.idle_interval, REASON_IDLE
+
+    def plan(self) -> Dict[str, Tuple[float, str]]:
+        """Interval (seconds) and reason for every connected stream."""
+        latency = self._latency()
+        if latency is None:
+            return {stream_id: (self.max_interval, REASON_UNAVAILABLE) for stream_id in self.channels}
+        bases = {stream_id: self._base(stream_id) for stream_id in self.channels}
+        capacity = self.engine.max_concurrency / max(latency, 1e-3) * self.target_utilization
+        demand = sum(1 / interval for interval, _ in bases.values())
+        scale = max(1.0, demand / capacity) if capacity > 0 else 1.0
+        # Frames already waiting mean the estimate is optimistic
+        scale *= 1 + self.engine.pending() / max(1, self.engine.max_concurrency)
+        self.scale = scale
+        plan = {}
+        for stream_id, (interval, reason) in bases.items():
+            scaled = min(self.max_interval, max(self.min_interval, interval * scale))
+            plan[stream_id] = (scaled, REASON_LOAD if scale > 1.0 and scaled > interval else reason)
+        return plan
+
+    def message(self, interval: float, reason: str) -> dict:
+        return {"type": "rate", "interval_ms": round(interval * 1000), "reason": reason}
+
+    async def update(self, force_stream: Optional[str] = None):
+        """Send new intervals to streams whose rate changed noticeably."""
+        for stream_id, (interval, reason) in self.plan().items():
+            send = self.channels.get(stream_id)
+            if send is None:
+                continue
+            previous = self.intervals.get(stream_id)
+            if stream_id != force_stream and previous is not None and abs(interval - previous) <= 0.1 * previous:
+                continue
+            self.intervals[stream_id] = interval
+            self.rate_messages += 1
+            try:
+                await send(self.message(interval, reason))
+            except Exception as e:
+                logger.debug("Rate message to %s failed: %r", stream_id, e)
+
+    async def register(self, stream_id: str, send: Callable[[dict], Awaitable[None]]):
+        self.channels[stream_id] = send
+        self.intervals.pop(stream_id, None)
+        await self.update(force_stream=stream_id)
+
+    def unregister(self, stream_id: str, send: Callable[[dict], Awaitable[None]]):
+        if self.channels.get(stream_id) is send:
+            del self.channels[stream_id]
+            self.intervals.pop(stream_id, None)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.update_seconds)
+            try:
+                await self.update()
+            except Exception as e:
+                logger.error("Frame rate update failed: %s", e)
+
+    def start(self):
+        if self.task is None and self.update_seconds > 0:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def stats(self) -> dict:
+        return {
+            "streams": len(self.channels),
+            "scale": round(self.scale, 3),
+            "intervals_ms": {stream_id: round(i * 1000) for stream_id, i in self.intervals.items()},
+            "rate_messages": self.rate_messages,
+        }
@@ -0,0 +1,169 @@
+"""
+AI Sentry inference engine.
+Frames are analyzed off the request path with a global concurrency limit.
+Each stream has a single pending slot: a newer frame replaces an older one
+that has not started yet, so stale frames are never sent to a provider. The
+replaced frame's caller gets a "superseded" result right away instead of an
+analysis of a frame it did not send.
+Blocking provider SDK calls run in a bounded worker pool, never on the loop.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from collections import OrderedDict
+import asyncio
+import functools
+import os
+import time
+import uuid
+
+SUPERSEDED = "superseded"
+
+
+def superseded_result(job: "FrameJob", newer: "FrameJob") -> dict:
+    """Result for a frame replaced by a newer one before it was analyzed."""
+    return {"success": True, "status": SUPERSEDED, "job_id": job.job_id, "superseded_by": newer.job_id}
+
+
+@dataclass
+class FrameJob:
+    stream_id: str
+    latitude: float
+    longitude: float
+    image_data: bytes
+    content_type: Optional[str]
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    submitted_at: float = field(default_factory=time.monotonic)
+    future: Optional[asyncio.Future] = None
+    # Futures of older frames this job superseded (already settled as superseded)
+    waiters: List[asyncio.Future] = field(default_factory=list)
+
+
+class _StreamSlot:
+    def __init__(self):
+        self.pending: Optional[FrameJob] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class InferenceEngine:
+    def __init__(
+        self,
+        analyze: Callable[[FrameJob], Awaitable[dict]],
+        max_concurrency: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        max_tracked_jobs: int = 1024,
+    ):
+        self.analyze = analyze
+        self.max_concurrency = max_concurrency or int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("AI_WORKER_THREADS", "4")),
+            thread_name_prefix="ai-sentry",
+        )
+        self.slots: Dict[str, _StreamSlot] = {}
+        self.jobs: "OrderedDict[str, asyncio.Future]" = OrderedDict()
+        self.max_tracked_jobs = max_tracked_jobs
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.superseded = 0
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running server loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run_blocking(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking provider call in the worker pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    def submit(self, job: FrameJob) -> asyncio.Future:
+        """Queue a frame for analysis and return a future for its result."""
+        loop = asyncio.get_running_loop()
+        job.future = loop.create_future()
+        self._track(job.job_id, job.future)
+
+        slot = self.slots.get(job.stream_id)
+        if slot is None:
+            slot = self.slots[job.stream_id] = _StreamSlot()
+        if slot.pending is not None:
+            # Latest frame wins: the older frame is never analyzed
+            older = slot.pending
+            if not older.future.done():
+                older.future.set_result(superseded_result(older, job))
+            job.waiters.append(older.future)
+            self.superseded += 1
+        slot.pending = job
+        if slot.task is None:
+            slot.task = asyncio.create_task(self._drain(job.stream_id, slot))
+        return job.future
+
+    async def analyze_frame(self, job: FrameJob) -> dict:
+        """Submit a frame and wait for its result."""
+        return await self.submit(job)
+
+    def job(self, job_id: str) -> Optional[asyncio.Future]:
+        return self.jobs.get(job_id)
+
+    def _track(self, job_id: str, future: asyncio.Future):
+        self.jobs[job_id] = future
+        while len(self.jobs) > self.max_tracked_jobs:
+            self.jobs.popitem(last=False)
+
+    async def _drain(self, stream_id: str, slot: _StreamSlot):
+        try:
+            while slot.pending is not None:
+                async with self.semaphore:
+                    job, slot.pending = slot.pending, None
+                    if job is None:
+                        continue
+                    self.in_flight += 1
+                    try:
+                        result = await self.analyze(job)
+                    except Exception as e:
+                        self.failed += 1
+                        self._settle(job, error=e)
+                    else:
+                        self.completed += 1
+                        self._settle(job, result=result)
+                    finally:
+                        self.in_flight -= 1
+        finally:
+            slot.task = None
+            if slot.pending is None and self.slots.get(stream_id) is slot:
+                del self.slots[stream_id]
+
+    @staticmethod
+    def _settle(job: FrameJob, result: Optional[dict] = None, error: Optional[BaseException] = None):
+        future = job.future
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            # The caller may have gone away (wait=false or disconnected); don't warn about an unretrieved error
+            future.exception()
+        else:
+            future.set_result(result)
+
+    def pending(self) -> int:
+        return sum(1 for slot in self.slots.values() if slot.pending is not None)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "pending": self.pending(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "superseded": self.superseded,
+        }
+
+    async def close(self):
+        for slot in list(self.slots.values()):
+            if slot.task is not None:
+                slot.task.cancel()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,161 @@
+"""
+WebSocket connection lifecycle.
+Every broadcaster, viewer, dashboard and frame-ingest socket is tracked here
+with the time it last sent anything. The reaper wakes every
+HEARTBEAT_INTERVAL_SECONDS, sends {"type": "ping"} to connections that have
+been quiet for that long (clients answer {"type": "pong"}), and reaps
+connections that stayed silent for HEARTBEAT_TIMEOUT_SECONDS or whose ping
+could not be sent. Reaping removes the connection from its registry at once
+and closes the socket, so a dead peer stops costing a failed send on every
+fan-out. A failed send elsewhere reaps the connection the same way.
+"""
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import os
+import time
+
+from logs import get_logger
+
+logger = get_logger("Lifecycle")
+
+REASON_IDLE = "idle"
+REASON_SEND_FAILED = "send_failed"
+REASON_CLOSED = "closed"
+REASON_ORPHAN = "orphan"
+
+
+class TrackedConnection:
+    __slots__ = ("role", "websocket", "ping", "on_dead", "last_seen", "connected_at")
+
+    def __init__(self, role: str, websocket: WebSocket, ping: Callable[[dict], Awaitable[None]], on_dead: Callable[[], None]):
+        self.role = role
+        self.websocket = websocket
+        self.ping = ping
+        # Removes the connection from its registry; the handler's own cleanup still runs when it exits
+        self.on_dead = on_dead
+        self.last_seen = time.monotonic()
+        self.connected_at = self.last_seen
+
+    def seen(self):
+        """Record that the client sent something (any message counts, not just pongs)."""
+        self.last_seen = time.monotonic()
+
+
+class ConnectionManager:
+    def __init__(self, on_reap: Optional[Callable[[str, str, int], None]] = None):
+        self.interval = float(os.getenv("HEARTBEAT_INTERVAL_SECONDS", "20"))
+        self.timeout = float(os.getenv("HEARTBEAT_TIMEOUT_SECONDS", "60"))
+        self.send_timeout = float(os.getenv("HEARTBEAT_SEND_TIMEOUT_SECONDS", "5"))
+        self.on_reap = on_reap
+        self.connections: Dict[WebSocket, TrackedConnection] = {}
+        # Called after each sweep to drop registry entries with no tracked socket; returns how many
+        self.prune: Optional[Callable[[], Dict[str, int]]] = None
+        self.task: Optional[asyncio.Task] = None
+        self.pings = 0
+        self.sweeps = 0
+        # role -> reason -> connections reaped
+        self.reaped: Dict[str, Dict[str, int]] = {}
+
+    def track(self, role: str, websocket: WebSocket, ping: Callable[[dict], Awaitable[None]],
+              on_dead: Callable[[], None]) -> TrackedConnection:
+        tracked = TrackedConnection(role, websocket, ping, on_dead)
+        self.connections[websocket] = tracked
+        return tracked
+
+    def untrack(self, websocket: WebSocket):
+        """Forget a connection whose handler has finished."""
+        self.connections.pop(websocket, None)
+
+    def tracks(self, websocket: WebSocket) -> bool:
+        return websocket in self.connections
+
+    def _count(self, role: str, reason: str, count: int = 1):
+        by_reason = self.reaped.setdefault(role, {})
+        by_reason[reason] = by_reason.get(reason, 0) + count
+        if self.on_reap is not None:
+            self.on_reap(role, reason, count)
+
+    async def reap(self, websocket: WebSocket, reason: str) -> bool:
+        """Remove a connection from its registry and close it. Returns False if it was not tracked."""
+        tracked = self.connections.pop(websocket, None)
+        if tracked is None:
+            return False
+        logger.info("Reaping %s connection (%s, quiet for %.0fs)", tracked.role, reason, time.monotonic() - tracked.last_seen)
+        self._count(tracked.role, reason)
+        try:
+            tracked.on_dead()
+        except Exception as e:
+            logger.error("Removing %s connection failed: %s", tracked.role, e)
+        if websocket.application_state != WebSocketState.DISCONNECTED:
+            try:
+                # Going away; the handler sees the disconnect and runs its own cleanup
+                await asyncio.wait_for(websocket.close(code=1001), self.send_timeout)
+            except Exception:
+                pass
+        return True
+
+    async def _ping(self, tracked: TrackedConnection):
+        try:
+            await asyncio.wait_for(tracked.ping({"type": "ping", "ts": time.time()}), self.send_timeout)
+            self.pings += 1
+        except Exception as e:
+            logger.debug("Ping to %s failed: %r", tracked.role, e)
+            await self.reap(tracked.websocket, REASON_SEND_FAILED)
+
+    async def sweep(self):
+        """Reap silent or closed connections and ping the quiet ones."""
+        self.sweeps += 1
+        now = time.monotonic()
+        pings = []
+        for websocket, tracked in list(self.connections.items()):
+            quiet = now - tracked.last_seen
+            if websocket.client_state == WebSocketState.DISCONNECTED or websocket.application_state == WebSocketState.DISCONNECTED:
+                await self.reap(websocket, REASON_CLOSED)
+            elif self.timeout > 0 and quiet >= self.timeout:
+                await self.reap(websocket, REASON_IDLE)
+            elif quiet >= self.interval:
+                pings.append(self._ping(tracked))
+        if pings:
+            await asyncio.gather(*pings)
+        if self.prune is not None:
+            for role, count in self.prune().items():
+                if count:
+                    logger.warning("Pruned %d untracked %s registry entries", count, role)
+                    self._count(role, REASON_ORPHAN, count)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error("Connection sweep failed: %s", e)
+
+    def start(self):
+        if self.task is None and self.interval > 0:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def stats(self) -> dict:
+        by_role: Dict[str, int] = {}
+        for tracked in self.connections.values():
+            by_role[tracked.role] = by_role.get(tracked.role, 0) + 1
+        return {
+            "heartbeat_interval_seconds": self.interval,
+            "heartbeat_timeout_seconds": self.timeout,
+            "connections": by_role,
+            "pings": self.pings,
+            "sweeps": self.sweeps,
+            "reaped": self.reaped,
+        }
@@ -0,0 +1,110 @@
+"""
+Coalesced location updates for moving broadcasters.
+update_location messages only mark a stream dirty; a ticker flushes every
+dirty stream at a fixed interval as one batched position message.
+"""
+
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import math
+import os
+
+from logs import get_logger
+
+logger = get_logger("Location")
+
+Position = Tuple[float, float]
+
+EARTH_RADIUS_METERS = 6371000.0
+
+
+def distance_meters(a: Position, b: Position) -> float:
+    """Great-circle distance between two (latitude, longitude) points."""
+    lat1, lng1 = map(math.radians, a)
+    lat2, lng2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(h))
+
+
+class LocationTicker:
+    def __init__(
+        self,
+        flush: Callable[[Dict[str, Position]], Awaitable[None]],
+        interval_seconds: Optional[float] = None,
+        min_distance_meters: Optional[float] = None,
+    ):
+        self.flush_callback = flush
+        self.interval = interval_seconds if interval_seconds is not None else float(os.getenv("LOCATION_TICK_SECONDS", "0.5"))
+        self.min_distance = min_distance_meters if min_distance_meters is not None else float(os.getenv("LOCATION_MIN_DISTANCE_METERS", "0"))
+        self.dirty: Dict[str, Position] = {}
+        self.last_sent: Dict[str, Position] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.suppressed = 0
+
+    def reset(self, stream_id: str, latitude: float, longitude: float):
+        """Record the position dashboards already know about for a stream."""
+        self.dirty.pop(stream_id, None)
+        self.last_sent[stream_id] = (latitude, longitude)
+
+    def discard(self, stream_id: str):
+        self.dirty.pop(stream_id, None)
+        self.last_sent.pop(stream_id, None)
+
+    def mark(self, stream_id: str, latitude: float, longitude: float):
+        """Remember the newest position; only the latest one per tick is sent."""
+        self.dirty[stream_id] = (latitude, longitude)
+
+    def position(self, stream_id: str) -> Optional[Position]:
+        """Newest known position of a stream, including one not flushed yet."""
+        return self.dirty.get(stream_id) or self.last_sent.get(stream_id)
+
+    def _moved(self, stream_id: str, position: Position) -> bool:
+        last = self.last_sent.get(stream_id)
+        if last is None:
+            return True
+        if last == position:
+            return False
+        return self.min_distance <= 0 or distance_meters(last, position) >= self.min_distance
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        dirty, self.dirty = self.dirty, {}
+        moved = {stream_id: pos for stream_id, pos in dirty.items() if self._moved(stream_id, pos)}
+        self.suppressed += len(dirty) - len(moved)
+        if not moved:
+            return
+        self.last_sent.update(moved)
+        self.flushes += 1
+        await self.flush_callback(moved)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Flush failed: %s", e)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "min_distance_meters": self.min_distance,
+            "pending": len(self.dirty),
+            "flushes": self.flushes,
+            "suppressed": self.suppressed,
+        }
@@ -0,0 +1,103 @@
+"""
+Leveled, rate-limited logging.
+Loggers are named after the existing console prefixes ("AI Sentry",
+"Fanout", ...) so text output looks like before. Per-event messages use
+%-style arguments and DEBUG level, so when the level is higher they are
+dropped before any formatting happens. Each message template is limited to
+LOG_RATE_LIMIT records per LOG_RATE_INTERVAL_SECONDS; the next record that
+gets through reports how many were suppressed. LOG_FORMAT=json emits one
+JSON object per line with any fields passed as extra={"fields": {...}}.
+"""
+
+from typing import Dict, List, Tuple
+import json
+import logging
+import os
+import sys
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "20"))
+LOG_RATE_INTERVAL = float(os.getenv("LOG_RATE_INTERVAL_SECONDS", "10"))
+
+ROOT = "alertstream"
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, limit: int, interval: float):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        # (logger, template) -> [window start, records let through, records suppressed]
+        self.windows: Dict[Tuple[str, str], List[float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0:
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            if window is not None and window[2]:
+                record.suppressed = int(window[2])
+            self.windows[key] = [now, 1, 0]
+            return True
+        if window[1] < self.limit:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        prefix = record.name[len(ROOT) + 1:] or ROOT
+        level = f"{record.levelname}: " if record.levelno >= logging.WARNING else ""
+        text = f"[{prefix}] {level}{record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" ({suppressed} similar messages suppressed)"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name[len(ROOT) + 1:] or ROOT,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _configure() -> logging.Logger:
+    root = logging.getLogger(ROOT)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+        handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT, LOG_RATE_INTERVAL))
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+    return root
+
+
+_configure()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a component, e.g. get_logger("AI Sentry")."""
+    return logging.getLogger(f"{ROOT}.{name}")
@@ -5,62 +5,103 @@ Also handles video recording storage and retrieval.
 Includes AI Sentry for threat detection using Gemini.
 """
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Form, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
-from typing import Dict, List, Optional
-from dataclasses import dataclass, field, asdict
+from fastapi.responses import JSONResponse, Response
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from dataclasses import dataclass, asdict
 from datetime import datetime
-import json
 import asyncio
 import os
 import uuid
-import base64
+import time
+import mimetypes
+from stat import S_ISREG
 from pathlib import Path
 from dotenv import load_dotenv
 
+from fanout import FanoutHub, FanoutPolicy, KIND_ALERT, KIND_DELTA, KIND_SNAPSHOT
+from stream_state import Delta, StreamState, ACTIVE, PAST
+from location_ticker import LocationTicker
+from uploads import ChunkedUploads, save_upload
+from inference import FrameJob, InferenceEngine, SUPERSEDED
+from frame_cache import FrameCache
+from preprocess import Frame, FramePreprocessor
+from ai_clients import AIClients
+from providers import Provider, ProviderRouter
+from batching import FrameBatcher
+from recording_store import RecordingStore, paginate
+from spatial import BBox, check_point, parse_bbox, parse_point
+from bus import create_bus
+from recording_delivery import RecordingResponse, Thumbnailer
+from retention import RetentionJanitor
+from logs import get_logger
+from metrics import CONTENT_TYPE, REGISTRY, Counter, Gauge, Histogram
+from wire import Outbound, Peer, dumps, loads
+from alerts import AlertAggregator
+from subscriptions import SubscriberIndex, Subscription
+from frame_ingest import RateController
+from lifecycle import ConnectionManager, TrackedConnection, REASON_SEND_FAILED
+import wire
+
 # Load environment variables
 load_dotenv()
 
+logger = get_logger("AI Sentry")
+
 # Initialize Gemini - with OpenRouter fallback
-genai = None
 model = None
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
-print(f"[AI Sentry] Checking API keys - Gemini: {'SET' if GEMINI_API_KEY else 'NOT SET'}, OpenRouter: {'SET' if OPENROUTER_API_KEY else 'NOT SET'}")
+logger.info(
+    "Checking API keys - Gemini: %s, OpenRouter: %s",
+    "SET" if GEMINI_API_KEY else "NOT SET", "SET" if OPENROUTER_API_KEY else "NOT SET",
+)
 
 if GEMINI_API_KEY:
-    try:
-        from google import genai as genai_module
-        client = genai_module.Client(api_key=GEMINI_API_KEY)
-        genai = genai_module
-        model = client.models
-        print("[AI Sentry] ✅ Gemini AI initialized successfully")
-    except ImportError as e:
-        print(f"[AI Sentry] ❌ WARNING: google-genai package not installed - {e}")
-        print("[AI Sentry] Run: pip install google-genai>=1.59.0")
-    except Exception as e:
-        print(f"[AI Sentry] ❌ WARNING: Failed to initialize Gemini: {e}")
-        print(f"[AI Sentry] Check if GEMINI_API_KEY is valid")
+    # The client itself is created at startup (see start_ai_clients)
+    logger.info("Gemini API key loaded - client will be created at startup")
 else:
-    print("[AI Sentry] ⚠️  GEMINI_API_KEY not set - Gemini will not be available")
+    logger.warning("GEMINI_API_KEY not set - Gemini will not be available")
 
 if OPENROUTER_API_KEY:
-    print("[AI Sentry] ✅ OpenRouter API key loaded - will use OpenAI GPT-4o as fallback")
+    logger.info("OpenRouter API key loaded - will use OpenAI GPT-4o as fallback")
 else:
-    print("[AI Sentry] ⚠️  WARNING: No fallback AI provider configured")
+    logger.warning("No fallback AI provider configured")
     
 if not GEMINI_API_KEY and not OPENROUTER_API_KEY:
-    print("[AI Sentry] ❌ CRITICAL: No AI provider configured! AI Sentry will not work.")
-    print("[AI Sentry] Please set GEMINI_API_KEY or OPENROUTER_API_KEY environment variable.")
+    logger.critical("No AI provider configured! AI Sentry will not work. "
+                    "Please set GEMINI_API_KEY or OPENROUTER_API_KEY environment variable.")
 
 app = FastAPI(title="EmergencyEye Signaling Server")
 
+# App-lifetime AI provider clients with pooled keep-alive connections
+ai_clients = AIClients(GEMINI_API_KEY, OPENROUTER_API_KEY)
+
+
+@app.on_event("startup")
+async def start_ai_clients():
+    global model
+    await ai_clients.start()
+    model = ai_clients.gemini
+
+
+@app.on_event("shutdown")
+async def close_ai_clients():
+    global model
+    model = None
+    await ai_clients.close()
+
 # Create recordings directory
 RECORDINGS_DIR = Path(__file__).parent / "recordings"
 RECORDINGS_DIR.mkdir(exist_ok=True)
+# Radius used to list other live cameras near an alert
+ALERT_NEARBY_RADIUS_METERS = float(os.getenv("ALERT_NEARBY_RADIUS_METERS", "500"))
+# Past-stream metadata database (kept outside the publicly served recordings dir)
+RECORDINGS_DB = Path(os.getenv("RECORDINGS_DB", str(Path(__file__).parent / "recordings.db")))
+# Resumable uploads are staged here until finalized
+PARTIAL_UPLOADS_DIR = Path(__file__).parent / "partial_uploads"
 
 # CORS for frontend
 app.add_middleware(
@@ -71,9 +112,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Serve recordings as static files
-app.mount("/recordings", StaticFiles(directory=str(RECORDINGS_DIR)), name="recordings")
-
 @dataclass
 class StreamInfo:
     id: str
@@ -94,38 +132,374 @@ class PastStreamInfo:
     duration_seconds: float
     video_filename: str
     video_url: str
+    thumbnail_url: Optional[str] = None
+    # Pinned recordings are never removed by retention
+    pinned: bool = False
 
+# Versioned stream state; mutate through stream_state so dashboards get deltas
+stream_state = StreamState()
 # Store active streams and their broadcasters
-active_streams: Dict[str, StreamInfo] = {}
+active_streams: Dict[str, StreamInfo] = stream_state.active
 # Store past streams metadata (in production, use a database)
-past_streams: Dict[str, PastStreamInfo] = {}
-# WebSocket connections: stream_id -> broadcaster WebSocket
-broadcasters: Dict[str, WebSocket] = {}
-# WebSocket connections: stream_id -> list of viewer WebSockets
-viewers: Dict[str, List[WebSocket]] = {}
-# Dashboard connections for stream list updates
-dashboard_connections: List[WebSocket] = []
-
-
-async def broadcast_stream_list():
-    """Notify all dashboard connections of stream list changes."""
-    stream_list = [asdict(s) for s in active_streams.values()]
-    past_stream_list = [asdict(s) for s in past_streams.values()]
-    message = json.dumps({
-        "type": "stream_list", 
-        "streams": stream_list,
-        "past_streams": past_stream_list
+past_streams: Dict[str, PastStreamInfo] = stream_state.past
+# WebSocket connections: stream_id -> broadcaster peer
+broadcasters: Dict[str, Peer] = {}
+# WebSocket connections: stream_id -> viewer_id -> viewer peer
+viewers: Dict[str, Dict[str, Peer]] = {}
+# Dashboard connections for stream list updates, each with its own outbound queue
+dashboard_connections = FanoutHub(
+    FanoutPolicy.from_env(), lambda kind, seconds: fanout_delivery_seconds.observe(seconds, kind=kind))
+# Filters of dashboards that subscribed to part of the stream list and alerts
+dashboard_subscriptions = SubscriberIndex()
+# Heartbeats and dead-socket reaping for every WebSocket above
+connections = ConnectionManager(lambda role, reason, count: connections_reaped.inc(count, role=role, reason=reason))
+# Shares signaling, stream changes and alerts with other workers (Redis when STATE_BUS_URL is set)
+state_bus = create_bus()
+# stream_id -> worker_id of active streams broadcasting through another worker
+remote_stream_owners: Dict[str, str] = {}
+
+# Metrics exposed at /metrics
+analyze_frame_seconds = Histogram(
+    "alertstream_analyze_frame_seconds", "Time from receiving a frame to its analysis result", ["provider"])
+frame_bytes = Histogram(
+    "alertstream_frame_bytes", "Size of frames received for analysis",
+    buckets=(16e3, 32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6))
+preprocess_seconds = Histogram(
+    "alertstream_frame_preprocess_seconds", "Time spent decoding, checking and re-encoding one frame",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5))
+preprocess_bytes = Counter(
+    "alertstream_frame_preprocess_bytes_total", "Frame bytes before and after preprocessing", ["stage"])
+fanout_enqueue_seconds = Histogram(
+    "alertstream_fanout_enqueue_seconds", "Time spent queueing one message for every dashboard (not sending it)", ["kind"],
+    buckets=(1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1))
+fanout_delivery_seconds = Histogram(
+    "alertstream_fanout_delivery_seconds", "Time from queueing a message for a dashboard until it was sent", ["kind"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+alert_events = Counter("alertstream_alert_events_total", "Alert events sent to dashboards", ["type"])
+fanout_messages = Counter("alertstream_fanout_messages_total", "Messages queued for dashboards", ["kind"])
+signaling_messages = Counter(
+    "alertstream_signaling_messages_total", "Signaling messages received over WebSockets", ["role", "type"])
+upload_bytes = Counter("alertstream_upload_bytes_total", "Recording bytes written to disk", ["method"])
+upload_seconds = Histogram(
+    "alertstream_upload_seconds", "Time spent receiving one upload request", ["method"],
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+frame_ingest_messages = Counter(
+    "alertstream_frame_ingest_messages_total", "Messages on frame-ingest WebSockets", ["direction", "type"])
+connections_reaped = Counter(
+    "alertstream_connections_reaped_total", "WebSocket connections removed as dead or idle", ["role", "reason"])
+Gauge("alertstream_broadcasters", "Broadcasters connected to this worker", callback=lambda: len(broadcasters))
+Gauge("alertstream_viewers", "Viewers connected to this worker", callback=lambda: sum(len(v) for v in viewers.values()))
+Gauge("alertstream_dashboards", "Dashboards connected to this worker", callback=lambda: len(dashboard_connections))
+Gauge("alertstream_active_streams", "Active streams across all workers", callback=lambda: len(active_streams))
+Gauge("alertstream_past_streams", "Recorded streams", callback=lambda: len(past_streams))
+
+# Known signaling message types; anything else is counted as "other" to bound label values
+SIGNALING_TYPES = {"start_stream", "update_location", "offer", "answer", "ice_candidate", "stop_stream", "pong"}
+
+
+def count_signaling(role: str, message_type) -> None:
+    known = isinstance(message_type, str) and message_type in SIGNALING_TYPES
+    signaling_messages.inc(role=role, type=message_type if known else "other")
+
+
+def publish_to_dashboards(kind: str, text: str, subscribers: Iterable[str] = ()):
+    """Queue a message for every unfiltered dashboard on this worker and the listed subscribers, recording fan-out cost."""
+    start = time.perf_counter()
+    count = dashboard_connections.publish(kind, text, subscribers)
+    fanout_enqueue_seconds.observe(time.perf_counter() - start, kind=kind)
+    fanout_messages.inc(count, kind=kind)
+
+
+def filtered_snapshot(conn_id: str) -> str:
+    """Stream list limited to a subscribed dashboard's filter. Its streams are then followed for changes."""
+    sub = dashboard_subscriptions.get(conn_id) or Subscription()
+    dashboard_subscriptions.unfollow(conn_id)
+    lists = {}
+    for kind in (ACTIVE, PAST):
+        if kind == PAST and not sub.include_past:
+            lists[kind] = []
+            continue
+        streams = active_streams if kind == ACTIVE else past_streams
+        if not sub.filters_streams:
+            stream_ids = list(streams)
+        else:
+            in_region = stream_state.indexes[kind].bbox(sub.region) if sub.region is not None else []
+            listed = [stream_id for stream_id in sub.stream_ids or () if stream_id in streams]
+            stream_ids = list(dict.fromkeys(in_region + listed))
+        dashboard_subscriptions.follow(conn_id, kind, stream_ids)
+        lists[kind] = stream_state.records(kind, stream_ids)
+    return dumps({
+        "type": "stream_list",
+        "seq": stream_state.seq,
+        "streams": lists[ACTIVE],
+        "past_streams": lists[PAST],
+        "filter": sub.to_dict(),
     })
-    
-    disconnected = []
-    for ws in dashboard_connections:
-        try:
-            await ws.send_text(message)
-        except:
-            disconnected.append(ws)
-    
-    for ws in disconnected:
-        dashboard_connections.remove(ws)
+
+
+def route_stream_change(change: dict) -> Set[str]:
+    """Subscribed dashboards a stream-list delta should go to."""
+    kind = change.get("kind", ACTIVE)
+    if change["type"] == "stream_removed":
+        return dashboard_subscriptions.route_removed(kind, change["ids"])
+    if change["type"] == "stream_positions":
+        routed, entering = dashboard_subscriptions.route_positions(
+            ACTIVE, [(p["id"], p["latitude"], p["longitude"]) for p in change["positions"]])
+        for conn_id in entering:
+            # A stream moved into view; the delta alone has no record of it
+            conn = dashboard_connections.connections.get(conn_id)
+            if conn is not None and conn.snapshot is not None and not conn.enqueue(KIND_SNAPSHOT, conn.snapshot()):
+                dashboard_connections.evict(conn)
+        return routed
+    stream = change["stream"]
+    return dashboard_subscriptions.route_stream(kind, stream["id"], stream["latitude"], stream["longitude"], past=kind == PAST)
+
+
+async def broadcast_stream_change(delta: Optional[Delta], replicate: bool = True):
+    """Notify dashboard connections of a single stream list change."""
+    if delta is not None:
+        publish_to_dashboards(KIND_DELTA, delta.text, route_stream_change(delta.change) if dashboard_subscriptions else ())
+        if replicate:
+            # Other workers apply the change to their own state and dashboards
+            state_bus.publish("streams", {"delta": delta.text, "worker": state_bus.worker_id})
+
+
+async def flush_locations(positions: Dict[str, tuple]):
+    """Send every stream that moved since the last tick in one message."""
+    await broadcast_stream_change(stream_state.move(positions))
+
+
+# Coalesces update_location messages into one batched update per tick
+location_ticker = LocationTicker(flush_locations)
+# In-progress resumable recording uploads
+chunked_uploads = ChunkedUploads(PARTIAL_UPLOADS_DIR)
+# Persistent past-stream metadata
+recording_store = RecordingStore(RECORDINGS_DB)
+
+
+async def on_thumbnail_ready(stream_id: str, thumbnail_url: str):
+    """Attach a freshly rendered poster to its recording."""
+    delta = stream_state.update(PAST, stream_id, thumbnail_url=thumbnail_url)
+    if delta is not None:
+        recording_store.upsert(stream_state.record(PAST, stream_id))
+        await broadcast_stream_change(delta)
+
+
+# Poster images for past streams, rendered in the background
+thumbnailer = Thumbnailer(RECORDINGS_DIR / "thumbnails", on_thumbnail_ready)
+
+
+def delete_recording_files(video_filenames: List[str]):
+    """Blocking: delete recordings and their posters. Run in a worker thread."""
+    for video_filename in video_filenames:
+        (RECORDINGS_DIR / video_filename).unlink(missing_ok=True)
+        thumbnailer.discard(video_filename)
+
+
+async def remove_recordings(stream_ids: List[str], video_filenames: Optional[List[str]] = None):
+    """Delete recordings and their metadata, notifying dashboards once for the whole batch."""
+    if video_filenames is None:
+        video_filenames = [past_streams[i].video_filename for i in stream_ids if i in past_streams]
+    unknown = [i for i in stream_ids if i not in past_streams]
+    await asyncio.to_thread(delete_recording_files, video_filenames)
+    delta = stream_state.remove(PAST, stream_ids)
+    recording_store.delete(stream_ids)
+    await broadcast_stream_change(delta)
+    if unknown:
+        # Recordings this worker never heard about may still be listed on other workers
+        removed = dumps({"type": "stream_removed", "kind": PAST, "ids": unknown})
+        state_bus.publish("streams", {"delta": removed, "worker": state_bus.worker_id})
+
+
+async def stored_recordings() -> List[Tuple[str, str, bool]]:
+    """Every recording in the metadata store shared by all workers."""
+    await recording_store.flush()
+    return [(row["id"], row["video_filename"], row["pinned"]) for row in await recording_store.load_all()]
+
+
+async def evict_recordings(recordings: List[Tuple[str, str, bool]]):
+    await remove_recordings([stream_id for stream_id, _, _ in recordings], [filename for _, filename, _ in recordings])
+
+
+# Enforces recording max age and disk quota, and cleans up orphans
+retention_janitor = RetentionJanitor(
+    RECORDINGS_DIR,
+    stored_recordings,
+    evict_recordings,
+    thumbnails_dir=thumbnailer.output_dir,
+)
+
+
+@app.on_event("startup")
+async def load_past_streams():
+    await recording_store.start()
+    # Young files without metadata may be uploads another worker is still registering
+    rows, added, removed = await recording_store.reconcile(RECORDINGS_DIR, retention_janitor.orphan_grace)
+    stream_state.load(PAST, [PastStreamInfo(**row) for row in rows])
+    for info in past_streams.values():
+        if not info.thumbnail_url:
+            thumbnailer.request(info.id, RECORDINGS_DIR / info.video_filename)
+    retention_janitor.start()
+    chunked_uploads.start()
+
+
+@app.on_event("shutdown")
+async def close_recording_store():
+    await chunked_uploads.stop()
+    await retention_janitor.stop()
+    await thumbnailer.close()
+    await recording_store.close()
+
+
+@app.on_event("startup")
+async def start_location_ticker():
+    location_ticker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_fanout():
+    await location_ticker.stop()
+    await dashboard_connections.close_all()
+
+
+def prune_registries() -> Dict[str, int]:
+    """Drop registry entries whose socket is no longer tracked (a handler that exited without cleaning up)."""
+    pruned = {"broadcaster": 0, "viewer": 0, "dashboard": 0}
+    for stream_id, peer in list(broadcasters.items()):
+        if not connections.tracks(peer.websocket):
+            del broadcasters[stream_id]
+            pruned["broadcaster"] += 1
+    for stream_id, stream_viewers in list(viewers.items()):
+        for viewer_id, peer in list(stream_viewers.items()):
+            if not connections.tracks(peer.websocket):
+                del stream_viewers[viewer_id]
+                pruned["viewer"] += 1
+        if not stream_viewers and stream_id not in active_streams:
+            del viewers[stream_id]
+    for conn in list(dashboard_connections.connections.values()):
+        if not connections.tracks(conn.websocket):
+            dashboard_connections.discard(conn)
+            dashboard_subscriptions.remove(conn.id)
+            pruned["dashboard"] += 1
+    return pruned
+
+
+connections.prune = prune_registries
+
+
+@app.on_event("startup")
+async def start_connection_reaper():
+    connections.start()
+
+
+@app.on_event("shutdown")
+async def stop_connection_reaper():
+    await connections.stop()
+
+
+async def remove_remote_streams(stream_ids: List[str]):
+    """Drop active streams broadcasting through other workers."""
+    for stream_id in stream_ids:
+        remote_stream_owners.pop(stream_id, None)
+    delta = stream_state.remove(ACTIVE, stream_ids)
+    for stream_id in stream_ids:
+        alert_aggregator.close_stream(stream_id)
+        await end_local_viewers(stream_id)
+    await broadcast_stream_change(delta, replicate=False)
+
+
+async def on_remote_stream_change(message: dict):
+    """Apply a stream list change made on another worker."""
+    change = loads(message["delta"])
+    kind = change.get("kind", ACTIVE)
+    if change["type"] in ("stream_added", "stream_updated"):
+        info = (StreamInfo if kind == ACTIVE else PastStreamInfo)(**change["stream"])
+        is_new = info.id not in (active_streams if kind == ACTIVE else past_streams)
+        delta = stream_state.put(kind, info)
+        if kind == ACTIVE and message.get("worker") and info.id not in broadcasters:
+            remote_stream_owners[info.id] = message["worker"]
+        if kind == ACTIVE and is_new:
+            # Viewers on this worker that were already waiting need offers
+            for viewer_id in list(viewers.get(info.id, {})):
+                await send_to_broadcaster(info.id, {"type": "viewer_joined", "viewer_id": viewer_id})
+    elif change["type"] == "stream_removed":
+        if kind == ACTIVE:
+            await remove_remote_streams(change["ids"])
+            return
+        delta = stream_state.remove(kind, change["ids"])
+    elif change["type"] == "stream_positions":
+        delta = stream_state.move({p["id"]: (p["latitude"], p["longitude"]) for p in change["positions"]})
+    else:
+        return
+    await broadcast_stream_change(delta, replicate=False)
+
+
+async def on_remote_signal(message: dict):
+    """Deliver a signaling message addressed to a broadcaster or viewer connected here."""
+    stream_id = message["stream_id"]
+    if message["to"] == "broadcaster":
+        broadcaster = broadcasters.get(stream_id)
+        if broadcaster is not None:
+            await send_to_peer(broadcaster, message["message"])
+    else:
+        await deliver_to_viewers(stream_id, message.get("viewer_id"), message["message"])
+
+
+async def on_remote_alert(message: dict):
+    event = loads(message["alert"])
+    subscribers = ()
+    if "alert_id" in event:
+        alert_aggregator.remember(event)
+        if dashboard_subscriptions:
+            subscribers = dashboard_subscriptions.route_alert(event)
+    publish_to_dashboards(KIND_ALERT, message["alert"], subscribers)
+
+
+def publish_local_streams(change_type: str):
+    """Announce (or withdraw) the streams broadcasting through this worker."""
+    stream_ids = [stream_id for stream_id in broadcasters if stream_id in active_streams]
+    if not stream_ids:
+        return
+    if change_type == "stream_removed":
+        delta = dumps({"type": "stream_removed", "kind": ACTIVE, "ids": stream_ids})
+        state_bus.publish("streams", {"delta": delta, "worker": state_bus.worker_id})
+        return
+    for stream_id in stream_ids:
+        delta = dumps({"type": change_type, "kind": ACTIVE, "stream": stream_state.record(ACTIVE, stream_id)})
+        state_bus.publish("streams", {"delta": delta, "worker": state_bus.worker_id})
+
+
+async def on_sync_request(message: dict):
+    publish_local_streams("stream_added")
+
+
+async def on_worker_lost(worker_id: str):
+    """A worker stopped heartbeating (e.g. it was killed): its streams will never send stream_removed."""
+    stream_ids = [
+        stream_id for stream_id, owner in remote_stream_owners.items()
+        if owner == worker_id and stream_id not in broadcasters
+    ]
+    if stream_ids:
+        logger.warning("Dropping %d streams of lost worker %s", len(stream_ids), worker_id)
+        await remove_remote_streams(stream_ids)
+
+
+@app.on_event("startup")
+async def start_state_bus():
+    state_bus.subscribe("streams", on_remote_stream_change)
+    state_bus.subscribe("signal", on_remote_signal)
+    state_bus.subscribe("alerts", on_remote_alert)
+    state_bus.subscribe("sync", on_sync_request)
+    # Learn about streams already live on other workers whenever the bus (re)connects
+    state_bus.on_ready = lambda: state_bus.publish("sync", {"type": "sync_request"})
+    state_bus.on_peer_lost = on_worker_lost
+    await state_bus.start()
+
+
+@app.on_event("shutdown")
+async def close_state_bus():
+    publish_local_streams("stream_removed")
+    await state_bus.close()
 
 
 @app.get("/")
@@ -152,7 +526,8 @@ async def test_ai():
     # Test Gemini
     if model:
         try:
-            response = model.generate_content(
+            response = await inference_engine.run_blocking(
+                model.generate_content,
                 model='gemini-2.0-flash',
                 contents={'parts': [{'text': 'Say "OK" if you can read this.'}]}
             )
@@ -165,26 +540,20 @@ async def test_ai():
     # Test OpenRouter
     if OPENROUTER_API_KEY:
         try:
-            import httpx
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://openrouter.ai/api/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": "openai/gpt-4o-mini",
-                        "messages": [{"role": "user", "content": "Say OK"}]
-                    },
-                    timeout=15.0
-                )
-                if response.status_code == 200:
-                    results["openrouter"]["status"] = "working"
-                    results["openrouter"]["response"] = response.json()['choices'][0]['message']['content'][:100]
-                else:
-                    results["openrouter"]["status"] = "failed"
-                    results["openrouter"]["error"] = f"HTTP {response.status_code}: {response.text[:200]}"
+            response = await ai_clients.openrouter.post(
+                "/chat/completions",
+                json={
+                    "model": "openai/gpt-4o-mini",
+                    "messages": [{"role": "user", "content": "Say OK"}]
+                },
+                timeout=15.0
+            )
+            if response.status_code == 200:
+                results["openrouter"]["status"] = "working"
+                results["openrouter"]["response"] = response.json()['choices'][0]['message']['content'][:100]
+            else:
+                results["openrouter"]["status"] = "failed"
+                results["openrouter"]["error"] = f"HTTP {response.status_code}: {response.text[:200]}"
         except Exception as e:
             results["openrouter"]["status"] = "failed"
             results["openrouter"]["error"] = str(e)
@@ -192,16 +561,145 @@ async def test_ai():
     return results
 
 
+@app.get("/stats")
+async def get_stats():
+    """Runtime statistics, including per-dashboard queue depth."""
+    return {
+        "dashboards": dashboard_connections.stats(),
+        "dashboard_subscriptions": dashboard_subscriptions.stats(),
+        "connections": connections.stats(),
+        "stream_state": {"seq": stream_state.seq, "snapshot_builds": stream_state.snapshot_builds},
+        "locations": location_ticker.stats(),
+        "ai_sentry": inference_engine.stats(),
+        "frame_cache": frame_cache.stats(),
+        "frame_preprocess": frame_preprocessor.stats(),
+        "alerts": alert_aggregator.stats(),
+        "frame_ingest": frame_rates.stats(),
+        "ai_clients": ai_clients.stats(),
+        "ai_providers": provider_router.stats(),
+        "ai_batching": frame_batcher.stats(),
+        "recording_store": recording_store.stats(),
+        "state_bus": {**state_bus.stats(), "remote_streams": len(remote_stream_owners)},
+        "thumbnails": thumbnailer.stats(),
+        "retention": retention_janitor.stats(),
+        "uploads": chunked_uploads.stats(),
+        "wire": wire.stats(),
+    }
+
+
+def spatial_filter(kind: str, bbox: Optional[str], near: Optional[str], radius: float) -> Optional[List[str]]:
+    """Stream IDs matching bbox=min_lng,min_lat,max_lng,max_lat and/or near=lat,lng, or None if unfiltered."""
+    try:
+        box: Optional[BBox] = parse_bbox(bbox) if bbox else None
+        point = parse_point(near) if near else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid bbox or near parameter")
+    return stream_state.indexes[kind].query(bbox=box, near=point, radius=radius)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics for this worker."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 @app.get("/streams")
-async def get_streams():
-    """Get list of active streams."""
-    return {"streams": [asdict(s) for s in active_streams.values()]}
+async def get_streams(
+    bbox: Optional[str] = None,
+    near: Optional[str] = None,
+    radius: float = Query(1000, gt=0)
+):
+    """Get list of active streams, optionally within bbox or radius meters of near."""
+    return {"streams": stream_state.records(ACTIVE, spatial_filter(ACTIVE, bbox, near, radius))}
+
+
+@app.get("/streams/nearby")
+async def get_nearby_streams(lat: float, lng: float, radius: float = Query(1000, gt=0)):
+    """Live cameras within radius meters of a point (e.g. an alert), closest first."""
+    try:
+        check_point(lat, lng)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"streams": nearby_streams(lat, lng, radius)}
+
+
+def message_point(message: dict) -> Tuple[float, float]:
+    """The latitude/longitude of a socket message (0 if omitted). Raises ValueError if they are invalid."""
+    return check_point(message.get("latitude", 0), message.get("longitude", 0))
+
+
+def require_point(latitude: float, longitude: float):
+    """400 for coordinates the spatial index cannot hold."""
+    try:
+        check_point(latitude, longitude)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def nearby_streams(lat: float, lng: float, radius: float) -> List[dict]:
+    return [
+        {**stream_state.record(ACTIVE, stream_id), "distance_meters": round(distance, 1)}
+        for stream_id, distance in stream_state.indexes[ACTIVE].near(lat, lng, radius)
+    ]
 
 
 @app.get("/past-streams")
-async def get_past_streams():
-    """Get list of past recorded streams."""
-    return {"past_streams": [asdict(s) for s in past_streams.values()]}
+async def get_past_streams(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    bbox: Optional[str] = None,
+    near: Optional[str] = None,
+    radius: float = Query(1000, gt=0)
+):
+    """Get past recorded streams, newest first.
+
+    since/until (ISO timestamps) keep recordings overlapping that range;
+    bbox/near/radius filter by location like /streams;
+    pass next_cursor back as cursor to fetch the next page.
+    """
+    stream_ids = spatial_filter(PAST, bbox, near, radius)
+    try:
+        if stream_ids is None:
+            # Include uploads, pins and deletes that are still queued
+            await recording_store.flush()
+            rows, next_cursor = await recording_store.query(since, until, cursor, limit)
+        else:
+            # Location-filtered pages come from the in-memory spatial index
+            rows, next_cursor = paginate(stream_state.records(PAST, stream_ids), since, until, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"past_streams": rows, "next_cursor": next_cursor}
+
+
+mimetypes.add_type("video/webm", ".webm")
+
+
+async def serve_recording_file(directory: Path, filename: str, request: Request) -> RecordingResponse:
+    if "/" in filename or "\\" in filename or filename.startswith("."):
+        raise HTTPException(status_code=404, detail="Recording not found")
+    path = directory / filename
+    try:
+        stat_result = await asyncio.to_thread(path.stat)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    if not S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=404, detail="Recording not found")
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return RecordingResponse(path, stat_result, request.headers, media_type)
+
+
+@app.api_route("/recordings/{filename}", methods=["GET", "HEAD"])
+async def get_recording(filename: str, request: Request):
+    """Serve a recording with byte ranges and conditional requests."""
+    return await serve_recording_file(RECORDINGS_DIR, filename, request)
+
+
+@app.api_route("/recordings/thumbnails/{filename}", methods=["GET", "HEAD"])
+async def get_recording_thumbnail(filename: str, request: Request):
+    """Serve a recording's poster image."""
+    return await serve_recording_file(thumbnailer.output_dir, filename, request)
 
 
 @app.get("/past-streams/{stream_id}")
@@ -209,7 +707,7 @@ async def get_past_stream(stream_id: str):
     """Get a specific past stream."""
     if stream_id not in past_streams:
         raise HTTPException(status_code=404, detail="Stream not found")
-    return asdict(past_streams[stream_id])
+    return stream_state.record(PAST, stream_id)
 
 
 @app.post("/upload-recording")
@@ -224,16 +722,36 @@ async def upload_recording(
     video: UploadFile = File(...)
 ):
     """Upload a recorded stream video."""
+    require_point(latitude, longitude)
     # Generate unique filename
-    video_filename = f"{stream_id}_{uuid.uuid4().hex[:8]}.webm"
-    video_path = RECORDINGS_DIR / video_filename
+    video_filename = new_video_filename(stream_id)
     
-    # Save the video file
-    with open(video_path, "wb") as f:
-        content = await video.read()
-        f.write(content)
+    # Stream the video file to disk in chunks
+    start = time.perf_counter()
+    written = await save_upload(video, RECORDINGS_DIR / video_filename)
+    upload_bytes.inc(written, method="single")
+    upload_seconds.observe(time.perf_counter() - start, method="single")
     
-    # Store metadata
+    return await register_recording(
+        stream_id, started_at, ended_at, latitude, longitude, notes, duration_seconds, video_filename
+    )
+
+
+def new_video_filename(stream_id: str) -> str:
+    return f"{stream_id}_{uuid.uuid4().hex[:8]}.webm"
+
+
+async def register_recording(
+    stream_id: str,
+    started_at: str,
+    ended_at: str,
+    latitude: float,
+    longitude: float,
+    notes: str,
+    duration_seconds: float,
+    video_filename: str,
+) -> dict:
+    """Store metadata for a saved recording and notify dashboards."""
     past_stream = PastStreamInfo(
         id=stream_id,
         started_at=started_at,
@@ -245,12 +763,79 @@ async def upload_recording(
         video_filename=video_filename,
         video_url=f"/recordings/{video_filename}"
     )
-    past_streams[stream_id] = past_stream
+    delta = stream_state.put(PAST, past_stream)
+    recording_store.upsert(asdict(past_stream))
+    thumbnailer.request(stream_id, RECORDINGS_DIR / video_filename)
     
     # Notify dashboards
-    await broadcast_stream_list()
+    await broadcast_stream_change(delta)
     
-    return {"success": True, "stream": asdict(past_stream)}
+    return {"success": True, "stream": stream_state.record(PAST, stream_id)}
+
+
+@app.post("/uploads")
+async def init_upload(
+    stream_id: str = Form(...),
+    started_at: str = Form(...),
+    latitude: float = Form(0),
+    longitude: float = Form(0),
+    notes: str = Form(""),
+):
+    """Start a resumable recording upload."""
+    require_point(latitude, longitude)
+    session = await chunked_uploads.init(stream_id, started_at, latitude, longitude, notes)
+    return session.info()
+
+
+@app.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Current offset of a resumable upload, used to resume after a dropped connection."""
+    return chunked_uploads.get(upload_id).info()
+
+
+@app.put("/uploads/{upload_id}")
+async def append_upload(upload_id: str, offset: int, request: Request):
+    """Append the raw request body to a resumable upload at the given byte offset."""
+    start = time.perf_counter()
+    session = await chunked_uploads.append(upload_id, offset, request.stream())
+    upload_bytes.inc(session.offset - offset, method="resumable")
+    upload_seconds.observe(time.perf_counter() - start, method="resumable")
+    return session.info()
+
+
+@app.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(
+    upload_id: str,
+    ended_at: str = Form(...),
+    duration_seconds: float = Form(...),
+    latitude: Optional[float] = Form(None),
+    longitude: Optional[float] = Form(None),
+    notes: Optional[str] = Form(None),
+):
+    """Complete a resumable upload and register it as a past stream."""
+    session = chunked_uploads.get(upload_id)
+    latitude = latitude if latitude is not None else session.latitude
+    longitude = longitude if longitude is not None else session.longitude
+    require_point(latitude, longitude)
+    video_filename = new_video_filename(session.stream_id)
+    await chunked_uploads.finalize(upload_id, RECORDINGS_DIR / video_filename)
+    return await register_recording(
+        session.stream_id,
+        session.started_at,
+        ended_at,
+        latitude,
+        longitude,
+        notes if notes is not None else session.notes,
+        duration_seconds,
+        video_filename,
+    )
+
+
+@app.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    """Discard a resumable upload."""
+    await chunked_uploads.abort(upload_id)
+    return {"success": True}
 
 
 @app.delete("/past-streams/{stream_id}")
@@ -259,87 +844,291 @@ async def delete_past_stream(stream_id: str):
     if stream_id not in past_streams:
         raise HTTPException(status_code=404, detail="Stream not found")
     
-    # Delete the video file
-    video_path = RECORDINGS_DIR / past_streams[stream_id].video_filename
-    if video_path.exists():
-        video_path.unlink()
-    
-    # Remove from metadata
-    del past_streams[stream_id]
-    
-    # Notify dashboards
-    await broadcast_stream_list()
+    # Delete the video file, its poster and metadata, then notify dashboards
+    await remove_recordings([stream_id])
     
     return {"success": True}
 
 
-async def broadcast_alert(stream_id: str, latitude: float, longitude: float, threat_type: str):
-    """Send threat alert to all dashboard connections."""
-    print(f"[AI Sentry] Broadcasting alert: {threat_type} at ({latitude}, {longitude})")
-    
-    message = json.dumps({
-        "type": "alert",
-        "stream_id": stream_id,
-        "latitude": latitude,
-        "longitude": longitude,
-        "threat_type": threat_type,
-        "timestamp": datetime.now().isoformat()
-    })
+async def set_pinned(stream_id: str, pinned: bool) -> dict:
+    if stream_id not in past_streams:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    delta = stream_state.update(PAST, stream_id, pinned=pinned)
+    if delta is not None:
+        recording_store.upsert(stream_state.record(PAST, stream_id))
+        await broadcast_stream_change(delta)
+    return {"success": True, "stream": stream_state.record(PAST, stream_id)}
+
+
+@app.post("/past-streams/{stream_id}/pin")
+async def pin_past_stream(stream_id: str):
+    """Keep a recording regardless of retention limits."""
+    return await set_pinned(stream_id, True)
+
+
+@app.delete("/past-streams/{stream_id}/pin")
+async def unpin_past_stream(stream_id: str):
+    """Make a recording subject to retention again."""
+    return await set_pinned(stream_id, False)
+
+
+def broadcast_alert(event: dict):
+    """Send an alert_opened/alert_updated/alert_closed event to all dashboard connections."""
+    logger.debug("Broadcasting %s %s: %s", event["type"], event["alert_id"], event["threat_type"])
+    alert_events.inc(type=event["type"])
     
-    disconnected = []
-    for ws in dashboard_connections:
-        try:
-            await ws.send_text(message)
-            print(f"[AI Sentry] Alert sent to dashboard connection")
-        except Exception as e:
-            print(f"[AI Sentry] Failed to send alert: {e}")
-            disconnected.append(ws)
+    if event["closed_at"] is None:
+        # Other live cameras that may cover the same incident
+        event["nearby_stream_ids"] = [
+            s["id"] for s in nearby_streams(event["latitude"], event["longitude"], ALERT_NEARBY_RADIUS_METERS)
+            if s["id"] != event["stream_id"]
+        ]
+    message = dumps(event)
     
-    for ws in disconnected:
-        dashboard_connections.remove(ws)
+    # Alerts are queued per dashboard and never dropped for slow consumers
+    publish_to_dashboards(KIND_ALERT, message, dashboard_subscriptions.route_alert(event) if dashboard_subscriptions else ())
+    state_bus.publish("alerts", {"alert": message})
+
+
+# Opens one alert per incident per stream instead of one per positive frame
+alert_aggregator = AlertAggregator(broadcast_alert)
+
 
+@app.on_event("startup")
+async def start_alert_aggregator():
+    alert_aggregator.start()
 
-async def analyze_with_openrouter(image_data: bytes, content_type: str) -> str:
+
+@app.on_event("shutdown")
+async def stop_alert_aggregator():
+    await alert_aggregator.stop()
+
+
+@app.get("/alerts/recent")
+async def get_recent_alerts(limit: int = Query(50, ge=1, le=500), stream_id: Optional[str] = None, open_only: bool = False):
+    """Recent alerts, most recently changed first, for dashboards catching up after a reconnect."""
+    return {"alerts": alert_aggregator.recent(limit, stream_id, open_only)}
+
+
+async def analyze_with_openrouter(frame: Frame) -> str:
     """Analyze image using OpenRouter API with OpenAI GPT-4o vision model."""
-    import httpx
-    
-    image_base64 = base64.b64encode(image_data).decode('utf-8')
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "openai/gpt-4o",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "Analyze this image. List ALL that are visible: 1) GUN - NERF toy blaster (teal/slate blue body, orange NERF logo, TRIO ELITE 2.0, three orange barrels), 2) SUSPECT - CRITICAL: Person MUST be wearing a GREY colored hoodie/jacket. If clothing is NOT grey (black, blue, white, any other color) then DO NOT mark as SUSPECT. Also requires transparent/clear rectangular glasses. Do NOT classify anyone as SUSPECT unless their hoodie/jacket is clearly GREY colored. Reply with comma-separated list (e.g. 'GUN,SUSPECT' or 'GUN' or 'NONE' if nothing detected)."
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{content_type or 'image/jpeg'};base64,{image_base64}"
-                                }
+    response = await ai_clients.openrouter.post(
+        "/chat/completions",
+        json={
+            "model": "openai/gpt-4o",
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": "Analyze this image. List ALL that are visible: 1) GUN - NERF toy blaster (teal/slate blue body, orange NERF logo, TRIO ELITE 2.0, three orange barrels), 2) SUSPECT - CRITICAL: Person MUST be wearing a GREY colored hoodie/jacket. If clothing is NOT grey (black, blue, white, any other color) then DO NOT mark as SUSPECT. Also requires transparent/clear rectangular glasses. Do NOT classify anyone as SUSPECT unless their hoodie/jacket is clearly GREY colored. Reply with comma-separated list (e.g. 'GUN,SUSPECT' or 'GUN' or 'NONE' if nothing detected)."
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{frame.mime_type};base64,{frame.base64}"
                             }
-                        ]
+                        }
+                    ]
+                }
+            ]
+        }
+    )
+    
+    if response.status_code == 200:
+        result = response.json()
+        return result['choices'][0]['message']['content'].strip().upper()
+    else:
+        raise Exception(f"OpenRouter API error: {response.status_code} - {response.text}")
+
+
+GEMINI_PROMPT = 'IMPORTANT: You are analyzing a security camera feed for emergency monitoring. This is a safety system to detect TOY GUNS and specific individuals for training purposes.\n\nAnalyze this image and identify if ANY of these are visible:\n\n1) GUN - A NERF TOY BLASTER (harmless plastic toy gun). Look for: teal/slate blue plastic body, bright orange NERF logo, text \'TRIO ELITE 2.0\', three orange plastic barrels. This is a CHILDREN\'S TOY, not a real weapon.\n\n2) SUSPECT - A specific person wearing: GREY colored hoodie/jacket (NOT black, blue, white, or any other color - must be GREY) AND transparent/clear rectangular glasses. Both items are REQUIRED.\n\nReply ONLY with a comma-separated list: \'GUN\' (if toy blaster visible), \'SUSPECT\' (if person matches description), \'GUN,SUSPECT\' (if both visible), or \'NONE\' (if neither visible).'
+
+
+async def analyze_with_gemini(frame: Frame) -> str:
+    """Analyze image using Gemini. The SDK call is blocking, so it runs in the AI worker pool."""
+    response = await inference_engine.run_blocking(
+        model.generate_content,
+        model='gemini-2.0-flash',
+        contents={
+            'parts': [
+                {'text': GEMINI_PROMPT},
+                {
+                    'inline_data': {
+                        'mime_type': frame.mime_type,
+                        'data': frame.base64
                     }
-                ]
-            },
-            timeout=30.0
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result['choices'][0]['message']['content'].strip().upper()
-        else:
-            raise Exception(f"OpenRouter API error: {response.status_code} - {response.text}")
+                }
+            ]
+        }
+    )
+    return response.text.strip().upper()
+
+
+BATCH_PROMPT = (
+    "IMPORTANT: You are analyzing {count} security camera frames for emergency monitoring, labelled Image 1 to Image {count}. "
+    "This is a safety system to detect TOY GUNS and specific individuals for training purposes.\n\n"
+    "For EACH image, identify if ANY of these are visible:\n\n"
+    "1) GUN - A NERF TOY BLASTER (harmless plastic toy gun). Look for: teal/slate blue plastic body, bright orange NERF logo, "
+    "text 'TRIO ELITE 2.0', three orange plastic barrels. This is a CHILDREN'S TOY, not a real weapon.\n\n"
+    "2) SUSPECT - A specific person wearing: GREY colored hoodie/jacket (NOT black, blue, white, or any other color - must be GREY) "
+    "AND transparent/clear rectangular glasses. Both items are REQUIRED.\n\n"
+    "Judge every image independently. Reply with exactly one line per image and nothing else, in the form "
+    "'IMAGE <number>: <verdict>' where <verdict> is 'GUN', 'SUSPECT', 'GUN,SUSPECT' or 'NONE'."
+)
+
+
+async def analyze_batch_with_gemini(frames: List[Frame]) -> str:
+    """Analyze several frames in one Gemini request."""
+    parts = [{'text': BATCH_PROMPT.format(count=len(frames))}]
+    for i, frame in enumerate(frames, start=1):
+        parts.append({'text': f'Image {i}:'})
+        parts.append({
+            'inline_data': {
+                'mime_type': frame.mime_type,
+                'data': frame.base64
+            }
+        })
+    response = await inference_engine.run_blocking(
+        model.generate_content,
+        model='gemini-2.0-flash',
+        contents={'parts': parts}
+    )
+    return response.text.strip()
+
+
+async def analyze_batch_with_openrouter(frames: List[Frame]) -> str:
+    """Analyze several frames in one OpenRouter request."""
+    content = [{"type": "text", "text": BATCH_PROMPT.format(count=len(frames))}]
+    for i, frame in enumerate(frames, start=1):
+        content.append({"type": "text", "text": f"Image {i}:"})
+        content.append({
+            "type": "image_url",
+            "image_url": {"url": f"data:{frame.mime_type};base64,{frame.base64}"}
+        })
+    response = await ai_clients.openrouter.post(
+        "/chat/completions",
+        json={"model": "openai/gpt-4o", "messages": [{"role": "user", "content": content}]}
+    )
+    if response.status_code == 200:
+        return response.json()['choices'][0]['message']['content'].strip()
+    raise Exception(f"OpenRouter API error: {response.status_code} - {response.text}")
+
+
+async def run_frame_analysis(job: FrameJob) -> dict:
+    """Analyze one frame with the configured providers and alert dashboards on a threat."""
+    answer = None
+    
+    # Decode once off the loop: blank check, downscale/re-encode and the frame-cache hash
+    frame = await inference_engine.run_blocking(
+        frame_preprocessor.prepare, job.image_data, job.content_type, frame_cache.enabled
+    )
+    frame_preprocessor.record(frame)
+    preprocess_seconds.observe(frame.seconds)
+    preprocess_bytes.inc(frame.input_bytes, stage="input")
+    preprocess_bytes.inc(len(frame.data), stage="output")
+    if frame.blank:
+        logger.debug("Skipping blank frame from %s", job.stream_id)
+        return {
+            "success": True,
+            "threat_detected": False,
+            "detection_types": [],
+            "analysis": "BLANK",
+            "stream_id": job.stream_id,
+            "cached": False,
+            "provider": "preprocess"
+        }
+    
+    # Reuse the analysis of a near-identical recent frame from the same stream
+    frame_hash = frame.frame_hash
+    cached = frame_cache.lookup(job.stream_id, frame_hash)
+    if cached is not None:
+        answer = cached["analysis"]
+        logger.debug("Frame cache hit: %r", answer)
+    
+    # Route to the healthiest provider (Gemini first while both are healthy)
+    provider = "cache"
+    if answer is None:
+        answer, provider = await frame_batcher.analyze(job.stream_id, frame)
+        logger.debug("%s response: %r", provider, answer)
+    
+    if not answer:
+        raise Exception("All AI providers failed")
+    
+    if cached is None:
+        frame_cache.store(job.stream_id, frame_hash, {"analysis": answer})
+    
+    # Determine what was detected (can be multiple)
+    gun_detected = "GUN" in answer
+    suspect_detected = "SUSPECT" in answer
+    threat_detected = gun_detected or suspect_detected
+    
+    # Build list of detected items
+    detection_types = []
+    if suspect_detected:
+        detection_types.append("suspect")
+    if gun_detected:
+        detection_types.append("gun")
+    
+    logger.debug("Detection result: gun=%s, suspect=%s", gun_detected, suspect_detected)
+    
+    # Opens, updates or keeps the stream's alert; dashboards hear about changes only
+    alert_id = alert_aggregator.observe(job.stream_id, job.latitude, job.longitude, detection_types)
+    
+    return {
+        "success": True,
+        "threat_detected": threat_detected,
+        "detection_types": detection_types,
+        "analysis": answer,
+        "stream_id": job.stream_id,
+        "cached": cached is not None,
+        "provider": provider,
+        "alert_id": alert_id
+    }
+
+
+# Routes frames between providers using circuit breakers and latency tracking
+provider_router = ProviderRouter([
+    Provider("gemini", analyze_with_gemini, enabled=lambda: model is not None,
+             analyze_batch=analyze_batch_with_gemini),
+    Provider("openrouter", analyze_with_openrouter, enabled=lambda: ai_clients.openrouter is not None,
+             analyze_batch=analyze_batch_with_openrouter),
+])
+# Optionally groups frames from different streams into multi-image requests
+frame_batcher = FrameBatcher(provider_router)
+# Per-stream perceptual-hash cache of recent analyses
+frame_cache = FrameCache()
+# Decodes, checks and shrinks frames before they are sent to a provider
+frame_preprocessor = FramePreprocessor()
+# Runs frame analysis off the request path with per-stream latest-frame-wins slots
+inference_engine = InferenceEngine(run_frame_analysis)
+# Tells frame-ingest sockets how often to sample, from provider capacity and recent detections
+frame_rates = RateController(inference_engine, lambda: provider_router, alert_aggregator.is_hot)
+# Largest frame accepted over the frame-ingest WebSocket
+FRAME_MAX_BYTES = int(os.getenv("FRAME_MAX_BYTES", str(4 * 1024 * 1024)))
+
+
+@app.on_event("startup")
+async def start_frame_rates():
+    frame_rates.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_inference():
+    await frame_rates.stop()
+    await inference_engine.close()
+
+
+def observe_frame_latency(future: asyncio.Future, received_at: float):
+    if future.cancelled() or future.exception() is not None:
+        provider = "error"
+    elif future.result().get("status") == SUPERSEDED:
+        # Never analyzed
+        return
+    else:
+        provider = future.result().get("provider", "unknown")
+    analyze_frame_seconds.observe(time.perf_counter() - received_at, provider=provider)
 
 
 @app.post("/analyze-frame")
@@ -347,175 +1136,375 @@ async def analyze_frame(
     stream_id: str = Form(...),
     latitude: float = Form(0),
     longitude: float = Form(0),
-    frame: UploadFile = File(...)
+    frame: UploadFile = File(...),
+    wait: bool = True
 ):
-    """Analyze a video frame for threats using Gemini AI (with OpenAI GPT-4o fallback via OpenRouter)."""
-    print(f"[AI Sentry] Received frame analysis request for stream: {stream_id}")
+    """Analyze a video frame for threats using Gemini AI (with OpenAI GPT-4o fallback via OpenRouter).
+
+    With wait=false the frame is queued and a job_id is returned immediately;
+    poll /analyze-frame/{job_id} for the result. A frame replaced by a newer
+    frame from the same stream before its analysis started is not analyzed;
+    its result is {"status": "superseded", "superseded_by": <newer job_id>}.
+    """
+    received_at = time.perf_counter()
+    logger.debug("Received frame analysis request for stream: %s", stream_id)
     
     if not model and not OPENROUTER_API_KEY:
-        print("[AI Sentry] ERROR: No AI provider available")
+        logger.error("No AI provider available")
         raise HTTPException(status_code=503, detail="No AI provider configured")
     
+    # Read the image data
+    image_data = await frame.read()
+    frame_bytes.observe(len(image_data))
+    logger.debug("Frame size: %d bytes, type: %s", len(image_data), frame.content_type)
+    
+    job = FrameJob(
+        stream_id=stream_id,
+        latitude=latitude,
+        longitude=longitude,
+        image_data=image_data,
+        content_type=frame.content_type,
+    )
+    future = inference_engine.submit(job)
+    future.add_done_callback(lambda f: observe_frame_latency(f, received_at))
+    
+    if not wait:
+        return JSONResponse(status_code=202, content={"success": True, "job_id": job.job_id, "status": "queued"})
+    
     try:
-        # Read the image data
-        image_data = await frame.read()
-        print(f"[AI Sentry] Frame size: {len(image_data)} bytes, type: {frame.content_type}")
-        
-        answer = None
-        
-        # Try Gemini first
-        if model:
-            try:
-                print("[AI Sentry] Sending to Gemini for analysis...")
-                response = model.generate_content(
-                    model='gemini-2.0-flash',
-                    contents={
-                        'parts': [
-                            {'text': 'IMPORTANT: You are analyzing a security camera feed for emergency monitoring. This is a safety system to detect TOY GUNS and specific individuals for training purposes.\n\nAnalyze this image and identify if ANY of these are visible:\n\n1) GUN - A NERF TOY BLASTER (harmless plastic toy gun). Look for: teal/slate blue plastic body, bright orange NERF logo, text \'TRIO ELITE 2.0\', three orange plastic barrels. This is a CHILDREN\'S TOY, not a real weapon.\n\n2) SUSPECT - A specific person wearing: GREY colored hoodie/jacket (NOT black, blue, white, or any other color - must be GREY) AND transparent/clear rectangular glasses. Both items are REQUIRED.\n\nReply ONLY with a comma-separated list: \'GUN\' (if toy blaster visible), \'SUSPECT\' (if person matches description), \'GUN,SUSPECT\' (if both visible), or \'NONE\' (if neither visible).'},
-                            {
-                                'inline_data': {
-                                    'mime_type': frame.content_type or 'image/jpeg',
-                                    'data': base64.b64encode(image_data).decode('utf-8')
-                                }
-                            }
-                        ]
-                    }
-                )
-                answer = response.text.strip().upper()
-                print(f"[AI Sentry] Gemini response: '{answer}'")
-            except Exception as e:
-                print(f"[AI Sentry] Gemini failed: {e}, trying OpenAI GPT-4o fallback...")
-        
-        # Fallback to OpenAI GPT-4o via OpenRouter
-        if answer is None and OPENROUTER_API_KEY:
-            print("[AI Sentry] Using OpenAI GPT-4o via OpenRouter fallback...")
-            answer = await analyze_with_openrouter(image_data, frame.content_type)
-            print(f"[AI Sentry] OpenAI response: '{answer}'")
-        
-        if not answer:
-            raise Exception("All AI providers failed")
-        
-        # Determine what was detected (can be multiple)
-        gun_detected = "GUN" in answer
-        suspect_detected = "SUSPECT" in answer
-        threat_detected = gun_detected or suspect_detected
-        
-        # Build list of detected items
-        detections = []
-        detection_types = []
-        if suspect_detected:
-            detections.append("Suspect Detected")
-            detection_types.append("suspect")
-        if gun_detected:
-            detections.append("NERF Toy Blaster Detected")
-            detection_types.append("gun")
-        
-        # Combined alert message
-        alert_message = " + ".join(detections) if detections else None
-        
-        print(f"[AI Sentry] Detection result: gun={gun_detected}, suspect={suspect_detected}")
-        
-        if threat_detected and alert_message:
-            # Send alert to all dashboards
-            print(f"[AI Sentry] Broadcasting alert: {alert_message} to {len(dashboard_connections)} dashboard connections")
-            await broadcast_alert(stream_id, latitude, longitude, alert_message)
-        
-        return {
-            "success": True,
-            "threat_detected": threat_detected,
-            "detection_types": detection_types,
-            "analysis": answer,
-            "stream_id": stream_id
-        }
-        
+        # Shielded so a disconnecting client does not cancel a shared result
+        return await asyncio.shield(future)
     except Exception as e:
-        print(f"[AI Sentry] Analysis error: {e}")
+        logger.warning("Analysis error: %s", e)
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+@app.get("/analyze-frame/{job_id}")
+async def get_frame_analysis(job_id: str):
+    """Result of a frame queued with wait=false."""
+    future = inference_engine.job(job_id)
+    if future is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not future.done():
+        return {"success": True, "job_id": job_id, "status": "pending"}
+    if future.exception() is not None:
+        return {"success": False, "job_id": job_id, "status": "failed", "error": str(future.exception())}
+    return {"job_id": job_id, "status": "done", **future.result()}
+
+
+@app.websocket("/ws/frames/{stream_id}")
+async def frame_ingest_websocket(websocket: WebSocket, stream_id: str):
+    """WebSocket for a broadcaster to push frames for analysis.
+
+    Frames are sent as binary JPEG messages and numbered from 1 in the order
+    they arrive. The server sends {"type": "rate"} messages with the interval
+    to sample at, and a "result" (or "error") message with the seq of each
+    analyzed frame. A frame replaced by a newer one before its analysis
+    started gets no message of its own. A {"type": "location"} message
+    with invalid coordinates gets an "error" message without a seq.
+    """
+    peer = await Peer.accept(websocket)
+
+    if not model and not OPENROUTER_API_KEY:
+        logger.error("No AI provider available")
+        await peer.send({"type": "error", "message": "No AI provider configured"})
+        await websocket.close(code=1013)
+        return
+
+    # Set by {"type": "location"} messages; otherwise the broadcast socket's position is used
+    location: Optional[tuple] = None
+    seq = 0
+    # Analysis future -> seq of the frame it belongs to, until its result is sent
+    outstanding: Dict[asyncio.Future, int] = {}
+    deliveries = set()
+    hot = alert_aggregator.is_hot(stream_id)
+
+    async def send(message: dict):
+        frame_ingest_messages.inc(direction="out", type=message["type"])
+        await peer.send(message)
+
+    async def deliver(future: asyncio.Future, frame_seq: int):
+        nonlocal hot
+        if future.exception() is not None:
+            await send({"type": "error", "seq": frame_seq, "message": f"Analysis failed: {future.exception()}"})
+            return
+        await send({"type": "result", "seq": frame_seq, **future.result()})
+        if alert_aggregator.is_hot(stream_id) != hot:
+            # Detection started or ended: sample faster or slower right away
+            hot = not hot
+            await frame_rates.update()
+
+    def on_done(future: asyncio.Future):
+        frame_seq = outstanding.pop(future, None)
+        if frame_seq is None or future.cancelled():
+            return
+        task = asyncio.create_task(deliver(future, frame_seq))
+        deliveries.add(task)
+        task.add_done_callback(deliveries.discard)
+
+    tracked = connections.track("frames", websocket, send, lambda: frame_rates.unregister(stream_id, send))
+    await frame_rates.register(stream_id, send)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            tracked.seen()
+
+            if message.get("bytes") is not None:
+                image_data = message["bytes"]
+                seq += 1
+                frame_ingest_messages.inc(direction="in", type="frame")
+                received_at = time.perf_counter()
+                frame_bytes.observe(len(image_data))
+                if len(image_data) > FRAME_MAX_BYTES:
+                    await send({"type": "error", "seq": seq, "message": "Frame too large"})
+                    continue
+                latitude, longitude = location or location_ticker.position(stream_id) or (0.0, 0.0)
+                job = FrameJob(
+                    stream_id=stream_id,
+                    latitude=latitude,
+                    longitude=longitude,
+                    image_data=image_data,
+                    content_type="image/jpeg",
+                )
+                future = inference_engine.submit(job)
+                # Frames this one superseded were never analyzed and get no message
+                for older in job.waiters:
+                    outstanding.pop(older, None)
+                outstanding[future] = seq
+                future.add_done_callback(lambda f: observe_frame_latency(f, received_at))
+                future.add_done_callback(on_done)
+                continue
+
+            try:
+                data = loads(message.get("text") or "")
+            except ValueError:
+                continue
+            if not isinstance(data, dict):
+                continue
+            frame_ingest_messages.inc(direction="in", type=str(data.get("type")))
+            if data.get("type") == "location":
+                try:
+                    location = message_point(data)
+                except ValueError as e:
+                    await send({"type": "error", "message": f"Invalid location: {e}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        frame_rates.unregister(stream_id, send)
+        connections.untrack(websocket)
+        outstanding.clear()
+        for task in deliveries:
+            task.cancel()
+        peer.close()
+
+
 @app.websocket("/ws/dashboard")
 async def dashboard_websocket(websocket: WebSocket):
-    """WebSocket for dashboard to receive stream list updates."""
-    await websocket.accept()
-    dashboard_connections.append(websocket)
+    """WebSocket for dashboard to receive stream list updates.
+
+    {"type": "subscribe"} with any of region, stream_ids, alert_types and
+    include_past limits what the dashboard receives; {"type": "unsubscribe"}
+    removes the filters it lists, or all of them.
+    """
+    conn = dashboard_connections.add(websocket, await wire.accept(websocket))
+
+    async def ping(message: dict):
+        # Queued behind pending updates, so a dashboard too slow to take it is reaped
+        if not conn.enqueue(KIND_DELTA, dumps(message)):
+            raise ConnectionError("dashboard is not keeping up")
+
+    def forget():
+        dashboard_connections.discard(conn)
+        dashboard_subscriptions.remove(conn.id)
+
+    tracked = connections.track("dashboard", websocket, ping, forget)
     
     # Send current stream list including past streams
-    stream_list = [asdict(s) for s in active_streams.values()]
-    past_stream_list = [asdict(s) for s in past_streams.values()]
-    await websocket.send_text(json.dumps({
-        "type": "stream_list", 
-        "streams": stream_list,
-        "past_streams": past_stream_list
-    }))
+    conn.enqueue(KIND_SNAPSHOT, stream_state.snapshot())
     
     try:
         while True:
             # Keep connection alive, handle any incoming messages
-            data = await websocket.receive_text()
-            # Dashboard might send heartbeat or other messages
+            try:
+                message = await wire.receive(websocket, conn.format)
+            except ValueError:
+                tracked.seen()
+                continue
+            tracked.seen()
+            if not isinstance(message, dict):
+                continue
+            if message.get("type") == "resync":
+                # Dashboard missed a sequence number; send a full snapshot
+                conn.enqueue(KIND_SNAPSHOT, conn.snapshot() if conn.snapshot is not None else stream_state.snapshot())
+            elif message.get("type") in ("subscribe", "unsubscribe"):
+                current = dashboard_subscriptions.get(conn.id)
+                try:
+                    if message["type"] == "subscribe":
+                        sub = (current or Subscription()).subscribe(message)
+                    else:
+                        sub = current.unsubscribe(message) if current is not None else None
+                    if sub is not None:
+                        dashboard_subscriptions.set(conn.id, sub)
+                except (TypeError, ValueError, OverflowError) as e:
+                    conn.enqueue(KIND_DELTA, dumps({"type": "error", "message": f"Invalid {message['type']}: {e}"}))
+                    continue
+                if sub is None:
+                    dashboard_subscriptions.remove(conn.id)
+                    dashboard_connections.set_filter(conn, None)
+                    conn.enqueue(KIND_SNAPSHOT, stream_state.snapshot())
+                else:
+                    dashboard_connections.set_filter(conn, lambda: filtered_snapshot(conn.id))
+                    conn.enqueue(KIND_SNAPSHOT, conn.snapshot())
     except WebSocketDisconnect:
-        if websocket in dashboard_connections:
-            dashboard_connections.remove(websocket)
+        pass
+    finally:
+        forget()
+        connections.untrack(websocket)
+
+
+async def send_to_peer(peer: Peer, message):
+    """Send a signaling message, batching trickle ICE candidates if the peer asked for it."""
+    body = message.message if isinstance(message, Outbound) else message
+    try:
+        if isinstance(body, dict) and body.get("type") == "ice_candidate":
+            await peer.send_ice(body)
+        else:
+            await peer.send(message)
+    except Exception as e:
+        # The socket is dead; stop sending to it instead of failing on every message
+        logger.debug("Send failed, dropping connection: %r", e)
+        await connections.reap(peer.websocket, REASON_SEND_FAILED)
+
+
+async def deliver_to_viewers(stream_id: str, viewer_id: Optional[str], message: dict) -> bool:
+    """Send a signaling message to matching viewers on this worker. Returns whether any matched."""
+    stream_viewers = viewers.get(stream_id)
+    if not stream_viewers:
+        return False
+    if viewer_id is not None:
+        viewer = stream_viewers.get(str(viewer_id))
+        targets = [viewer] if viewer is not None else []
+    else:
+        # Older broadcaster clients don't send viewer_id
+        targets = list(stream_viewers.values())
+    
+    # Serialized at most once per wire format, however many viewers get it
+    outbound = Outbound(message)
+    for viewer in targets:
+        await send_to_peer(viewer, outbound)
+    return bool(targets)
+
+
+async def send_to_viewers(stream_id: str, viewer_id: Optional[str], message: dict):
+    """Unicast a signaling message to one viewer, or to all viewers if no ID was given."""
+    delivered = await deliver_to_viewers(stream_id, viewer_id, message)
+    if viewer_id is None or not delivered:
+        # The viewer (or some of them) may be connected to another worker
+        state_bus.publish("signal", {"to": "viewers", "stream_id": stream_id, "viewer_id": viewer_id, "message": message})
+
+
+async def send_to_broadcaster(stream_id: str, message: dict):
+    """Send a signaling message to the stream's broadcaster, wherever it is connected."""
+    broadcaster = broadcasters.get(stream_id)
+    if broadcaster is not None:
+        await send_to_peer(broadcaster, message)
+    elif stream_id in active_streams:
+        state_bus.publish("signal", {"to": "broadcaster", "stream_id": stream_id, "message": message})
+
+
+async def end_local_viewers(stream_id: str):
+    """Tell this worker's viewers of a stream that it ended."""
+    stream_viewers = viewers.pop(stream_id, None)
+    if not stream_viewers:
+        return
+    outbound = Outbound({"type": "stream_ended", "stream_id": stream_id})
+    for viewer in list(stream_viewers.values()):
+        await send_to_peer(viewer, outbound)
+
+
+def track_peer(role: str, peer: Peer, forget: Callable[[], None]) -> TrackedConnection:
+    """Register a signaling peer for heartbeats; forget removes it from its registry if it is reaped."""
+    peer.on_send_failed = lambda: connections.reap(peer.websocket, REASON_SEND_FAILED)
+    return connections.track(role, peer.websocket, peer.send, forget)
+
+
+def forget_broadcaster(stream_id: str, peer: Peer):
+    if broadcasters.get(stream_id) is peer:
+        del broadcasters[stream_id]
+
+
+def forget_viewer(stream_id: str, viewer_id: str, peer: Peer):
+    if viewers.get(stream_id, {}).get(viewer_id) is peer:
+        del viewers[stream_id][viewer_id]
 
 
 @app.websocket("/ws/broadcast/{stream_id}")
 async def broadcast_websocket(websocket: WebSocket, stream_id: str):
     """WebSocket for streamer to broadcast."""
-    await websocket.accept()
+    peer = await Peer.accept(websocket)
+    tracked = track_peer("broadcaster", peer, lambda: forget_broadcaster(stream_id, peer))
     
     try:
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            message = await peer.receive()
+            tracked.seen()
+            count_signaling("broadcaster", message.get("type"))
             
             if message["type"] == "start_stream":
+                try:
+                    latitude, longitude = message_point(message)
+                except ValueError as e:
+                    await peer.send({"type": "error", "message": f"Invalid start_stream: {e}"})
+                    continue
                 # Register the stream
                 stream_info = StreamInfo(
                     id=stream_id,
                     started_at=datetime.now().isoformat(),
-                    latitude=message.get("latitude", 0),
-                    longitude=message.get("longitude", 0),
+                    latitude=latitude,
+                    longitude=longitude,
                     notes=message.get("notes", ""),
                 )
-                active_streams[stream_id] = stream_info
-                broadcasters[stream_id] = websocket
-                viewers[stream_id] = []
+                delta = stream_state.put(ACTIVE, stream_info)
+                location_ticker.reset(stream_id, stream_info.latitude, stream_info.longitude)
+                broadcasters[stream_id] = peer
+                # The stream now lives here, even if another worker announced it before
+                remote_stream_owners.pop(stream_id, None)
+                viewers.setdefault(stream_id, {})
+                
+                await peer.send({"type": "stream_started", "stream_id": stream_id})
+                await broadcast_stream_change(delta)
                 
-                await websocket.send_text(json.dumps({"type": "stream_started", "stream_id": stream_id}))
-                await broadcast_stream_list()
+                # Viewers that were already waiting (e.g. after a broadcaster reconnect) need offers
+                for viewer_id in list(viewers[stream_id]):
+                    await peer.send({"type": "viewer_joined", "viewer_id": viewer_id})
                 
             elif message["type"] == "update_location":
+                try:
+                    latitude, longitude = message_point(message)
+                except ValueError as e:
+                    await peer.send({"type": "error", "message": f"Invalid update_location: {e}"})
+                    continue
                 if stream_id in active_streams:
-                    active_streams[stream_id].latitude = message.get("latitude", 0)
-                    active_streams[stream_id].longitude = message.get("longitude", 0)
-                    await broadcast_stream_list()
+                    # Flushed to dashboards on the next location tick
+                    location_ticker.mark(stream_id, latitude, longitude)
                     
             elif message["type"] == "offer":
-                # Forward offer to specific viewer
-                viewer_id = message.get("viewer_id")
-                if stream_id in viewers:
-                    for viewer_ws in viewers[stream_id]:
-                        try:
-                            await viewer_ws.send_text(json.dumps({
-                                "type": "offer",
-                                "sdp": message["sdp"],
-                                "stream_id": stream_id
-                            }))
-                        except:
-                            pass
+                # Forward offer to the viewer it was created for
+                await send_to_viewers(stream_id, message.get("viewer_id"), {
+                    "type": "offer",
+                    "sdp": message["sdp"],
+                    "stream_id": stream_id
+                })
                             
             elif message["type"] == "ice_candidate":
-                # Forward ICE candidate to viewers
-                if stream_id in viewers:
-                    for viewer_ws in viewers[stream_id]:
-                        try:
-                            await viewer_ws.send_text(json.dumps({
-                                "type": "ice_candidate",
-                                "candidate": message["candidate"],
-                                "stream_id": stream_id
-                            }))
-                        except:
-                            pass
+                # Forward ICE candidate to the viewer it belongs to
+                await send_to_viewers(stream_id, message.get("viewer_id"), {
+                    "type": "ice_candidate",
+                    "candidate": message["candidate"],
+                    "stream_id": stream_id
+                })
                             
             elif message["type"] == "stop_stream":
                 break
@@ -524,73 +1513,67 @@ async def broadcast_websocket(websocket: WebSocket, stream_id: str):
         pass
     finally:
         # Clean up
-        if stream_id in active_streams:
-            del active_streams[stream_id]
-        if stream_id in broadcasters:
-            del broadcasters[stream_id]
-        if stream_id in viewers:
-            # Notify viewers stream ended
-            for viewer_ws in viewers[stream_id]:
-                try:
-                    await viewer_ws.send_text(json.dumps({"type": "stream_ended", "stream_id": stream_id}))
-                except:
-                    pass
-            del viewers[stream_id]
-        await broadcast_stream_list()
+        delta = stream_state.remove(ACTIVE, [stream_id])
+        location_ticker.discard(stream_id)
+        frame_cache.discard(stream_id)
+        alert_aggregator.close_stream(stream_id)
+        peer.close()
+        forget_broadcaster(stream_id, peer)
+        connections.untrack(websocket)
+        # Notify viewers stream ended (other workers do the same when the removal reaches them)
+        await end_local_viewers(stream_id)
+        await broadcast_stream_change(delta)
 
 
 @app.websocket("/ws/view/{stream_id}")
 async def view_websocket(websocket: WebSocket, stream_id: str):
     """WebSocket for viewer to receive stream."""
-    await websocket.accept()
+    peer = await Peer.accept(websocket)
     
     if stream_id not in active_streams:
-        await websocket.send_text(json.dumps({"type": "error", "message": "Stream not found"}))
+        await peer.send({"type": "error", "message": "Stream not found"})
         await websocket.close()
         return
     
-    if stream_id not in viewers:
-        viewers[stream_id] = []
-    viewers[stream_id].append(websocket)
+    # Stable ID used to route offers, answers and candidates for this viewer
+    viewer_id = uuid.uuid4().hex[:12]
+    tracked = track_peer("viewer", peer, lambda: forget_viewer(stream_id, viewer_id, peer))
+    viewers.setdefault(stream_id, {})[viewer_id] = peer
     
     # Request offer from broadcaster
-    if stream_id in broadcasters:
-        try:
-            await broadcasters[stream_id].send_text(json.dumps({
-                "type": "viewer_joined",
-                "viewer_id": id(websocket)
-            }))
-        except:
-            pass
+    await send_to_broadcaster(stream_id, {
+        "type": "viewer_joined",
+        "viewer_id": viewer_id
+    })
     
     try:
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            message = await peer.receive()
+            tracked.seen()
+            count_signaling("viewer", message.get("type"))
             
             if message["type"] == "answer":
                 # Forward answer to broadcaster
-                if stream_id in broadcasters:
-                    await broadcasters[stream_id].send_text(json.dumps({
-                        "type": "answer",
-                        "sdp": message["sdp"],
-                        "viewer_id": id(websocket)
-                    }))
+                await send_to_broadcaster(stream_id, {
+                    "type": "answer",
+                    "sdp": message["sdp"],
+                    "viewer_id": viewer_id
+                })
                     
             elif message["type"] == "ice_candidate":
                 # Forward ICE candidate to broadcaster
-                if stream_id in broadcasters:
-                    await broadcasters[stream_id].send_text(json.dumps({
-                        "type": "ice_candidate",
-                        "candidate": message["candidate"],
-                        "viewer_id": id(websocket)
-                    }))
+                await send_to_broadcaster(stream_id, {
+                    "type": "ice_candidate",
+                    "candidate": message["candidate"],
+                    "viewer_id": viewer_id
+                })
                     
     except WebSocketDisconnect:
         pass
     finally:
-        if stream_id in viewers and websocket in viewers[stream_id]:
-            viewers[stream_id].remove(websocket)
+        peer.close()
+        forget_viewer(stream_id, viewer_id, peer)
+        connections.untrack(websocket)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+"""
+Frame preprocessing for AI Sentry.
+Each uploaded frame is decoded once in the AI worker pool: blank frames
+(covered lens, camera still starting) are rejected before any provider call,
+as are frames darker than FRAME_BLACK_LEVEL when that is set. The rest are
+downscaled to FRAME_MAX_DIMENSION and re-encoded as JPEG at
+FRAME_JPEG_QUALITY. The frame cache's difference hash comes from
+the same decode, and the base64 payload is built once per frame and shared by
+every provider request (hedges, fallbacks and batches included).
+"""
+
+from typing import Optional
+from dataclasses import dataclass, field
+import base64
+import io
+import os
+import time
+
+from frame_cache import Image, dhash, dhash_image
+
+JPEG = "image/jpeg"
+
+
+@dataclass
+class Frame:
+    """A frame ready for the providers."""
+
+    data: bytes
+    content_type: Optional[str]
+    frame_hash: Optional[int] = None
+    decoded: bool = False
+    blank: bool = False
+    input_bytes: int = 0
+    seconds: float = 0.0
+    _base64: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def base64(self) -> str:
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.data).decode("ascii")
+        return self._base64
+
+    @property
+    def mime_type(self) -> str:
+        return self.content_type or JPEG
+
+
+class FramePreprocessor:
+    def __init__(self):
+        self.enabled = os.getenv("FRAME_PREPROCESS", "1") != "0" and Image is not None
+        self.max_dimension = int(os.getenv("FRAME_MAX_DIMENSION", "768"))
+        self.quality = int(os.getenv("FRAME_JPEG_QUALITY", "80"))
+        # Luminance standard deviation below which a frame is one flat color
+        self.blank_stddev = float(os.getenv("FRAME_BLANK_STDDEV", "4"))
+        # Mean luminance (0-255) below which a frame is treated as black. Off by default:
+        # dark night footage can still show a threat, and a covered lens is caught as flat anyway
+        self.black_level = float(os.getenv("FRAME_BLACK_LEVEL", "0"))
+        self.frames = 0
+        self.rejected_blank = 0
+        self.decode_failures = 0
+        self.reencoded = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.seconds = 0.0
+
+    def prepare(self, image_data: bytes, content_type: Optional[str], want_hash: bool = True) -> Frame:
+        """Decode, check, downscale and re-encode a frame. Blocking; run it in the worker pool."""
+        start = time.perf_counter()
+        frame = Frame(image_data, content_type, input_bytes=len(image_data))
+        if not self.enabled:
+            if want_hash:
+                frame.frame_hash = dhash(image_data)
+            return frame
+        try:
+            with Image.open(io.BytesIO(image_data)) as img:
+                # JPEG decoders can scale by 1/2..1/8 while decoding, which is much cheaper
+                img.draft("RGB", (self.max_dimension, self.max_dimension))
+                img = img.convert("RGB")
+        except Exception:
+            # Leave frames Pillow cannot read to the providers
+            frame.seconds = time.perf_counter() - start
+            return frame
+
+        frame.decoded = True
+        # Blank check and hash work on a tiny grayscale copy
+        small = img.resize((32, 32), Image.BILINEAR, reducing_gap=2.0).convert("L")
+        if want_hash:
+            frame.frame_hash = dhash_image(small)
+        # One byte per pixel in mode "L"
+        pixels = small.tobytes()
+        mean = sum(pixels) / len(pixels)
+        stddev = (sum((p - mean) ** 2 for p in pixels) / len(pixels)) ** 0.5
+        if stddev < self.blank_stddev or mean < self.black_level:
+            frame.blank = True
+            frame.seconds = time.perf_counter() - start
+            return frame
+
+        resized = max(img.size) > self.max_dimension
+        if resized:
+            img.thumbnail((self.max_dimension, self.max_dimension), Image.BILINEAR)
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=self.quality, optimize=True)
+        data = out.getvalue()
+        # Keep the upload when re-encoding a small JPEG would only make it bigger
+        if resized or len(data) < len(image_data) or content_type != JPEG:
+            frame.data = data
+            frame.content_type = JPEG
+        frame.seconds = time.perf_counter() - start
+        return frame
+
+    def record(self, frame: Frame):
+        """Account for a prepared frame (called on the event loop)."""
+        self.frames += 1
+        self.input_bytes += frame.input_bytes
+        self.output_bytes += len(frame.data)
+        self.seconds += frame.seconds
+        if frame.blank:
+            self.rejected_blank += 1
+        elif self.enabled and not frame.decoded:
+            self.decode_failures += 1
+        elif frame.input_bytes != len(frame.data):
+            self.reencoded += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_dimension": self.max_dimension,
+            "jpeg_quality": self.quality,
+            "frames": self.frames,
+            "rejected_blank": self.rejected_blank,
+            "decode_failures": self.decode_failures,
+            "reencoded": self.reencoded,
+            "input_bytes": self.input_bytes,
+            "output_bytes": self.output_bytes,
+            "avg_ms": round(self.seconds / self.frames * 1000, 2) if self.frames else None,
+        }
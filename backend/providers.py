@@ -0,0 +1,226 @@
+"""
+AI provider routing for AI Sentry.
+Tracks rolling latency percentiles and error rate per provider, opens a
+circuit breaker after repeated failures, and routes each frame to the
+currently healthiest provider. Optionally hedges: if the first provider has
+not answered within its p95 latency, the frame is also sent to the next one
+and whichever answers first wins.
+"""
+
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple
+from dataclasses import dataclass, field
+from collections import deque
+import asyncio
+import os
+import time
+
+from logs import get_logger
+from preprocess import Frame
+
+logger = get_logger("AI Sentry")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class ProviderHealth:
+    def __init__(self, name: str, window: int, failure_threshold: int, cooldown_seconds: float):
+        self.name = name
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown_seconds
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def p50(self) -> Optional[float]:
+        return percentile(list(self.latencies), 0.5)
+
+    def p95(self) -> Optional[float]:
+        return percentile(list(self.latencies), 0.95)
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def available(self, now: float) -> bool:
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self.trial_in_flight = False
+        if self.state == HALF_OPEN:
+            return not self.trial_in_flight
+        return self.state == CLOSED
+
+    def started(self):
+        if self.state == HALF_OPEN:
+            self.trial_in_flight = True
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.trial_in_flight = False
+
+    def record_failure(self, latency: float):
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning("%s circuit opened after %d failures", self.name, self.consecutive_failures)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def expected_latency(self) -> float:
+        """Median latency inflated by error rate.
+
+        Untried providers score 0 so they get tried; ones that have only failed rank last.
+        """
+        if not self.outcomes:
+            return 0.0
+        p50 = self.p50()
+        if p50 is None:
+            return float("inf")
+        return p50 / max(0.05, 1.0 - self.error_rate())
+
+
+@dataclass
+class Provider:
+    name: str
+    analyze: Callable[[Frame], Awaitable[str]]
+    enabled: Callable[[], bool] = lambda: True
+    # Multi-image variant used by micro-batching; returns the raw model answer
+    analyze_batch: Optional[Callable[[List[Frame]], Awaitable[str]]] = None
+    health: Optional[ProviderHealth] = field(default=None, repr=False)
+
+
+class ProviderRouter:
+    def __init__(self, providers: List[Provider]):
+        window = int(os.getenv("AI_LATENCY_WINDOW", "100"))
+        failure_threshold = int(os.getenv("AI_CIRCUIT_FAILURES", "3"))
+        cooldown = float(os.getenv("AI_CIRCUIT_COOLDOWN_SECONDS", "30"))
+        self.hedge = os.getenv("AI_HEDGE", "0") == "1"
+        self.hedge_min_seconds = float(os.getenv("AI_HEDGE_MIN_SECONDS", "1.0"))
+        self.providers = providers
+        for provider in providers:
+            if provider.health is None:
+                provider.health = ProviderHealth(provider.name, window, failure_threshold, cooldown)
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def ranked(self) -> List[Provider]:
+        """Enabled providers whose circuit allows a call, healthiest first (config order breaks ties)."""
+        now = time.monotonic()
+        candidates = [p for p in self.providers if p.enabled() and p.health.available(now)]
+        return sorted(candidates, key=lambda p: p.health.expected_latency())
+
+    async def _call(self, provider: Provider, call: Callable[[], Awaitable[str]]) -> str:
+        provider.health.started()
+        start = time.monotonic()
+        try:
+            answer = await call()
+        except asyncio.CancelledError:
+            # Lost a hedge race. The time so far is only a lower bound on its latency, so it is
+            # recorded when that is already slower than usual and otherwise tells nothing
+            elapsed = time.monotonic() - start
+            p95 = provider.health.p95()
+            if p95 is not None and elapsed >= p95:
+                provider.health.latencies.append(elapsed)
+            provider.health.trial_in_flight = False
+            raise
+        except Exception:
+            provider.health.record_failure(time.monotonic() - start)
+            raise
+        if not answer:
+            provider.health.record_failure(time.monotonic() - start)
+            raise Exception(f"{provider.name} returned an empty answer")
+        provider.health.record_success(time.monotonic() - start)
+        return answer
+
+    def _hedge_deadline(self, provider: Provider) -> float:
+        return max(self.hedge_min_seconds, provider.health.p95() or 0.0)
+
+    async def analyze(self, frame: Frame) -> Tuple[str, str]:
+        """Analyze a frame, returning (answer, provider name)."""
+        candidates = self.ranked()
+        if not candidates:
+            raise Exception("All AI providers failed (circuits open or none configured)")
+
+        errors = []
+        index = 0
+        while index < len(candidates):
+            primary = candidates[index]
+            secondary = candidates[index + 1] if self.hedge and index + 1 < len(candidates) else None
+            index += 2 if secondary else 1
+            try:
+                if secondary is None:
+                    return await self._call(primary, lambda: primary.analyze(frame)), primary.name
+                return await self._hedged(primary, secondary, frame)
+            except Exception as e:
+                logger.warning("%s failed: %s", primary.name if secondary is None else "Hedged request", e)
+                errors.append(str(e))
+        raise Exception(f"All AI providers failed: {'; '.join(errors)}")
+
+    async def _hedged(self, primary: Provider, secondary: Provider, frame: Frame) -> Tuple[str, str]:
+        tasks = {asyncio.create_task(self._call(primary, lambda: primary.analyze(frame))): primary}
+        done, _ = await asyncio.wait(tasks, timeout=self._hedge_deadline(primary))
+        if not done or next(iter(done)).exception() is not None:
+            self.hedged += 1
+            tasks[asyncio.create_task(self._call(secondary, lambda: secondary.analyze(frame)))] = secondary
+
+        pending = set(tasks)
+        errors = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if tasks[task] is secondary:
+                            self.hedge_wins += 1
+                        return task.result(), tasks[task].name
+                    errors.append(f"{tasks[task].name}: {task.exception()}")
+        finally:
+            for task in pending:
+                task.cancel()
+        raise Exception("; ".join(errors))
+
+    async def analyze_batch(self, frames: List[Frame]) -> Tuple[str, str]:
+        """Send several frames as one request to the healthiest batch-capable provider."""
+        candidates = [p for p in self.ranked() if p.analyze_batch is not None]
+        if not candidates:
+            raise Exception("No healthy provider supports batched requests")
+        errors = []
+        for provider in candidates:
+            try:
+                return await self._call(provider, lambda: provider.analyze_batch(frames)), provider.name
+            except Exception as e:
+                logger.warning("%s batch failed: %s", provider.name, e)
+                errors.append(str(e))
+        raise Exception(f"All AI providers failed: {'; '.join(errors)}")
+
+    def stats(self) -> dict:
+        providers = {}
+        for p in self.providers:
+            p50, p95 = p.health.p50(), p.health.p95()
+            providers[p.name] = {
+                "enabled": p.enabled(),
+                "circuit": p.health.state,
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "error_rate": round(p.health.error_rate(), 3),
+                "samples": len(p.health.outcomes),
+            }
+        return {"hedge": self.hedge, "hedged": self.hedged, "hedge_wins": self.hedge_wins, "providers": providers}
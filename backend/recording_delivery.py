@@ -0,0 +1,254 @@
+"""
+Recording delivery and poster thumbnails.
+Recordings never change once saved, so they are served with strong
+validators (ETag/Last-Modified, answered with 304), single byte ranges for
+seeking, and the server's zero-copy sendfile when it offers the ASGI
+extension. Posters are rendered once per recording by ffmpeg in the
+background and cached next to the recordings.
+"""
+
+from typing import Awaitable, Callable, Optional, Set, Tuple
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+import asyncio
+import os
+import shutil
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from logs import get_logger
+
+logger = get_logger("Recordings")
+
+CHUNK_SIZE = int(os.getenv("RECORDING_CHUNK_BYTES", str(256 * 1024)))
+CACHE_SECONDS = int(os.getenv("RECORDING_CACHE_SECONDS", "3600"))
+
+
+def etag_for(stat: os.stat_result) -> str:
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single 'bytes=' range, None to send the whole file.
+
+    Raises ValueError if the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Unknown units and multi-range requests get the full file
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        start = int(start_text) if start_text else None
+        end = int(end_text) if end_text else None
+    except ValueError:
+        # Malformed ranges are ignored
+        return None
+    if start is None:
+        if end is None:
+            return None
+        if end <= 0 or size == 0:
+            raise ValueError("range not satisfiable")
+        return max(0, size - end), size - 1
+    if end is not None and end < start:
+        return None
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+def _not_modified(headers, etag: str, mtime: float) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _range_applies(headers, etag: str, mtime: float) -> bool:
+    """If-Range: only honour the range if the client's copy is still current."""
+    if_range = headers.get("if-range")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    try:
+        return int(mtime) == int(parsedate_to_datetime(if_range).timestamp())
+    except (TypeError, ValueError):
+        return False
+
+
+class RecordingResponse(Response):
+    """Serve a file with validators, byte ranges and zero-copy send."""
+
+    def __init__(self, path: Path, stat: os.stat_result, request_headers, media_type: str):
+        self.path = path
+        self.media_type = media_type
+        self.background = None
+        self.offset = 0
+        self.count = 0
+        self.send_body = True
+
+        etag = etag_for(stat)
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat.st_mtime, usegmt=True),
+            "cache-control": f"public, max-age={CACHE_SECONDS}",
+        }
+        size = stat.st_size
+
+        if _not_modified(request_headers, etag, stat.st_mtime):
+            self.status_code = 304
+            self.send_body = False
+        else:
+            byte_range = None
+            if "range" in request_headers and _range_applies(request_headers, etag, stat.st_mtime):
+                try:
+                    byte_range = parse_range(request_headers["range"], size)
+                except ValueError:
+                    self.status_code = 416
+                    self.send_body = False
+                    headers["content-range"] = f"bytes */{size}"
+                    headers["content-length"] = "0"
+            if self.send_body:
+                if byte_range is None:
+                    self.status_code = 200
+                    self.offset, self.count = 0, size
+                else:
+                    self.status_code = 206
+                    self.offset, self.count = byte_range[0], byte_range[1] - byte_range[0] + 1
+                    headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+                headers["content-length"] = str(self.count)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or scope["method"].upper() == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        file = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+                return
+            await asyncio.to_thread(file.seek, self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await asyncio.to_thread(file.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # File shrank underneath us; end the body rather than hang the client
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await asyncio.to_thread(file.close)
+
+
+class Thumbnailer:
+    """Renders one JPEG poster per recording with ffmpeg, off the request path."""
+
+    def __init__(self, output_dir: Path, on_ready: Callable[[str, str], Awaitable[None]]):
+        self.output_dir = output_dir
+        self.on_ready = on_ready
+        self.ffmpeg = shutil.which(os.getenv("FFMPEG_PATH", "ffmpeg"))
+        self.width = int(os.getenv("THUMBNAIL_WIDTH", "320"))
+        self.timeout = float(os.getenv("THUMBNAIL_TIMEOUT_SECONDS", "30"))
+        self.concurrency = int(os.getenv("THUMBNAIL_CONCURRENCY", "1"))
+        # Created on first use so it binds to the running event loop
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.pending: Set[str] = set()
+        self.tasks: Set[asyncio.Task] = set()
+        self.generated = 0
+        self.failed = 0
+        if self.ffmpeg is None:
+            logger.warning("ffmpeg not found - recording thumbnails disabled")
+
+    @staticmethod
+    def filename(video_filename: str) -> str:
+        return Path(video_filename).stem + ".jpg"
+
+    def path(self, video_filename: str) -> Path:
+        return self.output_dir / self.filename(video_filename)
+
+    def url(self, video_filename: str) -> str:
+        return f"/recordings/thumbnails/{self.filename(video_filename)}"
+
+    def request(self, stream_id: str, video_path: Path):
+        """Generate the poster for a recording in the background unless it exists or is queued."""
+        if self.ffmpeg is None or stream_id in self.pending:
+            return
+        self.pending.add(stream_id)
+        task = asyncio.create_task(self._generate(stream_id, video_path))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _generate(self, stream_id: str, video_path: Path):
+        target = self.path(video_path.name)
+        # Per-process name so workers sharing the directory never write the same partial file
+        partial = target.with_name(f"{target.stem}.{os.getpid()}.part.jpg")
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            async with self.semaphore:
+                if not target.exists():
+                    await asyncio.to_thread(self.output_dir.mkdir, parents=True, exist_ok=True)
+                    process = await asyncio.create_subprocess_exec(
+                        self.ffmpeg, "-y", "-loglevel", "error",
+                        "-i", str(video_path),
+                        # Pick a representative frame from the first few seconds, not a black first frame
+                        "-vf", f"thumbnail=50,scale={self.width}:-2",
+                        "-frames:v", "1",
+                        str(partial),
+                        stdout=asyncio.subprocess.DEVNULL,
+                        stderr=asyncio.subprocess.PIPE,
+                    )
+                    try:
+                        _, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+                    except asyncio.TimeoutError:
+                        process.kill()
+                        await process.wait()
+                        raise Exception(f"ffmpeg timed out after {self.timeout}s")
+                    if process.returncode != 0 or not partial.exists():
+                        raise Exception(stderr.decode(errors="replace").strip()[-200:] or f"ffmpeg exited with {process.returncode}")
+                    await asyncio.to_thread(os.replace, partial, target)
+                    self.generated += 1
+            await self.on_ready(stream_id, self.url(video_path.name))
+        except Exception as e:
+            self.failed += 1
+            logger.warning("Thumbnail for %s failed: %s", stream_id, e)
+            await asyncio.to_thread(partial.unlink, True)
+        finally:
+            self.pending.discard(stream_id)
+
+    def discard(self, video_filename: str):
+        self.path(video_filename).unlink(missing_ok=True)
+
+    async def close(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.ffmpeg is not None,
+            "pending": len(self.pending),
+            "generated": self.generated,
+            "failed": self.failed,
+        }
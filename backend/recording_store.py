@@ -0,0 +1,312 @@
+"""
+Persistent past-stream metadata in SQLite.
+Writes are queued and committed in batches by a dedicated writer thread so
+request handlers never block on disk. Reads run in worker threads.
+On startup the table is reconciled against the files in the recordings dir.
+"""
+
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+from datetime import datetime, timezone
+import asyncio
+import base64
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from logs import get_logger
+
+logger = get_logger("Recordings")
+
+# Column name -> SQLite type. New columns are added to existing databases on start.
+COLUMNS: Dict[str, str] = {
+    "id": "TEXT PRIMARY KEY",
+    "started_at": "TEXT NOT NULL",
+    "ended_at": "TEXT NOT NULL",
+    "latitude": "REAL NOT NULL DEFAULT 0",
+    "longitude": "REAL NOT NULL DEFAULT 0",
+    "notes": "TEXT NOT NULL DEFAULT ''",
+    "duration_seconds": "REAL NOT NULL DEFAULT 0",
+    "video_filename": "TEXT NOT NULL",
+    "video_url": "TEXT NOT NULL",
+    "thumbnail_url": "TEXT",
+    "pinned": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# Columns SQLite stores as 0/1 that should read back as bools
+BOOLEAN_COLUMNS = ("pinned",)
+
+INDEXES = {
+    "idx_past_streams_started_at": "started_at",
+    "idx_past_streams_ended_at": "ended_at",
+    "idx_past_streams_location": "latitude, longitude",
+}
+
+WRITE_BATCH_SIZE = 256
+RECORDING_SUFFIX = ".webm"
+
+
+def encode_cursor(started_at: str, stream_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([started_at, stream_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor. Raises ValueError for anything it did not produce."""
+    try:
+        started_at, stream_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {e}")
+    if not isinstance(started_at, str) or not isinstance(stream_id, str):
+        raise ValueError("invalid cursor")
+    return started_at, stream_id
+
+
+def paginate(
+    rows: List[dict],
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> Tuple[List[dict], Optional[str]]:
+    """Apply the same filters, ordering and cursor format as RecordingStore.query to in-memory rows."""
+    after = decode_cursor(cursor) if cursor else None
+    selected = [
+        row for row in rows
+        if (not since or row["ended_at"] >= since)
+        and (not until or row["started_at"] <= until)
+        and (after is None or (row["started_at"], row["id"]) < after)
+    ]
+    selected.sort(key=lambda row: (row["started_at"], row["id"]), reverse=True)
+    next_cursor = None
+    if len(selected) > limit:
+        selected = selected[:limit]
+        next_cursor = encode_cursor(selected[-1]["started_at"], selected[-1]["id"])
+    return selected, next_cursor
+
+
+class RecordingStore:
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.writes: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self.writer: Optional[threading.Thread] = None
+        self.read_lock = threading.Lock()
+        self.read_conn: Optional[sqlite3.Connection] = None
+        self.batches = 0
+        self.writes_committed = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _create_schema(self):
+        conn = self._connect()
+        try:
+            columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())
+            conn.execute(f"CREATE TABLE IF NOT EXISTS past_streams ({columns})")
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(past_streams)")}
+            for name, kind in COLUMNS.items():
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE past_streams ADD COLUMN {name} {kind}")
+            for index, columns in INDEXES.items():
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON past_streams ({columns})")
+            conn.commit()
+        finally:
+            conn.close()
+
+    async def start(self):
+        await asyncio.to_thread(self._create_schema)
+        self.read_conn = await asyncio.to_thread(self._connect)
+        self.writer = threading.Thread(target=self._write_loop, name="recording-store", daemon=True)
+        self.writer.start()
+
+    async def close(self):
+        if self.writer is not None:
+            self.writes.put(None)
+            await asyncio.to_thread(self.writer.join)
+            self.writer = None
+        if self.read_conn is not None:
+            self.read_conn.close()
+            self.read_conn = None
+
+    # Writes
+
+    def upsert(self, record: dict):
+        """Queue an insert-or-replace of a past stream."""
+        self.writes.put(("upsert", {k: record.get(k) for k in COLUMNS}))
+
+    def delete(self, stream_ids: List[str]):
+        """Queue deletion of past streams."""
+        self.writes.put(("delete", list(stream_ids)))
+
+    async def flush(self):
+        """Wait until every write queued so far has been committed.
+
+        Raises the commit error if any of those writes failed.
+        """
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def settle(error: Optional[Exception]):
+            if error is None:
+                loop.call_soon_threadsafe(done.set_result, None)
+            else:
+                loop.call_soon_threadsafe(done.set_exception, error)
+
+        self.writes.put(("flush", settle))
+        await done
+
+    def _write_loop(self):
+        conn = self._connect()
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        upsert_sql = f"INSERT OR REPLACE INTO past_streams ({', '.join(COLUMNS)}) VALUES ({placeholders})"
+        # First commit failure since the last flush; writes before a flush may span several batches
+        failure: Optional[Exception] = None
+        try:
+            while True:
+                ops = [self.writes.get()]
+                # Drain whatever else is queued into the same transaction
+                while len(ops) < WRITE_BATCH_SIZE:
+                    try:
+                        ops.append(self.writes.get_nowait())
+                    except queue.Empty:
+                        break
+
+                # Collected up front so a failed commit still answers waiters and stops on close
+                stop = any(op is None for op in ops)
+                callbacks = [op[1] for op in ops if op is not None and op[0] == "flush"]
+                try:
+                    with conn:
+                        for op in ops:
+                            if op is None or op[0] == "flush":
+                                continue
+                            if op[0] == "upsert":
+                                conn.execute(upsert_sql, [op[1][k] for k in COLUMNS])
+                            elif op[0] == "delete":
+                                conn.executemany("DELETE FROM past_streams WHERE id = ?", [(i,) for i in op[1]])
+                    self.batches += 1
+                    self.writes_committed += sum(1 for op in ops if op is not None and op[0] != "flush")
+                except Exception as e:
+                    logger.error("Failed to commit %d metadata writes: %s", len(ops), e)
+                    failure = failure or e
+                for callback in callbacks:
+                    callback(failure)
+                if callbacks:
+                    failure = None
+                if stop:
+                    break
+        finally:
+            conn.close()
+
+    # Reads
+
+    def _read(self, sql: str, params: list) -> List[dict]:
+        with self.read_lock:
+            rows = [dict(row) for row in self.read_conn.execute(sql, params)]
+        for row in rows:
+            for name in BOOLEAN_COLUMNS:
+                if name in row:
+                    row[name] = bool(row[name])
+        return rows
+
+    async def load_all(self) -> List[dict]:
+        return await asyncio.to_thread(self._read, "SELECT * FROM past_streams ORDER BY started_at", [])
+
+    async def query(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Past streams overlapping [since, until], newest first, one page at a time."""
+        where, params = [], []
+        if since:
+            where.append("ended_at >= ?")
+            params.append(since)
+        if until:
+            where.append("started_at <= ?")
+            params.append(until)
+        if cursor:
+            started_at, stream_id = decode_cursor(cursor)
+            where.append("(started_at < ? OR (started_at = ? AND id < ?))")
+            params.extend([started_at, started_at, stream_id])
+        sql = "SELECT * FROM past_streams"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY started_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = await asyncio.to_thread(self._read, sql, params)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["started_at"], rows[-1]["id"])
+        return rows, next_cursor
+
+    # Reconciliation
+
+    @staticmethod
+    def _scan(recordings_dir: Path) -> Dict[str, os.stat_result]:
+        return {p.name: p.stat() for p in recordings_dir.iterdir() if p.is_file() and p.suffix == RECORDING_SUFFIX}
+
+    async def reconcile(self, recordings_dir: Path, min_age_seconds: float = 0) -> Tuple[List[dict], int, int]:
+        """Drop rows whose file is gone and add rows for files without metadata.
+
+        Files younger than min_age_seconds are left alone: another worker may
+        have saved the file and not yet written its metadata.
+        Returns (rows, added, removed) where rows is the reconciled table contents.
+        """
+        rows = await self.load_all()
+        files = await asyncio.to_thread(self._scan, recordings_dir)
+        now = time.time()
+
+        missing = [row["id"] for row in rows if row["video_filename"] not in files]
+        known = {row["video_filename"] for row in rows}
+        known_ids = {row["id"] for row in rows}
+        added = []
+        for filename, stat in files.items():
+            if filename in known or now - stat.st_mtime < min_age_seconds:
+                continue
+            stream_id = filename[: -len(RECORDING_SUFFIX)].rsplit("_", 1)[0]
+            if stream_id in known_ids:
+                # The id already belongs to another recording; keep the file addressable
+                stream_id = filename[: -len(RECORDING_SUFFIX)]
+            modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat()
+            record = {
+                "id": stream_id,
+                "started_at": modified,
+                "ended_at": modified,
+                "latitude": 0.0,
+                "longitude": 0.0,
+                "notes": "Recovered recording",
+                "duration_seconds": 0.0,
+                "video_filename": filename,
+                "video_url": f"/recordings/{filename}",
+            }
+            known_ids.add(stream_id)
+            added.append(record)
+
+        if missing:
+            self.delete(missing)
+        for record in added:
+            self.upsert(record)
+        await self.flush()
+
+        missing_ids = set(missing)
+        rows = [row for row in rows if row["id"] not in missing_ids] + added
+        logger.info("Loaded %d past streams (%d recovered from files, %d missing files dropped)", len(rows), len(added), len(missing))
+        return rows, len(added), len(missing)
+
+    def stats(self) -> dict:
+        return {
+            "db_path": str(self.db_path),
+            "queued_writes": self.writes.qsize(),
+            "write_batches": self.batches,
+            "writes_committed": self.writes_committed,
+        }
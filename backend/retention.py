@@ -0,0 +1,189 @@
+"""
+Background retention for recordings.
+Periodically evicts unpinned recordings older than the maximum age, then the
+oldest unpinned ones until the directory fits the byte quota, in batches so
+dashboards get one stream list update per batch. Also drops metadata whose
+file is gone and deletes recording files that no metadata refers to. Every
+worker runs a janitor, so recordings are read from the shared metadata store
+rather than a worker's own stream list, which may have missed a bus message.
+"""
+
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from pathlib import Path
+import asyncio
+import os
+import time
+
+from logs import get_logger
+from recording_store import RECORDING_SUFFIX
+
+logger = get_logger("Retention")
+
+# (stream_id, video_filename, pinned) for every known recording
+Recording = Tuple[str, str, bool]
+
+
+class RetentionJanitor:
+    def __init__(
+        self,
+        recordings_dir: Path,
+        recordings: Callable[[], Awaitable[Iterable[Recording]]],
+        evict: Callable[[List[Recording]], Awaitable[None]],
+        thumbnails_dir: Optional[Path] = None,
+    ):
+        self.recordings_dir = recordings_dir
+        self.thumbnails_dir = thumbnails_dir
+        self.recordings = recordings
+        self.evict = evict
+        self.max_age = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0")) * 86400
+        self.max_bytes = int(float(os.getenv("RETENTION_MAX_GB", "0")) * 1024 ** 3)
+        self.interval = float(os.getenv("RETENTION_INTERVAL_SECONDS", "300"))
+        self.batch_size = max(1, int(os.getenv("RETENTION_BATCH_SIZE", "50")))
+        # Uploads are written before their metadata exists; leave young unknown files alone
+        self.orphan_grace = float(os.getenv("RETENTION_ORPHAN_GRACE_SECONDS", "3600"))
+        self.task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.evicted_age = 0
+        self.evicted_quota = 0
+        self.missing_dropped = 0
+        self.orphans_deleted = 0
+        self.bytes_freed = 0
+        self.total_bytes = 0
+        self.last_run: Optional[float] = None
+
+    def _scan(self) -> Dict[str, os.stat_result]:
+        return {
+            p.name: p.stat()
+            for p in self.recordings_dir.iterdir()
+            if p.is_file() and p.suffix == RECORDING_SUFFIX
+        }
+
+    def _delete_orphans(self, filenames: List[str]) -> int:
+        freed = 0
+        for filename in filenames:
+            path = self.recordings_dir / filename
+            try:
+                freed += path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        return freed
+
+    def _delete_orphan_thumbnails(self, known_stems: set) -> int:
+        if self.thumbnails_dir is None or not self.thumbnails_dir.is_dir():
+            return 0
+        deleted = 0
+        now = time.time()
+        for path in self.thumbnails_dir.iterdir():
+            # Posters are named after their recording; partial files belong to a running ffmpeg
+            stem = path.name.split(".", 1)[0]
+            try:
+                if stem in known_stems or now - path.stat().st_mtime < self.orphan_grace:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            deleted += 1
+        return deleted
+
+    async def sweep(self) -> dict:
+        """Run one retention pass. Returns what was removed."""
+        # Metadata first: a recording registered after this point shows up as a young orphan
+        # file (left alone), never as metadata with a missing file
+        recordings = list(await self.recordings())
+        files = await asyncio.to_thread(self._scan)
+        now = time.time()
+
+        referenced = {filename for _, filename, _ in recordings}
+        missing = [recording for recording in recordings if recording[1] not in files]
+        orphans = [
+            filename for filename, stat in files.items()
+            if filename not in referenced and now - stat.st_mtime >= self.orphan_grace
+        ]
+
+        # Oldest first by file modification time (when the recording was saved)
+        candidates = sorted(
+            ((files[recording[1]].st_mtime, recording, files[recording[1]].st_size)
+             for recording in recordings
+             if recording[1] in files and not recording[2]),
+        )
+        total = sum(files[filename].st_size for filename in referenced if filename in files)
+
+        by_age, by_quota = [], []
+        for mtime, recording, size in candidates:
+            if self.max_age > 0 and now - mtime > self.max_age:
+                by_age.append(recording)
+                total -= size
+            elif self.max_bytes > 0 and total > self.max_bytes:
+                by_quota.append(recording)
+                total -= size
+
+        if orphans:
+            freed = await asyncio.to_thread(self._delete_orphans, orphans)
+            self.orphans_deleted += len(orphans)
+            self.bytes_freed += freed
+        for batch in (missing, by_age + by_quota):
+            for start in range(0, len(batch), self.batch_size):
+                await self.evict(batch[start:start + self.batch_size])
+        evicted = set(by_age + by_quota)
+        self.bytes_freed += sum(size for _, recording, size in candidates if recording in evicted)
+        await asyncio.to_thread(
+            self._delete_orphan_thumbnails,
+            {Path(filename).stem for filename in referenced},
+        )
+
+        self.runs += 1
+        self.last_run = now
+        self.missing_dropped += len(missing)
+        self.evicted_age += len(by_age)
+        self.evicted_quota += len(by_quota)
+        self.total_bytes = total
+        result = {
+            "missing": [stream_id for stream_id, _, _ in missing],
+            "orphans": orphans,
+            "expired": [stream_id for stream_id, _, _ in by_age],
+            "over_quota": [stream_id for stream_id, _, _ in by_quota],
+        }
+        if any(result.values()):
+            logger.info(
+                "Removed %d expired, %d over quota, %d with missing files and %d orphaned files",
+                len(by_age), len(by_quota), len(missing), len(orphans),
+            )
+        return result
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Sweep failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.task is None and self.interval > 0:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def stats(self) -> dict:
+        return {
+            "max_age_days": self.max_age / 86400,
+            "max_bytes": self.max_bytes,
+            "total_bytes": self.total_bytes,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "evicted_age": self.evicted_age,
+            "evicted_quota": self.evicted_quota,
+            "missing_dropped": self.missing_dropped,
+            "orphans_deleted": self.orphans_deleted,
+            "bytes_freed": self.bytes_freed,
+        }
@@ -0,0 +1,144 @@
+"""
+In-memory grid spatial index for stream locations.
+Points are bucketed into fixed-size latitude/longitude cells so bounding-box
+and radius queries only visit nearby cells instead of every stream.
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+import math
+import os
+
+from location_ticker import distance_meters
+
+METERS_PER_DEGREE_LAT = 111320.0
+
+Cell = Tuple[int, int]
+BBox = Tuple[float, float, float, float]  # (min_lng, min_lat, max_lng, max_lat)
+
+
+def check_point(lat: float, lng: float) -> Tuple[float, float]:
+    """Reject coordinates the grid cannot index (not numbers, non-finite or outside ±90/±180)."""
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (lat, lng)):
+        raise ValueError("coordinates must be numbers")
+    if not (math.isfinite(lat) and math.isfinite(lng)):
+        raise ValueError("coordinates must be finite numbers")
+    if not -90.0 <= lat <= 90.0:
+        raise ValueError("latitude must be between -90 and 90")
+    if not -180.0 <= lng <= 180.0:
+        raise ValueError("longitude must be between -180 and 180")
+    return lat, lng
+
+
+def parse_bbox(value: str) -> BBox:
+    """Parse 'min_lng,min_lat,max_lng,max_lat' (the order Leaflet's toBBoxString uses)."""
+    min_lng, min_lat, max_lng, max_lat = (float(v) for v in value.split(","))
+    return check_bbox(min_lng, min_lat, max_lng, max_lat)
+
+
+def check_bbox(min_lng: float, min_lat: float, max_lng: float, max_lat: float) -> BBox:
+    """Return the box if both corners are valid points and the minimums don't exceed the maximums, else raise ValueError."""
+    check_point(min_lat, min_lng)
+    check_point(max_lat, max_lng)
+    if min_lat > max_lat or min_lng > max_lng:
+        raise ValueError("bbox minimums must not exceed maximums")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def parse_point(value: str) -> Tuple[float, float]:
+    """Parse 'lat,lng'."""
+    lat, lng = (float(v) for v in value.split(","))
+    return check_point(lat, lng)
+
+
+class GridIndex:
+    def __init__(self, cell_degrees: Optional[float] = None):
+        self.cell = cell_degrees or float(os.getenv("SPATIAL_CELL_DEGREES", "0.05"))
+        self.cells: Dict[Cell, Set[str]] = {}
+        self.points: Dict[str, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return int(math.floor(lat / self.cell)), int(math.floor(lng / self.cell))
+
+    def put(self, item_id: str, lat: float, lng: float):
+        """Insert or move an item."""
+        old = self.points.get(item_id)
+        new_cell = self._cell(lat, lng)
+        if old is not None:
+            old_cell = self._cell(*old)
+            if old_cell != new_cell:
+                self._discard_from_cell(old_cell, item_id)
+        self.points[item_id] = (lat, lng)
+        self.cells.setdefault(new_cell, set()).add(item_id)
+
+    def remove(self, item_id: str):
+        old = self.points.pop(item_id, None)
+        if old is not None:
+            self._discard_from_cell(self._cell(*old), item_id)
+
+    def _discard_from_cell(self, cell: Cell, item_id: str):
+        bucket = self.cells.get(cell)
+        if bucket is not None:
+            bucket.discard(item_id)
+            if not bucket:
+                del self.cells[cell]
+
+    def bbox(self, box: BBox) -> List[str]:
+        """IDs of items inside the bounding box."""
+        min_lng, min_lat, max_lng, max_lat = box
+        lo_lat, lo_lng = self._cell(min_lat, min_lng)
+        hi_lat, hi_lng = self._cell(max_lat, max_lng)
+        cell_count = (hi_lat - lo_lat + 1) * (hi_lng - lo_lng + 1)
+
+        if cell_count > len(self.cells):
+            # Huge box: cheaper to walk the occupied cells than every cell in range
+            candidates = (
+                item_id
+                for (cy, cx), bucket in self.cells.items()
+                if lo_lat <= cy <= hi_lat and lo_lng <= cx <= hi_lng
+                for item_id in bucket
+            )
+        else:
+            candidates = (
+                item_id
+                for cy in range(lo_lat, hi_lat + 1)
+                for cx in range(lo_lng, hi_lng + 1)
+                for item_id in self.cells.get((cy, cx), ())
+            )
+
+        result = []
+        for item_id in candidates:
+            lat, lng = self.points[item_id]
+            if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                result.append(item_id)
+        return result
+
+    def near(self, lat: float, lng: float, radius_meters: float) -> List[Tuple[str, float]]:
+        """(id, distance in meters) of items within the radius, closest first."""
+        dlat = radius_meters / METERS_PER_DEGREE_LAT
+        dlng = radius_meters / (METERS_PER_DEGREE_LAT * max(0.01, math.cos(math.radians(lat))))
+        # Clamped so a huge radius cannot push the box past the grid's valid range
+        box = (max(-180.0, lng - dlng), max(-90.0, lat - dlat), min(180.0, lng + dlng), min(90.0, lat + dlat))
+        hits = []
+        for item_id in self.bbox(box):
+            distance = distance_meters((lat, lng), self.points[item_id])
+            if distance <= radius_meters:
+                hits.append((item_id, distance))
+        hits.sort(key=lambda hit: hit[1])
+        return hits
+
+    def query(self, bbox: Optional[BBox] = None, near: Optional[Tuple[float, float]] = None, radius: float = 1000.0) -> Optional[List[str]]:
+        """IDs matching the given filters (both must match), or None if no filter was given."""
+        ids = None
+        if near is not None:
+            ids = [item_id for item_id, _ in self.near(near[0], near[1], radius)]
+        if bbox is not None:
+            in_box = self.bbox(bbox)
+            if ids is None:
+                ids = in_box
+            else:
+                in_box_set = set(in_box)
+                ids = [i for i in ids if i in in_box_set]
+        return ids
@@ -0,0 +1,159 @@
+"""
+Versioned stream state for dashboards.
+Holds active and past streams, a monotonically increasing sequence number,
+and a cached serialized snapshot that is only rebuilt after a change.
+Every mutation returns a small delta message carrying the new sequence number,
+serialized once and kept alongside the dict it was built from so it can be
+routed without parsing it again.
+A spatial index per kind is kept in step with every mutation.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import asdict
+
+from spatial import GridIndex
+from wire import dumps
+
+# Stream kinds and the snapshot key each one is listed under
+ACTIVE = "active"
+PAST = "past"
+SNAPSHOT_KEYS = {ACTIVE: "streams", PAST: "past_streams"}
+
+
+class Delta:
+    """A stream-list change: the message dict and its JSON text."""
+
+    __slots__ = ("change", "text")
+
+    def __init__(self, change: dict):
+        self.change = change
+        self.text = dumps(change)
+
+
+class StreamState:
+    def __init__(self):
+        self.active: Dict[str, Any] = {}
+        self.past: Dict[str, Any] = {}
+        self.seq = 0
+        self._records: Dict[Tuple[str, str], dict] = {}
+        self._snapshot: Optional[str] = None
+        self.snapshot_builds = 0
+        self.indexes = {ACTIVE: GridIndex(), PAST: GridIndex()}
+
+    def _streams(self, kind: str) -> Dict[str, Any]:
+        return self.active if kind == ACTIVE else self.past
+
+    def record(self, kind: str, stream_id: str) -> dict:
+        """Cached dict form of a single stream."""
+        key = (kind, stream_id)
+        cached = self._records.get(key)
+        if cached is None:
+            cached = asdict(self._streams(kind)[stream_id])
+            self._records[key] = cached
+        return cached
+
+    def records(self, kind: str, stream_ids: Optional[List[str]] = None) -> List[dict]:
+        if stream_ids is None:
+            stream_ids = list(self._streams(kind))
+        return [self.record(kind, stream_id) for stream_id in stream_ids]
+
+    def _invalidate(self, kind: str, stream_id: str):
+        self._records.pop((kind, stream_id), None)
+        self._snapshot = None
+        info = self._streams(kind).get(stream_id)
+        if info is None:
+            self.indexes[kind].remove(stream_id)
+        else:
+            self.indexes[kind].put(stream_id, info.latitude, info.longitude)
+
+    def _bump(self) -> int:
+        self.seq += 1
+        return self.seq
+
+    def snapshot(self) -> str:
+        """Full stream list, serialized once per version."""
+        if self._snapshot is None:
+            self._snapshot = dumps({
+                "type": "stream_list",
+                "seq": self.seq,
+                "streams": self.records(ACTIVE),
+                "past_streams": self.records(PAST),
+            })
+            self.snapshot_builds += 1
+        return self._snapshot
+
+    def load(self, kind: str, infos: List[Any]):
+        """Bulk-load streams (e.g. at startup) as a single version without a delta."""
+        streams = self._streams(kind)
+        for info in infos:
+            streams[info.id] = info
+            self._invalidate(kind, info.id)
+        self._bump()
+
+    def put(self, kind: str, info: Any) -> Delta:
+        """Add or replace a stream and return the matching delta message."""
+        streams = self._streams(kind)
+        message_type = "stream_updated" if info.id in streams else "stream_added"
+        streams[info.id] = info
+        self._invalidate(kind, info.id)
+        seq = self._bump()
+        return Delta({
+            "type": message_type,
+            "seq": seq,
+            "kind": kind,
+            "stream": self.record(kind, info.id),
+        })
+
+    def update(self, kind: str, stream_id: str, **fields) -> Optional[Delta]:
+        """Change fields of an existing stream. Returns None if nothing changed."""
+        info = self._streams(kind).get(stream_id)
+        if info is None:
+            return None
+        changed = {k: v for k, v in fields.items() if getattr(info, k) != v}
+        if not changed:
+            return None
+        for k, v in changed.items():
+            setattr(info, k, v)
+        self._invalidate(kind, stream_id)
+        seq = self._bump()
+        return Delta({
+            "type": "stream_updated",
+            "seq": seq,
+            "kind": kind,
+            "stream": self.record(kind, stream_id),
+        })
+
+    def move(self, positions: Dict[str, Tuple[float, float]]) -> Optional[Delta]:
+        """Apply a batch of active-stream positions as one stream_positions delta."""
+        moved = []
+        for stream_id, (latitude, longitude) in positions.items():
+            info = self.active.get(stream_id)
+            if info is None:
+                continue
+            info.latitude = latitude
+            info.longitude = longitude
+            self._invalidate(ACTIVE, stream_id)
+            moved.append({"id": stream_id, "latitude": latitude, "longitude": longitude})
+        if not moved:
+            return None
+        return Delta({
+            "type": "stream_positions",
+            "seq": self._bump(),
+            "positions": moved,
+        })
+
+    def remove(self, kind: str, stream_ids: List[str]) -> Optional[Delta]:
+        """Remove one or more streams in a single delta. Returns None if none existed."""
+        streams = self._streams(kind)
+        removed = [stream_id for stream_id in stream_ids if stream_id in streams]
+        if not removed:
+            return None
+        for stream_id in removed:
+            del streams[stream_id]
+            self._invalidate(kind, stream_id)
+        return Delta({
+            "type": "stream_removed",
+            "seq": self._bump(),
+            "kind": kind,
+            "ids": removed,
+        })
@@ -0,0 +1,258 @@
+"""
+Dashboard subscriptions.
+A dashboard that sends {"type": "subscribe", ...} only receives the stream
+changes and alerts matching its filters: a region (bounding box), stream IDs,
+alert types and whether past streams are included. SubscriberIndex maps
+stream IDs and spatial grid cells to the subscribed connections, so each
+update is routed by looking up the few IDs and cells it touches instead of
+testing every dashboard. Dashboards that never subscribe receive everything
+and are not in the index.
+"""
+
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from dataclasses import dataclass, replace
+import math
+import os
+
+from spatial import BBox, Cell, check_bbox, parse_bbox
+
+# Regions covering more grid cells than this are checked one by one instead of indexed per cell
+MAX_REGION_CELLS = 4096
+
+
+def _parse_region(value) -> BBox:
+    """A region is "min_lng,min_lat,max_lng,max_lat" (as for GET /streams?bbox=) or the same four numbers as a list.
+
+    Raises ValueError for anything else, including non-finite or out-of-range coordinates.
+    """
+    if isinstance(value, str):
+        return parse_bbox(value)
+    if isinstance(value, (list, tuple)) and len(value) == 4:
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value):
+            raise ValueError("region coordinates must be numbers")
+        return check_bbox(*(float(v) for v in value))
+    raise ValueError("region must be min_lng,min_lat,max_lng,max_lat")
+
+
+def _parse_ids(value) -> FrozenSet[str]:
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError("expected a list of strings")
+    return frozenset(value)
+
+
+def _in_region(region: BBox, lat: float, lng: float) -> bool:
+    min_lng, min_lat, max_lng, max_lat = region
+    return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+
+
+@dataclass(frozen=True)
+class Subscription:
+    """What a dashboard wants. None means "not filtered by this"; an empty set matches nothing."""
+
+    region: Optional[BBox] = None
+    stream_ids: Optional[FrozenSet[str]] = None
+    alert_types: Optional[FrozenSet[str]] = None
+    include_past: bool = True
+
+    @property
+    def filters_streams(self) -> bool:
+        return self.region is not None or self.stream_ids is not None
+
+    def subscribe(self, message: dict) -> "Subscription":
+        """Add the filters in a subscribe message: stream IDs and alert types are added, region and include_past replaced."""
+        sub = self
+        if "region" in message:
+            sub = replace(sub, region=_parse_region(message["region"]))
+        if "stream_ids" in message:
+            sub = replace(sub, stream_ids=(sub.stream_ids or frozenset()) | _parse_ids(message["stream_ids"]))
+        if "alert_types" in message:
+            sub = replace(sub, alert_types=(sub.alert_types or frozenset()) | _parse_ids(message["alert_types"]))
+        if "include_past" in message:
+            sub = replace(sub, include_past=bool(message["include_past"]))
+        return sub
+
+    def unsubscribe(self, message: dict) -> Optional["Subscription"]:
+        """Remove the filters in an unsubscribe message. One without filters removes the subscription (back to everything)."""
+        if not any(key in message for key in ("region", "stream_ids", "alert_types", "include_past")):
+            return None
+        sub = self
+        if "region" in message:
+            sub = replace(sub, region=None)
+        if "stream_ids" in message and sub.stream_ids is not None:
+            sub = replace(sub, stream_ids=sub.stream_ids - _parse_ids(message["stream_ids"]))
+        if "alert_types" in message and sub.alert_types is not None:
+            sub = replace(sub, alert_types=sub.alert_types - _parse_ids(message["alert_types"]))
+        if "include_past" in message:
+            sub = replace(sub, include_past=False)
+        return sub
+
+    def matches_alert_types(self, detection_types: Iterable[str]) -> bool:
+        return self.alert_types is None or not self.alert_types.isdisjoint(detection_types)
+
+    def to_dict(self) -> dict:
+        return {
+            "region": list(self.region) if self.region is not None else None,
+            "stream_ids": sorted(self.stream_ids) if self.stream_ids is not None else None,
+            "alert_types": sorted(self.alert_types) if self.alert_types is not None else None,
+            "include_past": self.include_past,
+        }
+
+
+class SubscriberIndex:
+    def __init__(self, cell_degrees: Optional[float] = None):
+        self.cell = cell_degrees or float(os.getenv("SPATIAL_CELL_DEGREES", "0.05"))
+        self.subscriptions: Dict[str, Subscription] = {}
+        # Subscribers without a stream filter (e.g. only alert types)
+        self.any_stream: Set[str] = set()
+        self.by_stream: Dict[str, Set[str]] = {}
+        self.by_cell: Dict[Cell, Set[str]] = {}
+        self.region_cells: Dict[str, List[Cell]] = {}
+        # Subscribers whose region is too large to index cell by cell
+        self.wide: Set[str] = set()
+        # (kind, stream_id) -> subscribers that were sent the stream and so need its later changes
+        self.followers: Dict[Tuple[str, str], Set[str]] = {}
+        self.following: Dict[str, Set[Tuple[str, str]]] = {}
+        # alert_id -> subscribers that were sent the alert and so need its updates and close
+        self.alert_followers: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.subscriptions)
+
+    def __contains__(self, conn_id: str) -> bool:
+        return conn_id in self.subscriptions
+
+    def get(self, conn_id: str) -> Optional[Subscription]:
+        return self.subscriptions.get(conn_id)
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return int(math.floor(lat / self.cell)), int(math.floor(lng / self.cell))
+
+    def set(self, conn_id: str, sub: Subscription):
+        """Add or replace a connection's subscription."""
+        self._unindex(conn_id)
+        self.subscriptions[conn_id] = sub
+        if not sub.filters_streams:
+            self.any_stream.add(conn_id)
+        for stream_id in sub.stream_ids or ():
+            self.by_stream.setdefault(stream_id, set()).add(conn_id)
+        if sub.region is not None:
+            min_lng, min_lat, max_lng, max_lat = sub.region
+            lo_lat, lo_lng = self._cell(min_lat, min_lng)
+            hi_lat, hi_lng = self._cell(max_lat, max_lng)
+            if (hi_lat - lo_lat + 1) * (hi_lng - lo_lng + 1) > MAX_REGION_CELLS:
+                self.wide.add(conn_id)
+            else:
+                cells = [(cy, cx) for cy in range(lo_lat, hi_lat + 1) for cx in range(lo_lng, hi_lng + 1)]
+                for cell in cells:
+                    self.by_cell.setdefault(cell, set()).add(conn_id)
+                self.region_cells[conn_id] = cells
+
+    def remove(self, conn_id: str):
+        self._unindex(conn_id)
+        self.subscriptions.pop(conn_id, None)
+        self.unfollow(conn_id)
+        for alert_id in [a for a, conns in self.alert_followers.items() if conn_id in conns]:
+            self._discard(self.alert_followers, alert_id, conn_id)
+
+    def _unindex(self, conn_id: str):
+        sub = self.subscriptions.get(conn_id)
+        if sub is None:
+            return
+        self.any_stream.discard(conn_id)
+        self.wide.discard(conn_id)
+        for stream_id in sub.stream_ids or ():
+            self._discard(self.by_stream, stream_id, conn_id)
+        for cell in self.region_cells.pop(conn_id, ()):
+            self._discard(self.by_cell, cell, conn_id)
+
+    @staticmethod
+    def _discard(index: dict, key, conn_id: str):
+        conns = index.get(key)
+        if conns is not None:
+            conns.discard(conn_id)
+            if not conns:
+                del index[key]
+
+    def _matching(self, stream_id: str, lat: float, lng: float) -> Set[str]:
+        """Subscribers whose stream filter matches a stream at this position."""
+        matched = set(self.any_stream)
+        matched.update(self.by_stream.get(stream_id, ()))
+        for conn_id in self.by_cell.get(self._cell(lat, lng), ()):
+            if _in_region(self.subscriptions[conn_id].region, lat, lng):
+                matched.add(conn_id)
+        for conn_id in self.wide:
+            if _in_region(self.subscriptions[conn_id].region, lat, lng):
+                matched.add(conn_id)
+        return matched
+
+    def follow(self, conn_id: str, kind: str, stream_ids: Iterable[str]):
+        for stream_id in stream_ids:
+            self.followers.setdefault((kind, stream_id), set()).add(conn_id)
+            self.following.setdefault(conn_id, set()).add((kind, stream_id))
+
+    def unfollow(self, conn_id: str):
+        """Forget the streams a connection was sent (before it gets a new snapshot)."""
+        for key in self.following.pop(conn_id, ()):
+            self._discard(self.followers, key, conn_id)
+
+    def route_stream(self, kind: str, stream_id: str, lat: float, lng: float, past: bool = False) -> Set[str]:
+        """Subscribers that should get a change to this stream. Those matching start following it."""
+        matched = self._matching(stream_id, lat, lng)
+        if past:
+            matched = {c for c in matched if self.subscriptions[c].include_past}
+        routed = matched | self.followers.get((kind, stream_id), set())
+        for conn_id in matched:
+            self.follow(conn_id, kind, [stream_id])
+        return routed
+
+    def route_removed(self, kind: str, stream_ids: Iterable[str]) -> Set[str]:
+        """Subscribers that were sent any of these streams; they stop following them."""
+        routed: Set[str] = set()
+        for stream_id in stream_ids:
+            conns = self.followers.pop((kind, stream_id), set())
+            for conn_id in conns:
+                following = self.following.get(conn_id)
+                if following is not None:
+                    following.discard((kind, stream_id))
+            routed |= conns
+        return routed
+
+    def route_positions(self, kind: str, positions: Iterable[Tuple[str, float, float]]) -> Tuple[Set[str], Set[str]]:
+        """Route a batch of moves: (subscribers to send it to, subscribers a stream moved into view for).
+
+        A stream_positions message has no stream records, so the second group
+        needs a fresh snapshot rather than the message.
+        """
+        routed: Set[str] = set()
+        entering: Set[str] = set()
+        for stream_id, lat, lng in positions:
+            followers = self.followers.get((kind, stream_id), set())
+            routed |= followers
+            for conn_id in self._matching(stream_id, lat, lng):
+                if conn_id not in followers:
+                    entering.add(conn_id)
+        return routed - entering, entering
+
+    def route_alert(self, event: dict) -> Set[str]:
+        """Subscribers that should get an alert event. Once sent an alert, a subscriber also gets its updates and close."""
+        alert_id = event["alert_id"]
+        matched = {
+            c for c in self._matching(event["stream_id"], event["latitude"], event["longitude"])
+            if self.subscriptions[c].matches_alert_types(event.get("detection_types") or ())
+        }
+        matched |= self.alert_followers.get(alert_id, set())
+        if event.get("closed_at") is not None:
+            self.alert_followers.pop(alert_id, None)
+        elif matched:
+            self.alert_followers[alert_id] = set(matched)
+        return matched
+
+    def stats(self) -> dict:
+        return {
+            "subscribed": len(self.subscriptions),
+            "indexed_streams": len(self.by_stream),
+            "indexed_cells": len(self.by_cell),
+            "wide_regions": len(self.wide),
+            "followed_streams": len(self.followers),
+            "followed_alerts": len(self.alert_followers),
+        }
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Backend modules import each other as top-level modules (run from backend/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Keep main's database and background jobs away from the real recordings
+os.environ.setdefault("RECORDINGS_DB", os.path.join(tempfile.mkdtemp(prefix="alertstream-tests-"), "recordings.db"))
+os.environ.setdefault("RETENTION_INTERVAL_SECONDS", "0")
@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import ai_clients as ai_clients_module
+import main
+from ai_clients import AIClients
+from preprocess import Frame
+
+
+class StubOpenRouter:
+    """Minimal HTTP/1.1 keep-alive server answering /chat/completions like OpenRouter."""
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = []
+        self.status = 200
+        self.answer = "GUN"
+        self.delay = 0.0
+        self.server = None
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                self.requests.append((request_line.decode().split()[1], headers, json.loads(body or b"null")))
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                if self.status == 200:
+                    payload = json.dumps({"choices": [{"message": {"content": self.answer}}]}).encode()
+                else:
+                    payload = b'{"error": "overloaded"}'
+                writer.write(
+                    f"HTTP/1.1 {self.status} Stub\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def run_with_stub(monkeypatch, scenario, **env):
+    monkeypatch.setenv("AI_HTTP2", "0")
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+
+    async def runner():
+        stub = StubOpenRouter()
+        monkeypatch.setattr(ai_clients_module, "OPENROUTER_BASE_URL", await stub.start())
+        clients = AIClients(None, "test-key")
+        await clients.start()
+        monkeypatch.setattr(main, "ai_clients", clients)
+        try:
+            await scenario(stub, clients)
+        finally:
+            await clients.close()
+            await stub.stop()
+
+    asyncio.run(runner())
+
+
+def frame():
+    return Frame(data=b"\xff\xd8jpeg", content_type="image/jpeg")
+
+
+def test_requests_reuse_pooled_connection(monkeypatch):
+    async def scenario(stub, clients):
+        for _ in range(5):
+            assert await main.analyze_with_openrouter(frame()) == "GUN"
+        assert stub.connections == 1
+        path, headers, body = stub.requests[0]
+        assert path == "/api/v1/chat/completions"
+        assert headers["authorization"] == "Bearer test-key"
+        assert body["messages"][0]["content"][1]["image_url"]["url"].startswith("data:image/jpeg;base64,")
+
+    run_with_stub(monkeypatch, scenario)
+
+
+def test_http_error_is_raised_with_status(monkeypatch):
+    async def scenario(stub, clients):
+        stub.status = 503
+        with pytest.raises(Exception, match="OpenRouter API error: 503"):
+            await main.analyze_with_openrouter(frame())
+        # The connection stays usable after an error response
+        stub.status = 200
+        assert await main.analyze_with_openrouter(frame()) == "GUN"
+        assert stub.connections == 1
+
+    run_with_stub(monkeypatch, scenario)
+
+
+def test_slow_provider_times_out(monkeypatch):
+    async def scenario(stub, clients):
+        stub.delay = 1.0
+        with pytest.raises(httpx.ReadTimeout):
+            await main.analyze_with_openrouter(frame())
+
+    run_with_stub(monkeypatch, scenario, AI_HTTP_TIMEOUT="0.2")
+
+
+def test_close_releases_client(monkeypatch):
+    async def scenario(stub, clients):
+        client = clients.openrouter
+        await clients.close()
+        assert clients.openrouter is None and client.is_closed
+
+    run_with_stub(monkeypatch, scenario)
@@ -0,0 +1,124 @@
+import pytest
+
+from alerts import ALERT_CLOSED, ALERT_OPENED, ALERT_UPDATED, AlertAggregator, threat_label
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+@pytest.fixture
+def aggregator(events, monkeypatch):
+    monkeypatch.setenv("ALERT_OPEN_HITS", "2")
+    monkeypatch.setenv("ALERT_WINDOW_FRAMES", "3")
+    monkeypatch.setenv("ALERT_QUIET_SECONDS", "30")
+    monkeypatch.setenv("ALERT_UPDATE_INTERVAL_SECONDS", "5")
+    return AlertAggregator(events.append)
+
+
+def age(aggregator, stream_id, seconds):
+    """Pretend the stream's alert was last seen and last sent this many seconds earlier."""
+    alert = aggregator.streams[stream_id].alert
+    alert.last_seen -= seconds
+    alert.last_sent -= seconds
+
+
+def test_opens_after_k_of_n_positive_frames(aggregator, events):
+    assert aggregator.observe("s1", 1.0, 2.0, ["gun"]) is None
+    assert aggregator.observe("s1", 1.0, 2.0, []) is None
+    assert events == []
+    alert_id = aggregator.observe("s1", 1.0, 2.0, ["suspect"])
+    assert alert_id is not None
+    assert [e["type"] for e in events] == [ALERT_OPENED]
+    assert events[0]["detection_types"] == ["gun", "suspect"]
+    assert events[0]["threat_type"] == "Suspect Detected + NERF Toy Blaster Detected"
+    assert events[0]["detections"] == 2
+
+
+def test_single_positive_outside_window_does_not_open(aggregator, events):
+    for detections in (["gun"], [], [], ["gun"], [], [], []):
+        assert aggregator.observe("s1", 0.0, 0.0, detections) is None
+    assert events == []
+    assert not aggregator.is_hot("s1")
+
+
+def test_updates_are_coalesced_until_interval(aggregator, events):
+    alert_id = [aggregator.observe("s1", 0.0, 0.0, ["gun"]) for _ in range(2)][-1]
+    for _ in range(3):
+        assert aggregator.observe("s1", 0.5, 0.5, ["gun"]) == alert_id
+    assert [e["type"] for e in events] == [ALERT_OPENED]
+    assert aggregator.updates_coalesced == 3
+
+    # A new threat type is sent at once
+    aggregator.observe("s1", 0.5, 0.5, ["suspect"])
+    assert [e["type"] for e in events] == [ALERT_OPENED, ALERT_UPDATED]
+
+    # A pending repeat detection goes out from tick() once the interval passed
+    aggregator.observe("s1", 0.6, 0.6, ["gun"])
+    aggregator.tick()
+    assert len(events) == 2
+    age(aggregator, "s1", 6)
+    aggregator.tick()
+    assert [e["type"] for e in events] == [ALERT_OPENED, ALERT_UPDATED, ALERT_UPDATED]
+    assert events[-1]["latitude"] == 0.6 and events[-1]["detections"] == 7
+
+
+def test_closes_after_quiet_period(aggregator, events):
+    alert_id = [aggregator.observe("s1", 0.0, 0.0, ["gun"]) for _ in range(2)][-1]
+    assert aggregator.is_hot("s1")
+    age(aggregator, "s1", 29)
+    aggregator.tick()
+    assert [e["type"] for e in events] == [ALERT_OPENED]
+    age(aggregator, "s1", 2)
+    aggregator.tick()
+    assert [e["type"] for e in events] == [ALERT_OPENED, ALERT_CLOSED]
+    assert events[-1]["alert_id"] == alert_id and events[-1]["closed_at"] is not None
+    assert not aggregator.is_hot("s1")
+    # A later detection starts a new alert
+    new_id = [aggregator.observe("s1", 0.0, 0.0, ["gun"]) for _ in range(2)][-1]
+    assert new_id != alert_id
+
+
+def test_close_stream_and_history(aggregator, events):
+    [aggregator.observe("s1", 0.0, 0.0, ["gun"]) for _ in range(2)]
+    [aggregator.observe("s2", 0.0, 0.0, ["suspect"]) for _ in range(2)]
+    aggregator.close_stream("s1")
+    assert events[-1]["type"] == ALERT_CLOSED and events[-1]["stream_id"] == "s1"
+    assert [a["stream_id"] for a in aggregator.recent()] == ["s1", "s2"]
+    assert [a["stream_id"] for a in aggregator.recent(open_only=True)] == ["s2"]
+    assert "type" not in aggregator.recent()[0]
+
+
+def test_threat_label_orders_known_types():
+    assert threat_label(["gun", "suspect", "knife"]) == "Suspect Detected + NERF Toy Blaster Detected + knife"
+
+
+def test_idle_streams_are_forgotten(aggregator):
+    aggregator.observe("quiet", 0.0, 0.0, [])
+    aggregator.observe("remote", 0.0, 0.0, ["gun"])
+    [aggregator.observe("open", 0.0, 0.0, ["gun"]) for _ in range(2)]
+    aggregator.tick()
+    assert set(aggregator.streams) == {"quiet", "remote", "open"}
+
+    for state in aggregator.streams.values():
+        state.last_frame -= 31
+    aggregator.tick()
+    # The open alert keeps its stream until the alert itself closes
+    assert set(aggregator.streams) == {"open"}
+    age(aggregator, "open", 31)
+    aggregator.tick()
+    aggregator.tick()
+    assert aggregator.streams == {}
+    assert aggregator.stats()["streams"] == 0
+
+
+def test_history_keeps_fields_added_when_emitting():
+    def emit(event):
+        event["nearby_stream_ids"] = ["cam-2"]
+
+    aggregator = AlertAggregator(emit)
+    aggregator.open_hits = 1
+    alert_id = aggregator.observe("s1", 0.0, 0.0, ["gun"])
+    assert aggregator.recent()[0]["alert_id"] == alert_id
+    assert aggregator.recent()[0]["nearby_stream_ids"] == ["cam-2"]
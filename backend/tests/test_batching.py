@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from batching import FrameBatcher, parse_batch_answer
+from preprocess import Frame
+
+
+class FakeRouter:
+    def __init__(self, batch_answer="IMAGE 1: GUN\nIMAGE 2: NONE"):
+        self.batch_answer = batch_answer
+        self.batches = []
+
+    async def analyze(self, frame):
+        return "NONE", "single"
+
+    async def analyze_batch(self, frames):
+        self.batches.append(len(frames))
+        if isinstance(self.batch_answer, BaseException):
+            raise self.batch_answer
+        return self.batch_answer, "batch"
+
+
+def batcher(router, monkeypatch, fallback="1"):
+    monkeypatch.setenv("AI_BATCH_ENABLED", "1")
+    monkeypatch.setenv("AI_BATCH_MAX_SIZE", "2")
+    monkeypatch.setenv("AI_BATCH_WINDOW_MS", "10")
+    monkeypatch.setenv("AI_BATCH_FALLBACK_SINGLE", fallback)
+    return FrameBatcher(router)
+
+
+def frame():
+    return Frame(data=b"jpeg", content_type="image/jpeg")
+
+
+def test_frames_from_two_streams_share_a_batch(monkeypatch):
+    async def scenario():
+        router = FakeRouter()
+        frames = batcher(router, monkeypatch)
+        results = await asyncio.gather(frames.analyze("a", frame()), frames.analyze("b", frame()))
+        assert results == [("GUN", "batch"), ("NONE", "batch")]
+        assert router.batches == [2]
+        assert frames.tasks == set()
+
+    asyncio.run(scenario())
+
+
+def test_crashed_batch_task_fails_its_callers(monkeypatch, caplog):
+    async def scenario():
+        frames = batcher(FakeRouter(), monkeypatch)
+
+        async def crash(items):
+            raise RuntimeError("bug in batch handling")
+
+        frames._run = crash
+        results = await asyncio.gather(frames.analyze("a", frame()), frames.analyze("b", frame()), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert frames.tasks == set()
+
+    asyncio.run(scenario())
+    assert "Batch of 2 frames failed" in caplog.text
+
+
+def test_cancelled_batch_cancels_its_callers(monkeypatch):
+    async def scenario():
+        frames = batcher(FakeRouter(), monkeypatch)
+        started = asyncio.Event()
+
+        async def hang(items):
+            started.set()
+            await asyncio.sleep(10)
+
+        frames._run = hang
+        waiting = asyncio.gather(frames.analyze("a", frame()), frames.analyze("b", frame()), return_exceptions=True)
+        await started.wait()
+        for task in list(frames.tasks):
+            task.cancel()
+        results = await waiting
+        assert all(isinstance(r, asyncio.CancelledError) for r in results)
+
+    asyncio.run(scenario())
+
+
+def test_unparseable_batch_falls_back_to_single_frames(monkeypatch):
+    async def scenario():
+        frames = batcher(FakeRouter(batch_answer="no idea"), monkeypatch)
+        results = await asyncio.gather(frames.analyze("a", frame()), frames.analyze("b", frame()))
+        assert results == [("NONE", "single"), ("NONE", "single")]
+        assert frames.fallbacks == 1
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("text,expected", [("IMAGE 1: GUN\nImage #2 - none", ["GUN", "NONE"]), ("IMAGE 1: GUN", None)])
+def test_parse_batch_answer(text, expected):
+    assert parse_batch_answer(text, 2) == expected
@@ -0,0 +1,148 @@
+import asyncio
+
+import wire
+from fanout import DashboardConnection, FanoutHub, FanoutPolicy, KIND_ALERT, KIND_DELTA, KIND_SNAPSHOT
+
+
+class FakeWebSocket:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, data):
+        if self.fail:
+            raise ConnectionError("socket gone")
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        await self.send_text(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def make_connection(max_queue=3, evict_after=10.0):
+    hub = FanoutHub(FanoutPolicy(max_queue=max_queue, evict_after_seconds=evict_after))
+    # Not started, so messages stay queued and the rules can be inspected
+    conn = DashboardConnection(FakeWebSocket(), hub)
+    return hub, conn
+
+
+def queued(conn):
+    return [(kind, message.encode(wire.JSON)) for kind, message, _ in conn.queue]
+
+
+def test_full_queue_drops_oldest_stream_message():
+    _, conn = make_connection(max_queue=3)
+    for i in range(5):
+        assert conn.enqueue(KIND_DELTA, f"d{i}")
+    assert queued(conn) == [(KIND_DELTA, "d2"), (KIND_DELTA, "d3"), (KIND_DELTA, "d4")]
+    assert conn.dropped == 2
+
+
+def test_alerts_are_never_dropped():
+    _, conn = make_connection(max_queue=2)
+    conn.enqueue(KIND_ALERT, "a0")
+    conn.enqueue(KIND_DELTA, "d0")
+    conn.enqueue(KIND_ALERT, "a1")
+    assert queued(conn) == [(KIND_ALERT, "a0"), (KIND_ALERT, "a1")]
+    for i in range(2, 6):
+        conn.enqueue(KIND_ALERT, f"a{i}")
+    assert [text for kind, text in queued(conn) if kind == KIND_ALERT] == [f"a{i}" for i in range(6)]
+    conn.enqueue(KIND_SNAPSHOT, "s")
+    assert [text for _, text in queued(conn)] == [f"a{i}" for i in range(6)] + ["s"]
+
+
+def test_snapshot_replaces_queued_stream_messages():
+    _, conn = make_connection(max_queue=10)
+    conn.enqueue(KIND_DELTA, "d0")
+    conn.enqueue(KIND_ALERT, "a0")
+    conn.enqueue(KIND_SNAPSHOT, "s0")
+    conn.enqueue(KIND_DELTA, "d1")
+    conn.enqueue(KIND_SNAPSHOT, "s1")
+    assert queued(conn) == [(KIND_ALERT, "a0"), (KIND_SNAPSHOT, "s1")]
+    assert conn.dropped == 3
+
+
+def test_filtered_overflow_sends_fresh_snapshot():
+    _, conn = make_connection(max_queue=2)
+    conn.snapshot = lambda: "fresh"
+    conn.enqueue(KIND_ALERT, "a0")
+    conn.enqueue(KIND_DELTA, "d0")
+    assert conn.enqueue(KIND_DELTA, "d1")
+    assert queued(conn) == [(KIND_ALERT, "a0"), (KIND_SNAPSHOT, "fresh")]
+    # An alert arriving on a full queue is kept after the snapshot
+    conn.enqueue(KIND_DELTA, "d2")
+    conn.enqueue(KIND_ALERT, "a1")
+    assert queued(conn)[-1] == (KIND_ALERT, "a1")
+    assert (KIND_ALERT, "a0") in queued(conn)
+
+
+def test_lagging_consumer_is_evicted():
+    _, conn = make_connection(evict_after=5.0)
+    conn.enqueue(KIND_DELTA, "d0")
+    kind, message, enqueued_at = conn.queue[0]
+    conn.queue[0] = (kind, message, enqueued_at - 6.0)
+    assert conn.enqueue(KIND_ALERT, "a0") is False
+
+
+def test_publish_evicts_lagging_consumer_and_keeps_others():
+    async def scenario():
+        hub = FanoutHub(FanoutPolicy(max_queue=8, evict_after_seconds=5.0))
+        slow_ws, fast_ws = FakeWebSocket(), FakeWebSocket()
+        slow = hub.add(slow_ws)
+        hub.add(fast_ws)
+        slow.task.cancel()
+        slow.enqueue(KIND_DELTA, "d0")
+        kind, message, enqueued_at = slow.queue[0]
+        slow.queue[0] = (kind, message, enqueued_at - 6.0)
+        assert hub.publish(KIND_DELTA, "d1") == 2
+        await asyncio.sleep(0.01)
+        assert slow.id not in hub.connections and hub.evicted == 1
+        assert slow_ws.closed_with == 1013
+        assert fast_ws.sent == ["d1"]
+        await hub.close_all()
+
+    asyncio.run(scenario())
+
+
+def test_failed_send_evicts():
+    async def scenario():
+        hub = FanoutHub()
+        conn = hub.add(FakeWebSocket(fail=True))
+        conn.enqueue(KIND_DELTA, "d0")
+        await asyncio.sleep(0.01)
+        assert conn.id not in hub.connections and hub.evicted == 1
+
+    asyncio.run(scenario())
+
+
+def test_delivery_latency_is_reported_per_kind():
+    delivered = []
+
+    async def scenario():
+        hub = FanoutHub(on_sent=lambda kind, seconds: delivered.append((kind, seconds)))
+        ws = FakeWebSocket()
+        conn = hub.add(ws)
+        conn.enqueue(KIND_SNAPSHOT, "s0")
+        conn.enqueue(KIND_ALERT, "a0")
+        await asyncio.sleep(0.01)
+        assert ws.sent == ["s0", "a0"]
+        await hub.close_all()
+
+    asyncio.run(scenario())
+    assert [kind for kind, _ in delivered] == [KIND_SNAPSHOT, KIND_ALERT]
+    assert all(0 <= seconds < 1 for _, seconds in delivered)
+
+
+def test_failed_send_reports_no_delivery():
+    delivered = []
+
+    async def scenario():
+        hub = FanoutHub(on_sent=lambda kind, seconds: delivered.append(kind))
+        hub.add(FakeWebSocket(fail=True)).enqueue(KIND_DELTA, "d0")
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert delivered == []
@@ -0,0 +1,51 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from frame_cache import FrameCache, dhash, dhash_image
+
+
+def jpeg(img):
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+def gradient(flip=False):
+    img = Image.new("L", (90, 80))
+    img.putdata([255 - x * 2 if flip else x * 2 for _ in range(80) for x in range(90)])
+    return img
+
+
+def reference_dhash(img):
+    small = img.convert("L").resize((9, 8))
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (small.getpixel((col, row)) > small.getpixel((col + 1, row)))
+    return value
+
+
+def test_dhash_matches_pixel_by_pixel_definition():
+    img = gradient()
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((10, 10, 40, 30), fill=255)
+    assert dhash_image(img) == reference_dhash(img)
+    assert dhash_image(gradient()) == 0
+    assert dhash_image(gradient(flip=True)) == 2 ** 64 - 1
+
+
+def test_dhash_of_encoded_frames():
+    assert dhash(b"not an image") is None
+    assert bin(dhash(jpeg(gradient().convert("RGB"))) ^ dhash_image(gradient())).count("1") <= 2
+
+
+def test_near_duplicate_frames_hit():
+    cache = FrameCache(ttl_seconds=30, max_distance=5, max_entries_per_stream=4, enabled=True)
+    base = dhash_image(gradient())
+    assert cache.lookup("s1", base) is None
+    cache.store("s1", base, {"success": True})
+    assert cache.lookup("s1", base ^ 0b111) == {"success": True}
+    assert cache.lookup("s1", dhash_image(gradient(flip=True))) is None
+    assert cache.lookup("s2", base) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
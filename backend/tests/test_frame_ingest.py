@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from frame_ingest import REASON_ACTIVE, REASON_IDLE, REASON_LOAD, REASON_UNAVAILABLE, RateController
+from providers import Provider, ProviderRouter
+
+
+class FakeEngine:
+    def __init__(self, max_concurrency=2, pending=0):
+        self.max_concurrency = max_concurrency
+        self.queued = pending
+
+    def pending(self):
+        return self.queued
+
+
+class Channel:
+    def __init__(self):
+        self.messages = []
+
+    async def __call__(self, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def rates_env(monkeypatch):
+    for name, value in {
+        "FRAME_INTERVAL_MIN_MS": "500", "FRAME_INTERVAL_ACTIVE_MS": "1000", "FRAME_INTERVAL_IDLE_MS": "5000",
+        "FRAME_INTERVAL_MAX_MS": "30000", "FRAME_TARGET_UTILIZATION": "0.8", "FRAME_DEFAULT_LATENCY_MS": "2000",
+    }.items():
+        monkeypatch.setenv(name, value)
+
+
+def make_controller(latency=0.1, hot=(), engine=None):
+    async def analyze(frame):
+        return "ok"
+
+    router = ProviderRouter([Provider("fake", analyze)])
+    if latency is not None:
+        router.providers[0].health.record_success(latency)
+    controller = RateController(engine or FakeEngine(), lambda: router, lambda stream_id: stream_id in hot)
+    return controller, router
+
+
+def register(controller, *stream_ids):
+    channels = {stream_id: Channel() for stream_id in stream_ids}
+
+    async def scenario():
+        for stream_id, channel in channels.items():
+            await controller.register(stream_id, channel)
+
+    asyncio.run(scenario())
+    return channels
+
+
+def test_hot_streams_sample_faster_than_idle(rates_env):
+    controller, _ = make_controller(hot={"hot"})
+    channels = register(controller, "hot", "idle")
+    assert channels["hot"].messages == [{"type": "rate", "interval_ms": 1000, "reason": REASON_ACTIVE}]
+    assert channels["idle"].messages == [{"type": "rate", "interval_ms": 5000, "reason": REASON_IDLE}]
+    assert controller.scale == 1.0
+
+
+def test_intervals_stretch_when_demand_exceeds_capacity(rates_env):
+    # 2 concurrent calls at 1s each, 80% utilization: 1.6 frames/s for 20 hot streams asking 1/s each
+    hot = {f"s{i}" for i in range(20)}
+    controller, _ = make_controller(latency=1.0, hot=hot)
+    register(controller, *sorted(hot))
+    plan = controller.plan()
+    assert controller.scale == pytest.approx(20 / 1.6)
+    assert all(reason == REASON_LOAD for _, reason in plan.values())
+    assert all(interval == pytest.approx(20 / 1.6) for interval, _ in plan.values())
+    assert sum(1 / interval for interval, _ in plan.values()) == pytest.approx(1.6)
+
+
+def test_queued_frames_slow_everyone_down(rates_env):
+    engine = FakeEngine(max_concurrency=2, pending=2)
+    controller, _ = make_controller(hot={"a"}, engine=engine)
+    register(controller, "a")
+    assert controller.plan() == {"a": (2.0, REASON_LOAD)}
+
+
+def test_intervals_are_clamped(rates_env):
+    controller, _ = make_controller(latency=60.0, hot=())
+    register(controller, "a")
+    assert controller.plan()["a"] == (30.0, REASON_LOAD)
+
+
+def test_no_available_provider_backs_off_to_max(rates_env):
+    controller, router = make_controller()
+    health = router.providers[0].health
+    for _ in range(3):
+        health.record_failure(0.1)
+    channels = register(controller, "a")
+    assert channels["a"].messages == [{"type": "rate", "interval_ms": 30000, "reason": REASON_UNAVAILABLE}]
+
+
+def test_untried_provider_uses_default_latency(rates_env):
+    controller, _ = make_controller(latency=None)
+    assert controller._latency() == 2.0
+
+
+def test_only_noticeable_changes_are_sent(rates_env):
+    hot = set()
+    controller, _ = make_controller()
+    controller.is_hot = lambda stream_id: stream_id in hot
+    channels = register(controller, "a")
+    asyncio.run(controller.update())
+    assert len(channels["a"].messages) == 1
+    hot.add("a")
+    asyncio.run(controller.update())
+    assert channels["a"].messages[-1] == {"type": "rate", "interval_ms": 1000, "reason": REASON_ACTIVE}
+    assert controller.rate_messages == 2
+
+
+def test_unregister_ignores_a_replaced_channel(rates_env):
+    controller, _ = make_controller()
+    old = register(controller, "a")["a"]
+    new = register(controller, "a")["a"]
+    controller.unregister("a", old)
+    assert controller.channels["a"] is new
+    controller.unregister("a", new)
+    assert controller.stats()["streams"] == 0
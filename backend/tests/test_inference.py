@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from inference import FrameJob, InferenceEngine, SUPERSEDED
+
+
+def frame(stream_id="s1", data=b"frame"):
+    return FrameJob(stream_id=stream_id, latitude=0.0, longitude=0.0, image_data=data, content_type="image/jpeg")
+
+
+class GatedProvider:
+    """Analyzes frames one at a time, each only once release() is called."""
+
+    def __init__(self):
+        self.seen = []
+        self.gate = asyncio.Event()
+
+    async def __call__(self, job: FrameJob) -> dict:
+        self.seen.append(job.image_data)
+        await self.gate.wait()
+        self.gate.clear()
+        if job.image_data == b"bad":
+            raise RuntimeError("provider down")
+        return {"success": True, "analysis": job.image_data.decode()}
+
+    async def release(self):
+        self.gate.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+
+def test_latest_frame_wins_and_superseded_callers_are_told():
+    async def scenario():
+        provider = GatedProvider()
+        engine = InferenceEngine(provider, max_concurrency=1, max_workers=1)
+        first = engine.submit(frame(data=b"f1"))
+        await asyncio.sleep(0)  # f1 starts, so it is not replaceable any more
+        second_job, third_job = frame(data=b"f2"), frame(data=b"f3")
+        second = engine.submit(second_job)
+        third = engine.submit(third_job)
+        assert third_job.waiters == [second]
+
+        # The replaced frame's caller is answered at once and never sees f3's analysis
+        assert second.done()
+        assert second.result() == {
+            "success": True, "status": SUPERSEDED, "job_id": second_job.job_id, "superseded_by": third_job.job_id,
+        }
+
+        await provider.release()
+        assert (await first)["analysis"] == "f1"
+        await provider.release()
+        assert (await third)["analysis"] == "f3"
+        assert provider.seen == [b"f1", b"f3"]
+        assert engine.stats()["superseded"] == 1
+        assert engine.slots == {}
+        await engine.close()
+
+    asyncio.run(scenario())
+
+
+def test_streams_do_not_supersede_each_other():
+    async def scenario():
+        provider = GatedProvider()
+        engine = InferenceEngine(provider, max_concurrency=1, max_workers=1)
+        futures = [engine.submit(frame(stream_id=f"s{i}", data=f"f{i}".encode())) for i in range(3)]
+        for _ in futures:
+            await provider.release()
+        assert [(await f)["analysis"] for f in futures] == ["f0", "f1", "f2"]
+        assert engine.superseded == 0
+        await engine.close()
+
+    asyncio.run(scenario())
+
+
+def test_provider_error_reaches_caller():
+    async def scenario():
+        provider = GatedProvider()
+        engine = InferenceEngine(provider, max_concurrency=1, max_workers=1)
+        future = engine.submit(frame(data=b"bad"))
+        await provider.release()
+        with pytest.raises(RuntimeError):
+            await future
+        assert engine.stats()["failed"] == 1
+        await engine.close()
+
+    asyncio.run(scenario())
+
+
+def test_job_map_is_bounded():
+    async def scenario():
+        async def analyze(job):
+            return {"success": True}
+
+        engine = InferenceEngine(analyze, max_concurrency=2, max_workers=1, max_tracked_jobs=5)
+        jobs = [frame(stream_id=f"s{i}") for i in range(12)]
+        await asyncio.gather(*(engine.submit(job) for job in jobs))
+        assert len(engine.jobs) == 5
+        assert engine.job(jobs[0].job_id) is None
+        assert engine.job(jobs[-1].job_id).result() == {"success": True}
+        await engine.close()
+
+    asyncio.run(scenario())
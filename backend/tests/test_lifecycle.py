@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketState
+
+from lifecycle import REASON_CLOSED, REASON_IDLE, REASON_ORPHAN, REASON_SEND_FAILED, ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.client_state = WebSocketState.CONNECTED
+        self.application_state = WebSocketState.CONNECTED
+        self.closed_with = None
+
+    async def close(self, code=1000):
+        self.closed_with = code
+        self.application_state = WebSocketState.DISCONNECTED
+
+
+class Peer:
+    """A tracked connection whose pings succeed, fail or hang."""
+
+    def __init__(self, manager, role="viewer", ping_error=None, hang=False):
+        self.websocket = FakeWebSocket()
+        self.ping_error = ping_error
+        self.hang = hang
+        self.pings = []
+        self.dead = 0
+        self.tracked = manager.track(role, self.websocket, self.ping, self.on_dead)
+
+    async def ping(self, message):
+        if self.hang:
+            await asyncio.sleep(60)
+        if self.ping_error is not None:
+            raise self.ping_error
+        self.pings.append(message)
+
+    def on_dead(self):
+        self.dead += 1
+
+
+@pytest.fixture
+def reaps():
+    return []
+
+
+@pytest.fixture
+def manager(reaps):
+    manager = ConnectionManager(on_reap=lambda role, reason, count: reaps.append((role, reason, count)))
+    manager.interval = 10
+    manager.timeout = 30
+    manager.send_timeout = 0.05
+    return manager
+
+
+def quiet_for(peer, seconds):
+    peer.tracked.last_seen -= seconds
+
+
+def test_quiet_connection_is_pinged_then_idle_one_reaped(manager, reaps):
+    fresh, quiet, idle = Peer(manager), Peer(manager), Peer(manager, role="dashboard")
+    quiet_for(quiet, 15)
+    quiet_for(idle, 31)
+    asyncio.run(manager.sweep())
+
+    assert fresh.pings == [] and fresh.dead == 0
+    assert [p["type"] for p in quiet.pings] == ["ping"] and quiet.dead == 0
+    assert idle.dead == 1 and idle.pings == []
+    assert idle.websocket.closed_with == 1001
+    assert reaps == [("dashboard", REASON_IDLE, 1)]
+    assert manager.tracks(fresh.websocket) and manager.tracks(quiet.websocket)
+    assert not manager.tracks(idle.websocket)
+    assert manager.stats()["reaped"] == {"dashboard": {REASON_IDLE: 1}}
+    assert manager.pings == 1
+
+
+def test_seen_keeps_connection_alive(manager, reaps):
+    peer = Peer(manager)
+    quiet_for(peer, 31)
+    peer.tracked.seen()
+    asyncio.run(manager.sweep())
+    assert peer.dead == 0 and reaps == []
+
+
+def test_failed_or_stalled_ping_reaps(manager, reaps):
+    broken = Peer(manager, ping_error=ConnectionError("gone"))
+    stalled = Peer(manager, role="broadcaster", hang=True)
+    for peer in (broken, stalled):
+        quiet_for(peer, 15)
+    asyncio.run(manager.sweep())
+
+    assert broken.dead == 1 and stalled.dead == 1
+    assert broken.websocket.closed_with == 1001 and stalled.websocket.closed_with == 1001
+    assert sorted(reaps) == [("broadcaster", REASON_SEND_FAILED, 1), ("viewer", REASON_SEND_FAILED, 1)]
+    assert not manager.connections
+    assert manager.pings == 0
+
+
+def test_disconnected_socket_is_reaped_without_close(manager, reaps):
+    peer = Peer(manager)
+    peer.websocket.application_state = WebSocketState.DISCONNECTED
+    asyncio.run(manager.sweep())
+    assert peer.dead == 1 and peer.websocket.closed_with is None
+    assert reaps == [("viewer", REASON_CLOSED, 1)]
+
+
+def test_reap_is_idempotent_and_survives_on_dead_errors(manager, reaps):
+    peer = Peer(manager)
+
+    def fail():
+        raise RuntimeError("registry gone")
+
+    peer.tracked.on_dead = fail
+
+    async def scenario():
+        assert await manager.reap(peer.websocket, REASON_SEND_FAILED)
+        assert not await manager.reap(peer.websocket, REASON_SEND_FAILED)
+
+    asyncio.run(scenario())
+    assert peer.websocket.closed_with == 1001
+    assert reaps == [("viewer", REASON_SEND_FAILED, 1)]
+
+
+def test_prune_counts_orphans(manager, reaps):
+    manager.prune = lambda: {"viewer": 2, "dashboard": 0}
+    asyncio.run(manager.sweep())
+    assert reaps == [("viewer", REASON_ORPHAN, 2)]
+    assert manager.sweeps == 1
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from location_ticker import LocationTicker, distance_meters
+
+
+class Flushes:
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, positions):
+        self.batches.append(dict(positions))
+
+
+def test_distance_meters():
+    assert distance_meters((0.0, 0.0), (0.0, 0.0)) == 0
+    # One degree of latitude is about 111 km
+    assert distance_meters((0.0, 0.0), (1.0, 0.0)) == pytest.approx(111195, rel=1e-3)
+
+
+def test_latest_position_per_stream_is_sent_in_one_batch():
+    flushes = Flushes()
+    ticker = LocationTicker(flushes, interval_seconds=1)
+    ticker.mark("a", 1.0, 1.0)
+    ticker.mark("a", 1.5, 1.5)
+    ticker.mark("b", 2.0, 2.0)
+    assert ticker.position("a") == (1.5, 1.5)
+    asyncio.run(ticker.flush())
+    assert flushes.batches == [{"a": (1.5, 1.5), "b": (2.0, 2.0)}]
+    assert ticker.stats()["pending"] == 0 and ticker.flushes == 1
+    # Nothing dirty, nothing sent
+    asyncio.run(ticker.flush())
+    assert len(flushes.batches) == 1
+
+
+def test_unmoved_and_small_moves_are_suppressed():
+    flushes = Flushes()
+    ticker = LocationTicker(flushes, interval_seconds=1, min_distance_meters=50)
+    ticker.reset("a", 0.0, 0.0)
+    ticker.mark("a", 0.0, 0.0)
+    ticker.mark("b", 0.0, 0.0)
+    asyncio.run(ticker.flush())
+    # b had no known position, so it is always sent
+    assert flushes.batches == [{"b": (0.0, 0.0)}]
+    ticker.mark("a", 0.0001, 0.0)  # about 11 m
+    asyncio.run(ticker.flush())
+    assert len(flushes.batches) == 1 and ticker.suppressed == 2
+    ticker.mark("a", 0.001, 0.0)  # about 111 m
+    asyncio.run(ticker.flush())
+    assert flushes.batches[-1] == {"a": (0.001, 0.0)}
+
+
+def test_discard_drops_pending_position():
+    flushes = Flushes()
+    ticker = LocationTicker(flushes, interval_seconds=1)
+    ticker.mark("a", 1.0, 1.0)
+    ticker.discard("a")
+    assert ticker.position("a") is None
+    asyncio.run(ticker.flush())
+    assert flushes.batches == []
+
+
+def test_runs_on_interval_until_stopped():
+    flushes = Flushes()
+
+    async def scenario():
+        ticker = LocationTicker(flushes, interval_seconds=0.01)
+        ticker.start()
+        ticker.mark("a", 1.0, 1.0)
+        for _ in range(100):
+            if flushes.batches:
+                break
+            await asyncio.sleep(0.01)
+        await ticker.stop()
+        assert ticker.task is None
+
+    asyncio.run(scenario())
+    assert flushes.batches == [{"a": (1.0, 1.0)}]
@@ -0,0 +1,68 @@
+import io
+import json
+import logging
+
+import pytest
+
+import logs
+from logs import JsonFormatter, RateLimitFilter, TextFormatter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logs.time, "monotonic", lambda: now[0])
+    return now
+
+
+def capture(formatter, limit=2, interval=10.0):
+    """A logger writing through the given formatter and a rate limit, like the configured root."""
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(formatter)
+    handler.addFilter(RateLimitFilter(limit, interval))
+    logger = logging.getLogger(f"{logs.ROOT}.Test{id(stream)}")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger, stream
+
+
+def lines(stream):
+    return stream.getvalue().splitlines()
+
+
+def test_repeated_template_is_limited_and_suppressed_count_reported(clock):
+    logger, stream = capture(TextFormatter())
+    for i in range(5):
+        logger.warning("Send to %s failed", f"peer-{i}")
+    # A different template has its own budget
+    logger.info("Other message")
+    assert len(lines(stream)) == 3
+    assert lines(stream)[0].endswith("WARNING: Send to peer-0 failed")
+
+    clock[0] += 10
+    logger.warning("Send to %s failed", "peer-9")
+    assert lines(stream)[-1].endswith("Send to peer-9 failed (3 similar messages suppressed)")
+    logger.warning("Send to %s failed", "peer-10")
+    assert "suppressed" not in lines(stream)[-1]
+
+
+def test_zero_limit_disables_rate_limiting(clock):
+    logger, stream = capture(TextFormatter(), limit=0)
+    for _ in range(50):
+        logger.debug("tick")
+    assert len(lines(stream)) == 50
+
+
+def test_json_format_includes_fields_and_suppressed(clock):
+    logger, stream = capture(JsonFormatter(), limit=1)
+    logger.error("Flush failed: %s", "disk full", extra={"fields": {"stream_id": "s1"}})
+    logger.error("Flush failed: %s", "disk full")
+    clock[0] += 10
+    logger.error("Flush failed: %s", "again")
+    first, last = (json.loads(line) for line in lines(stream))
+    assert first["level"] == "error" and first["message"] == "Flush failed: disk full"
+    assert first["stream_id"] == "s1" and first["logger"].startswith("Test")
+    assert last["suppressed"] == 1 and "suppressed" not in first
+
@@ -0,0 +1,50 @@
+import io
+import random
+
+import pytest
+
+from preprocess import FramePreprocessor
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def jpeg(pixels):
+    out = io.BytesIO()
+    pixels.save(out, "JPEG", quality=95)
+    return out.getvalue()
+
+
+def night_scene(size=(320, 240), seed=1):
+    """Dark frame (mean brightness well under 12) with real detail in it."""
+    rng = random.Random(seed)
+    img = Image.new("L", size, 2)
+    for _ in range(150):
+        x, y = rng.randrange(size[0] - 8), rng.randrange(size[1] - 8)
+        img.paste(rng.randrange(20, 60), (x, y, x + 8, y + 8))
+    return img.convert("RGB")
+
+
+def test_dark_night_footage_is_analyzed():
+    frame = FramePreprocessor().prepare(jpeg(night_scene()), "image/jpeg")
+    assert frame.decoded and not frame.blank
+
+
+def test_flat_frame_is_blank():
+    frame = FramePreprocessor().prepare(jpeg(Image.new("RGB", (320, 240), (3, 3, 3))), "image/jpeg")
+    assert frame.blank
+
+
+def test_black_level_is_opt_in(monkeypatch):
+    # The old default of 12 would have dropped this scene without analysis
+    monkeypatch.setenv("FRAME_BLACK_LEVEL", "12")
+    assert FramePreprocessor().prepare(jpeg(night_scene()), "image/jpeg").blank
+
+
+def test_blank_check_uses_population_stddev(monkeypatch):
+    # Half 0, half 20: mean 10 and population stddev exactly 10
+    img = Image.new("L", (32, 32), 0)
+    img.paste(20, (0, 0, 32, 16))
+    monkeypatch.setenv("FRAME_BLANK_STDDEV", "10.5")
+    assert FramePreprocessor().prepare(jpeg(img.convert("RGB")), "image/jpeg").blank
+    monkeypatch.setenv("FRAME_BLANK_STDDEV", "9")
+    assert not FramePreprocessor().prepare(jpeg(img.convert("RGB")), "image/jpeg").blank
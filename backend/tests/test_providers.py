@@ -0,0 +1,184 @@
+import asyncio
+import time
+
+import pytest
+
+from providers import CLOSED, HALF_OPEN, OPEN, Provider, ProviderRouter
+
+
+class FakeProvider:
+    """Answers after a delay, or fails while `failing` is set."""
+
+    def __init__(self, name, delay=0.0, failing=False):
+        self.name = name
+        self.delay = delay
+        self.failing = failing
+        self.calls = 0
+        self.cancelled = 0
+
+    async def analyze(self, frame):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.failing:
+            raise ConnectionError(f"{self.name} is down")
+        return f"{self.name} saw {frame}"
+
+    def provider(self):
+        return Provider(self.name, self.analyze)
+
+
+@pytest.fixture
+def router_env(monkeypatch):
+    monkeypatch.setenv("AI_CIRCUIT_FAILURES", "3")
+    monkeypatch.setenv("AI_CIRCUIT_COOLDOWN_SECONDS", "30")
+    monkeypatch.setenv("AI_HEDGE", "0")
+    monkeypatch.setenv("AI_HEDGE_MIN_SECONDS", "0.05")
+    return monkeypatch
+
+
+def names(router):
+    return [p.name for p in router.ranked()]
+
+
+def test_ranking_prefers_fast_and_untried_and_demotes_failing(router_env):
+    fast, slow, flaky, new = FakeProvider("fast"), FakeProvider("slow"), FakeProvider("flaky"), FakeProvider("new")
+    router = ProviderRouter([slow.provider(), fast.provider(), flaky.provider(), new.provider()])
+    health = {p.name: p.health for p in router.providers}
+    for _ in range(5):
+        health["fast"].record_success(0.1)
+        health["slow"].record_success(0.5)
+    # Failures without a single success rank below every provider that has answered
+    health["flaky"].record_failure(0.1)
+    health["flaky"].record_failure(0.1)
+    assert health["flaky"].state == CLOSED
+    assert names(router) == ["new", "fast", "slow", "flaky"]
+
+    # Errors inflate an otherwise fast provider's score
+    health["fast"].record_failure(0.1)
+    health["fast"].record_success(0.1)
+    health["fast"].record_failure(0.1)
+    health["fast"].record_failure(0.1)
+    assert health["fast"].state == CLOSED
+    assert health["fast"].expected_latency() == pytest.approx(0.1 / (1 - 3 / 9))
+
+
+def test_failing_provider_is_skipped_after_two_failures(router_env):
+    fast, flaky = FakeProvider("fast"), FakeProvider("flaky", failing=True)
+    router = ProviderRouter([flaky.provider(), fast.provider()])
+
+    async def scenario():
+        for i in range(3):
+            assert await router.analyze(i) == (f"fast saw {i}", "fast")
+
+    asyncio.run(scenario())
+    # The first frame tried flaky; after that fast ranks first
+    assert flaky.calls == 1
+    assert names(router) == ["fast", "flaky"]
+
+
+def test_circuit_opens_and_half_open_allows_one_trial(router_env):
+    down = FakeProvider("down", delay=0.01, failing=True)
+    router = ProviderRouter([down.provider()])
+    health = router.providers[0].health
+
+    async def fail_once():
+        with pytest.raises(Exception, match="down is down"):
+            await router.analyze("frame")
+
+    async def scenario():
+        for _ in range(3):
+            await fail_once()
+        assert health.state == OPEN
+        with pytest.raises(Exception, match="circuits open"):
+            await router.analyze("frame")
+        assert down.calls == 3
+
+        # Cooldown over: exactly one trial request goes through
+        health.opened_at -= 31
+        down.failing = False
+        trial = asyncio.create_task(router.analyze("trial"))
+        await asyncio.sleep(0)
+        assert health.state == HALF_OPEN and health.trial_in_flight
+        with pytest.raises(Exception, match="circuits open"):
+            await router.analyze("second")
+        assert await trial == ("down saw trial", "down")
+        assert health.state == CLOSED and health.consecutive_failures == 0
+
+    asyncio.run(scenario())
+    assert down.calls == 4
+
+
+def test_failed_half_open_trial_reopens(router_env):
+    down = FakeProvider("down", failing=True)
+    router = ProviderRouter([down.provider()])
+    health = router.providers[0].health
+    for _ in range(3):
+        health.record_failure(0.1)
+    health.opened_at -= 31
+
+    async def scenario():
+        with pytest.raises(Exception):
+            await router.analyze("trial")
+
+    asyncio.run(scenario())
+    assert health.state == OPEN and not health.trial_in_flight
+
+
+def hedged_router(router_env, primary, secondary):
+    router_env.setenv("AI_HEDGE", "1")
+    router = ProviderRouter([primary.provider(), secondary.provider()])
+    for provider in router.providers:
+        provider.health.record_success(0.01)
+    return router
+
+
+def test_hedge_fires_after_deadline_and_backup_wins(router_env):
+    slow, backup = FakeProvider("slow", delay=0.5), FakeProvider("backup", delay=0.01)
+    router = hedged_router(router_env, slow, backup)
+
+    async def scenario():
+        start = time.monotonic()
+        result = await router.analyze("frame")
+        return result, time.monotonic() - start
+
+    (answer, name), elapsed = asyncio.run(scenario())
+    assert name == "backup" and elapsed < 0.4
+    assert router.hedged == 1 and router.hedge_wins == 1
+    assert slow.cancelled == 1
+    health = router.providers[0].health
+    # The loser ran past its p95, so the lower bound it reached is recorded
+    assert max(health.latencies) >= 0.05
+    assert not health.trial_in_flight
+
+
+def test_primary_answering_before_deadline_is_not_hedged(router_env):
+    primary, backup = FakeProvider("primary", delay=0.01), FakeProvider("backup")
+    router = hedged_router(router_env, primary, backup)
+    assert asyncio.run(router.analyze("frame")) == ("primary saw frame", "primary")
+    assert router.hedged == 0 and backup.calls == 0
+
+
+def test_hedge_loser_does_not_record_its_cut_short_latency(router_env):
+    primary, backup = FakeProvider("primary", delay=0.08), FakeProvider("backup", delay=0.5)
+    router = hedged_router(router_env, primary, backup)
+    backup_health = router.providers[1].health
+    for _ in range(5):
+        backup_health.record_success(0.5)
+    samples = list(backup_health.latencies)
+
+    assert asyncio.run(router.analyze("frame")) == ("primary saw frame", "primary")
+    assert router.hedged == 1 and router.hedge_wins == 0
+    assert backup.cancelled == 1
+    # Cancelled after ~0.03s of a 0.5s call: no sample that would make it look fast
+    assert list(backup_health.latencies) == samples
+
+
+def test_failed_primary_hedges_immediately(router_env):
+    broken, backup = FakeProvider("broken", failing=True), FakeProvider("backup", delay=0.01)
+    router = hedged_router(router_env, broken, backup)
+    assert asyncio.run(router.analyze("frame")) == ("backup saw frame", "backup")
+    assert router.hedged == 1 and router.hedge_wins == 1
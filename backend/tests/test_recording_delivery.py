@@ -0,0 +1,96 @@
+from email.utils import formatdate
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from recording_delivery import parse_range
+
+BODY = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "RECORDINGS_DIR", tmp_path)
+    (tmp_path / "clip_1.webm").write_bytes(BODY)
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=1000-", (1000, 1023)),
+    ("bytes=-24", (1000, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    ("bytes=10-5000", (10, 1023)),
+    ("bytes=5-1", None),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(BODY)) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, len(BODY))
+
+
+def test_full_and_partial_responses(client):
+    full = client.get("/recordings/clip_1.webm")
+    assert full.status_code == 200 and full.content == BODY
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["content-type"] == "video/webm"
+    assert full.headers["content-length"] == str(len(BODY))
+
+    part = client.get("/recordings/clip_1.webm", headers={"Range": "bytes=100-199"})
+    assert part.status_code == 206 and part.content == BODY[100:200]
+    assert part.headers["content-range"] == f"bytes 100-199/{len(BODY)}"
+    assert part.headers["content-length"] == "100"
+
+    tail = client.get("/recordings/clip_1.webm", headers={"Range": "bytes=-10"})
+    assert tail.status_code == 206 and tail.content == BODY[-10:]
+
+    head = client.head("/recordings/clip_1.webm", headers={"Range": "bytes=0-9"})
+    assert head.status_code == 206 and head.content == b"" and head.headers["content-length"] == "10"
+
+
+def test_unsatisfiable_range_is_416(client):
+    response = client.get("/recordings/clip_1.webm", headers={"Range": f"bytes={len(BODY)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(BODY)}"
+    assert response.content == b""
+
+
+def test_conditional_requests(client):
+    first = client.get("/recordings/clip_1.webm")
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+
+    assert client.get("/recordings/clip_1.webm", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/recordings/clip_1.webm", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get("/recordings/clip_1.webm", headers={"If-None-Match": '"other"'}).status_code == 200
+    not_modified = client.get("/recordings/clip_1.webm", headers={"If-Modified-Since": last_modified})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert client.get("/recordings/clip_1.webm", headers={"If-Modified-Since": formatdate(0, usegmt=True)}).status_code == 200
+
+
+def test_if_range_only_honours_current_copy(client):
+    etag = client.get("/recordings/clip_1.webm").headers["etag"]
+    current = client.get("/recordings/clip_1.webm", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert current.status_code == 206 and current.content == BODY[:10]
+    stale = client.get("/recordings/clip_1.webm", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert stale.status_code == 200 and stale.content == BODY
+
+
+def test_changed_file_gets_new_etag(client, tmp_path):
+    etag = client.get("/recordings/clip_1.webm").headers["etag"]
+    (tmp_path / "clip_1.webm").write_bytes(BODY + b"more")
+    response = client.get("/recordings/clip_1.webm", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag
+
+
+@pytest.mark.parametrize("filename", ["missing.webm", ".hidden", "..%2Fmain.py", "thumbnails"])
+def test_unknown_or_unsafe_paths_are_404(client, tmp_path, filename):
+    (tmp_path / "thumbnails").mkdir(exist_ok=True)
+    assert client.get(f"/recordings/{filename}").status_code == 404
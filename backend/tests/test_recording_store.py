@@ -0,0 +1,95 @@
+import asyncio
+import base64
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from recording_store import RecordingStore, decode_cursor, encode_cursor, paginate
+
+
+def record(stream_id, started_at, ended_at=None):
+    filename = f"{stream_id}_1.webm"
+    return {
+        "id": stream_id, "started_at": started_at, "ended_at": ended_at or started_at,
+        "latitude": 0.0, "longitude": 0.0, "notes": "", "duration_seconds": 1.0,
+        "video_filename": filename, "video_url": f"/recordings/{filename}",
+    }
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = RecordingStore(tmp_path / "recordings.db")
+    asyncio.run(store.start())
+    monkeypatch.setattr(main, "recording_store", store)
+    yield store
+    asyncio.run(store.close())
+
+
+def test_pages_follow_cursor_newest_first(store):
+    for i in range(5):
+        store.upsert(record(f"s{i}", f"2026-01-0{i + 1}T00:00:00"))
+    client = TestClient(main.app)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/past-streams", params=params).json()
+        seen.append([row["id"] for row in body["past_streams"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [["s4", "s3"], ["s2", "s1"], ["s0"]]
+
+    body = client.get("/past-streams", params={"since": "2026-01-02", "until": "2026-01-03T12:00:00"}).json()
+    assert [row["id"] for row in body["past_streams"]] == ["s2", "s1"]
+
+
+def test_list_sees_writes_queued_just_before(store):
+    client = TestClient(main.app)
+    store.upsert(record("fresh", "2026-02-01T00:00:00"))
+    assert [row["id"] for row in client.get("/past-streams").json()["past_streams"]] == ["fresh"]
+    store.delete(["fresh"])
+    assert client.get("/past-streams").json()["past_streams"] == []
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(b"5").decode(),
+    base64.urlsafe_b64encode(b"[1, 2, 3]").decode(),
+    base64.urlsafe_b64encode(b"[null, \"id\"]").decode(),
+])
+def test_invalid_cursor_is_400(store, cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+    response = TestClient(main.app).get("/past-streams", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_paginate_matches_store_order():
+    rows = [record("a", "2026-01-01"), record("c", "2026-01-02"), record("b", "2026-01-02")]
+    page, cursor = paginate(rows, limit=2)
+    assert [row["id"] for row in page] == ["c", "b"]
+    assert cursor == encode_cursor("2026-01-02", "b")
+    page, cursor = paginate(rows, cursor=cursor, limit=2)
+    assert [row["id"] for row in page] == ["a"] and cursor is None
+
+
+def test_flush_raises_when_queued_writes_failed(tmp_path):
+    async def scenario():
+        store = RecordingStore(tmp_path / "recordings.db")
+        await store.start()
+        bad = record("bad", "2026-01-01")
+        bad["started_at"] = None
+        store.upsert(bad)
+        with pytest.raises(Exception, match="NOT NULL"):
+            await store.flush()
+        # The failure is reported once; later writes land normally
+        store.upsert(record("good", "2026-01-01"))
+        await store.flush()
+        assert [row["id"] for row in await store.load_all()] == ["good"]
+        await store.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,37 @@
+import asyncio
+
+import main
+from stream_state import ACTIVE
+from wire import dumps
+
+
+def added(stream_id: str) -> dict:
+    stream = {"id": stream_id, "started_at": "2026-01-01T00:00:00", "latitude": 40.7, "longitude": -74.0, "notes": ""}
+    return {"type": "stream_added", "kind": ACTIVE, "stream": stream}
+
+
+def from_worker(worker_id: str, change: dict) -> dict:
+    return {"delta": dumps(change), "worker": worker_id}
+
+
+def test_streams_of_a_lost_worker_are_removed():
+    async def scenario():
+        await main.on_remote_stream_change(from_worker("w2", added("cam-a")))
+        await main.on_remote_stream_change(from_worker("w2", added("cam-b")))
+        await main.on_remote_stream_change(from_worker("w3", added("cam-c")))
+        # cam-b moved to w3 (its broadcaster reconnected there)
+        await main.on_remote_stream_change(from_worker("w3", added("cam-b")))
+        assert {"cam-a", "cam-b", "cam-c"} <= set(main.active_streams)
+
+        await main.on_worker_lost("w2")
+        assert "cam-a" not in main.active_streams
+        assert {"cam-b", "cam-c"} <= set(main.active_streams)
+        assert "cam-a" not in main.remote_stream_owners
+
+        await main.on_remote_stream_change(from_worker("w3", {"type": "stream_removed", "kind": ACTIVE, "ids": ["cam-b"]}))
+        assert "cam-b" not in main.remote_stream_owners
+        await main.on_worker_lost("w3")
+        assert not {"cam-b", "cam-c"} & set(main.active_streams)
+        assert main.remote_stream_owners == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import time
+
+import main
+from recording_store import RecordingStore
+from retention import RetentionJanitor
+
+
+def write_recording(directory, filename, age_seconds=0.0, size=10):
+    path = directory / filename
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def record(stream_id, filename, pinned=False):
+    return {
+        "id": stream_id, "started_at": "2026-01-01T00:00:00", "ended_at": "2026-01-01T00:01:00",
+        "latitude": 0.0, "longitude": 0.0, "notes": "", "duration_seconds": 60.0,
+        "video_filename": filename, "video_url": f"/recordings/{filename}", "pinned": pinned,
+    }
+
+
+class Evictions:
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, recordings):
+        self.batches.append([stream_id for stream_id, _, _ in recordings])
+
+
+def test_sweep_uses_shared_store_not_worker_view(tmp_path):
+    """A recording saved by another worker (absent from this worker's stream list) is not an orphan."""
+    async def scenario():
+        store = RecordingStore(tmp_path / "recordings.db")
+        await store.start()
+        recordings_dir = tmp_path / "recordings"
+        recordings_dir.mkdir()
+        write_recording(recordings_dir, "other-worker_1.webm", age_seconds=7200)
+        write_recording(recordings_dir, "orphan_1.webm", age_seconds=7200)
+        write_recording(recordings_dir, "young_1.webm", age_seconds=60)
+        # Written through another worker's store instance sharing the same database
+        other = RecordingStore(tmp_path / "recordings.db")
+        await other.start()
+        other.upsert(record("other-worker", "other-worker_1.webm"))
+        await other.flush()
+
+        async def stored():
+            return [(row["id"], row["video_filename"], row["pinned"]) for row in await store.load_all()]
+
+        evictions = Evictions()
+        janitor = RetentionJanitor(recordings_dir, stored, evictions)
+        result = await janitor.sweep()
+        assert result["orphans"] == ["orphan_1.webm"]
+        assert sorted(p.name for p in recordings_dir.iterdir()) == ["other-worker_1.webm", "young_1.webm"]
+        assert evictions.batches == []
+        await other.close()
+        await store.close()
+
+    asyncio.run(scenario())
+
+
+def test_sweep_evicts_by_age_and_quota_but_not_pinned(tmp_path, monkeypatch):
+    monkeypatch.setenv("RETENTION_MAX_AGE_DAYS", "1")
+    monkeypatch.setenv("RETENTION_MAX_GB", str(25 / 1024 ** 3))
+
+    async def scenario():
+        write_recording(tmp_path, "old_1.webm", age_seconds=3 * 86400)
+        write_recording(tmp_path, "pinned_1.webm", age_seconds=3 * 86400)
+        write_recording(tmp_path, "a_1.webm", age_seconds=300)
+        write_recording(tmp_path, "b_1.webm", age_seconds=200)
+        write_recording(tmp_path, "c_1.webm", age_seconds=100)
+        recordings = [
+            ("old", "old_1.webm", False), ("pinned", "pinned_1.webm", True),
+            ("a", "a_1.webm", False), ("b", "b_1.webm", False), ("c", "c_1.webm", False),
+            ("gone", "gone_1.webm", False),
+        ]
+
+        async def stored():
+            return recordings
+
+        evictions = Evictions()
+        result = await RetentionJanitor(tmp_path, stored, evictions).sweep()
+        assert result["expired"] == ["old"]
+        assert result["missing"] == ["gone"]
+        # 40 bytes left after the expired one; the oldest unpinned go until 25 fit
+        assert result["over_quota"] == ["a", "b"]
+        assert evictions.batches == [["gone"], ["old", "a", "b"]]
+
+    asyncio.run(scenario())
+
+
+def test_reconcile_leaves_young_unregistered_files(tmp_path):
+    async def scenario():
+        store = RecordingStore(tmp_path / "recordings.db")
+        await store.start()
+        write_recording(tmp_path, "old_1.webm", age_seconds=7200)
+        write_recording(tmp_path, "uploading_1.webm", age_seconds=5)
+        rows, added, removed = await store.reconcile(tmp_path, min_age_seconds=3600)
+        assert [row["id"] for row in rows] == ["old"] and (added, removed) == (1, 0)
+        await store.close()
+
+    asyncio.run(scenario())
+
+
+def test_evicting_unknown_recording_tells_other_workers(monkeypatch, tmp_path):
+    async def scenario():
+        published = []
+        monkeypatch.setattr(main.state_bus, "publish", lambda name, message: published.append((name, message)))
+        monkeypatch.setattr(main, "RECORDINGS_DIR", tmp_path)
+        write_recording(tmp_path, "elsewhere_1.webm")
+        await main.evict_recordings([("elsewhere", "elsewhere_1.webm", False)])
+        assert not (tmp_path / "elsewhere_1.webm").exists()
+        assert [name for name, _ in published] == ["streams"]
+        assert main.loads(published[0][1]["delta"])["ids"] == ["elsewhere"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_offers_and_answers_are_unicast_by_viewer_id():
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/broadcast/sig-1") as broadcaster:
+        broadcaster.send_json({"type": "start_stream", "latitude": 1.0, "longitude": 2.0})
+        assert broadcaster.receive_json() == {"type": "stream_started", "stream_id": "sig-1"}
+
+        with client.websocket_connect("/ws/view/sig-1") as first:
+            first_id = broadcaster.receive_json()["viewer_id"]
+            with client.websocket_connect("/ws/view/sig-1") as second:
+                second_id = broadcaster.receive_json()["viewer_id"]
+                assert first_id != second_id
+                assert set(main.viewers["sig-1"]) == {first_id, second_id}
+
+                broadcaster.send_json({"type": "offer", "sdp": "for-second", "viewer_id": second_id})
+                broadcaster.send_json({"type": "offer", "sdp": "for-first", "viewer_id": first_id})
+                # Each viewer's next message is its own offer, so neither got the other's
+                assert second.receive_json() == {"type": "offer", "sdp": "for-second", "stream_id": "sig-1"}
+                assert first.receive_json() == {"type": "offer", "sdp": "for-first", "stream_id": "sig-1"}
+
+                broadcaster.send_json({"type": "ice_candidate", "candidate": {"c": 1}, "viewer_id": first_id})
+                assert first.receive_json()["candidate"] == {"c": 1}
+
+                second.send_json({"type": "answer", "sdp": "answer-2"})
+                assert broadcaster.receive_json() == {"type": "answer", "sdp": "answer-2", "viewer_id": second_id}
+                first.send_json({"type": "ice_candidate", "candidate": {"c": 2}})
+                assert broadcaster.receive_json() == {"type": "ice_candidate", "candidate": {"c": 2}, "viewer_id": first_id}
+
+                # Broadcasters that don't name a viewer still reach all of them
+                broadcaster.send_json({"type": "offer", "sdp": "legacy"})
+                assert first.receive_json()["sdp"] == "legacy"
+                assert second.receive_json()["sdp"] == "legacy"
+
+                broadcaster.send_json({"type": "stop_stream"})
+                assert first.receive_json()["type"] == "stream_ended"
+                assert second.receive_json()["type"] == "stream_ended"
+    assert "sig-1" not in main.viewers and "sig-1" not in main.broadcasters
+
+
+def test_viewer_of_unknown_stream_gets_error():
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/view/missing") as viewer:
+        assert viewer.receive_json() == {"type": "error", "message": "Stream not found"}
@@ -0,0 +1,108 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from spatial import GridIndex, check_point, parse_bbox, parse_point
+
+client = TestClient(main.app)
+
+
+@pytest.mark.parametrize("value", [
+    "nan,0,1,1",
+    "0,0,inf,1",
+    "0,0,1e308,1e308",
+    "-181,0,1,1",
+    "0,-91,1,1",
+    "1,0,0,1",
+    "0,0,1",
+])
+def test_parse_bbox_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_bbox(value)
+
+
+@pytest.mark.parametrize("value", ["inf,0", "nan,nan", "0,-inf", "91,0", "0,181", "1"])
+def test_parse_point_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_point(value)
+
+
+def test_parse_accepts_edges():
+    assert parse_bbox("-180,-90,180,90") == (-180.0, -90.0, 180.0, 90.0)
+    assert parse_point("90,-180") == (90.0, -180.0)
+
+
+@pytest.mark.parametrize("path", ["/streams", "/past-streams"])
+@pytest.mark.parametrize("query", [
+    "bbox=nan,0,1,1",
+    "bbox=0,0,1e308,1e308",
+    "near=inf,0",
+    "near=nan,nan",
+    "near=95,0",
+])
+def test_invalid_location_filters_are_400(path, query):
+    response = client.get(f"{path}?{query}")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("query", ["lat=nan&lng=0", "lat=0&lng=inf", "lat=91&lng=0", "lat=0&lng=-200"])
+def test_nearby_rejects_invalid_point(query):
+    assert client.get(f"/streams/nearby?{query}").status_code == 400
+
+
+def test_huge_radius_is_clamped():
+    index = GridIndex(0.05)
+    index.put("a", 40.7, -74.0)
+    index.put("b", -33.9, 151.2)
+    assert {item for item, _ in index.near(0, 0, 1e308)} == {"a", "b"}
+    assert client.get("/streams?near=0,0&radius=1e308").status_code == 200
+    assert client.get("/streams/nearby?lat=0&lng=0&radius=inf").status_code == 200
+
+
+def test_valid_filters_still_work():
+    assert client.get("/streams?bbox=-74.1,40.6,-73.8,40.9").json() == {"streams": []}
+    assert client.get("/streams?near=40.7,-74.0&radius=500").status_code == 200
+
+
+@pytest.mark.parametrize("lat,lng", [(None, 0), ("1", 2), (True, 0), (0, [1])])
+def test_check_point_rejects_non_numbers(lat, lng):
+    with pytest.raises(ValueError, match="numbers"):
+        check_point(lat, lng)
+
+
+def test_invalid_socket_coordinates_get_error_and_socket_survives():
+    with client.websocket_connect("/ws/broadcast/geo-1") as broadcaster:
+        for latitude in (None, "north", 91):
+            broadcaster.send_json({"type": "start_stream", "latitude": latitude, "longitude": 0})
+            reply = broadcaster.receive_json()
+            assert reply["type"] == "error" and "Invalid start_stream" in reply["message"]
+        assert "geo-1" not in main.active_streams
+
+        broadcaster.send_json({"type": "start_stream", "latitude": 1.0, "longitude": 2.0})
+        assert broadcaster.receive_json()["type"] == "stream_started"
+        broadcaster.send_json({"type": "update_location", "latitude": "x", "longitude": 2.0})
+        assert "Invalid update_location" in broadcaster.receive_json()["message"]
+        broadcaster.send_json({"type": "update_location", "latitude": 1.5, "longitude": 2.0})
+        # Answered only after the valid update before it was handled
+        broadcaster.send_json({"type": "update_location", "latitude": 0, "longitude": 500})
+        assert "longitude" in broadcaster.receive_json()["message"]
+        assert main.location_ticker.position("geo-1") == (1.5, 2.0)
+        broadcaster.send_json({"type": "stop_stream"})
+
+
+def test_frame_socket_rejects_invalid_location(monkeypatch):
+    monkeypatch.setattr(main, "OPENROUTER_API_KEY", "test-key")
+    with client.websocket_connect("/ws/frames/geo-2") as frames:
+        frames.send_json({"type": "location", "latitude": None, "longitude": 0})
+        while True:
+            reply = frames.receive_json()
+            if reply["type"] != "rate":
+                break
+        assert reply["type"] == "error" and "seq" not in reply
+        assert "Invalid location" in reply["message"]
+
+
+@pytest.mark.parametrize("latitude", ["nan", "inf", "95"])
+def test_upload_with_invalid_coordinates_is_400(latitude):
+    response = client.post("/uploads", data={"stream_id": "s", "started_at": "2026-01-01", "latitude": latitude})
+    assert response.status_code == 400
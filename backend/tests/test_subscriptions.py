@@ -0,0 +1,74 @@
+import math
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from subscriptions import Subscription, _parse_region
+
+
+@pytest.mark.parametrize("region", [
+    [0, 0, 1e308, 1e308],
+    [0, math.nan, 1, 1],
+    [-181, 0, 0, 1],
+    [0, -91, 1, 1],
+    [1, 0, 0, 1],
+    [0, 0, "1", 1],
+    [0, 0, None, 1],
+    [0, 0, 1],
+    "0,0,1e308,1e308",
+    "0,nan,1,1",
+    "0,0,1,inf",
+    3,
+])
+def test_parse_region_rejects_invalid(region):
+    with pytest.raises(ValueError):
+        _parse_region(region)
+
+
+def test_parse_region_accepts_valid():
+    assert _parse_region([-180, -90, 180, 90]) == (-180.0, -90.0, 180.0, 90.0)
+    assert _parse_region("1.5,2,3,4") == (1.5, 2.0, 3.0, 4.0)
+    assert Subscription().subscribe({"region": [0, 0, 1, 1]}).region == (0.0, 0.0, 1.0, 1.0)
+
+
+def test_invalid_region_gets_error_and_socket_stays_usable():
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/dashboard") as ws:
+        assert ws.receive_json()["type"] != "error"
+        for region in ([0, 0, 1e308, 1e308], [0, 0, "nan", 1], "0,nan,1,1"):
+            ws.send_json({"type": "subscribe", "region": region})
+            reply = ws.receive_json()
+            assert reply["type"] == "error", reply
+            assert "Invalid subscribe" in reply["message"]
+        assert not main.dashboard_subscriptions.subscriptions
+        ws.send_json({"type": "subscribe", "region": [0, 0, 1, 1]})
+        assert ws.receive_json()["type"] != "error"
+        assert len(main.dashboard_subscriptions.subscriptions) == 1
+    assert not main.dashboard_subscriptions.subscriptions
+
+
+def test_deltas_are_routed_without_reparsing(monkeypatch):
+    def no_parse(_):
+        raise AssertionError("delta parsed again for routing")
+
+    monkeypatch.setattr(main, "loads", no_parse)
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/dashboard") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "subscribe", "region": [10, 10, 11, 11]})
+        assert ws.receive_json()["type"] == "stream_list"
+        with client.websocket_connect("/ws/broadcast/route-out") as outside:
+            outside.send_json({"type": "start_stream", "latitude": 0, "longitude": 0})
+            outside.receive_json()
+            with client.websocket_connect("/ws/broadcast/route-in") as inside:
+                inside.send_json({"type": "start_stream", "latitude": 10.5, "longitude": 10.5})
+                inside.receive_json()
+                added = ws.receive_json()
+                # The stream outside the region was never sent
+                assert added["type"] == "stream_added" and added["stream"]["id"] == "route-in"
+                inside.send_json({"type": "stop_stream"})
+                removed = ws.receive_json()
+                assert removed["type"] == "stream_removed" and removed["ids"] == ["route-in"]
+            outside.send_json({"type": "stop_stream"})
+
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import uploads
+from uploads import ChunkedUploads
+
+
+async def body(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def start(store):
+    return store.init("s1", "2024-01-01T00:00:00", 0.0, 0.0, "")
+
+
+def test_append_finalize_and_offset_mismatch(tmp_path):
+    store = ChunkedUploads(tmp_path / "partial")
+    destination = tmp_path / "done.webm"
+
+    async def scenario():
+        session = await start(store)
+        await store.append(session.upload_id, 0, body(b"abc", b"def"))
+        with pytest.raises(HTTPException) as e:
+            await store.append(session.upload_id, 2, body(b"x"))
+        assert e.value.status_code == 409 and e.value.detail["offset"] == 6
+        await store.finalize(session.upload_id, destination)
+        with pytest.raises(HTTPException) as e:
+            store.get(session.upload_id)
+        assert e.value.status_code == 404
+
+    asyncio.run(scenario())
+    assert destination.read_bytes() == b"abcdef"
+    assert list((tmp_path / "partial").iterdir()) == []
+
+
+@pytest.mark.parametrize("first,second", [("finalize", "abort"), ("abort", "finalize"), ("abort", "append")])
+def test_racing_requests_on_one_upload_get_404(tmp_path, first, second):
+    store = ChunkedUploads(tmp_path / "partial")
+    destination = tmp_path / "done.webm"
+
+    def call(name, upload_id):
+        if name == "finalize":
+            return store.finalize(upload_id, destination)
+        if name == "append":
+            return store.append(upload_id, 0, body(b"late"))
+        return store.abort(upload_id)
+
+    async def scenario():
+        session = await start(store)
+        # Both requests found the session before either took its lock
+        return await asyncio.gather(call(first, session.upload_id), call(second, session.upload_id), return_exceptions=True)
+
+    winner, loser = asyncio.run(scenario())
+    assert not isinstance(winner, Exception)
+    assert isinstance(loser, HTTPException) and loser.status_code == 404
+    assert list((tmp_path / "partial").iterdir()) == []
+    assert destination.exists() == (first == "finalize")
+
+
+def test_expire_drops_idle_sessions_and_stale_partial_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "SESSION_TTL_SECONDS", 60)
+    staging = tmp_path / "partial"
+    staging.mkdir()
+    # Left behind by a previous run, and one another worker is still writing
+    stale = staging / "old.part"
+    stale.write_bytes(b"x")
+    os.utime(stale, (time.time() - 120, time.time() - 120))
+    fresh = staging / "other-worker.part"
+    fresh.write_bytes(b"x")
+    store = ChunkedUploads(staging)
+
+    async def scenario():
+        idle = await start(store)
+        active = await start(store)
+        idle.updated_at -= 120
+        await store.expire()
+        return idle, active
+
+    idle, active = asyncio.run(scenario())
+    assert set(store.sessions) == {active.upload_id}
+    assert sorted(p.name for p in staging.iterdir()) == sorted([fresh.name, active.path.name])
+    assert store.stats() == {"sessions": 1, "expired": 1, "orphans_deleted": 1}
+
+
+def test_sweep_runs_on_start(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "SESSION_TTL_SECONDS", 60)
+    staging = tmp_path / "partial"
+    staging.mkdir()
+    stale = staging / "old.part"
+    stale.write_bytes(b"x")
+    os.utime(stale, (time.time() - 120, time.time() - 120))
+    store = ChunkedUploads(staging)
+
+    async def scenario():
+        store.start()
+        for _ in range(100):
+            if not stale.exists():
+                break
+            await asyncio.sleep(0.01)
+        await store.stop()
+
+    asyncio.run(scenario())
+    assert not stale.exists()
@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import wire
+from wire import JSON, MSGPACK, Outbound, Peer
+
+msgpack = pytest.importorskip("msgpack")
+
+
+class FakeWebSocket:
+    def __init__(self, subprotocols=(), query=None):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.query_params = query or {}
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        self.sent.append(msgpack.unpackb(data))
+
+
+@pytest.mark.parametrize("subprotocols,query,expected", [
+    ((), {}, (JSON, None)),
+    (("alertstream.msgpack",), {}, (MSGPACK, "alertstream.msgpack")),
+    (("other", "alertstream.json"), {"format": "msgpack"}, (JSON, "alertstream.json")),
+    ((), {"format": "msgpack"}, (MSGPACK, None)),
+    ((), {"format": "xml"}, (JSON, None)),
+])
+def test_negotiate(subprotocols, query, expected):
+    assert wire.negotiate(FakeWebSocket(subprotocols, query)) == expected
+
+
+def test_negotiate_falls_back_to_json_without_msgpack(monkeypatch):
+    monkeypatch.setattr(wire, "msgpack", None)
+    assert wire.negotiate(FakeWebSocket(("alertstream.msgpack",), {"format": "msgpack"})) == (JSON, None)
+
+
+def test_outbound_is_encoded_once_per_format(monkeypatch):
+    message = Outbound('{"type":"stream_added","seq":3}')
+    packed = message.encode(MSGPACK)
+    assert msgpack.unpackb(packed) == {"type": "stream_added", "seq": 3}
+    monkeypatch.setattr(wire.msgpack, "packb", lambda _: pytest.fail("encoded twice"))
+    assert message.encode(MSGPACK) is packed
+    assert message.encode(JSON) == '{"type":"stream_added","seq":3}'
+    assert json.loads(Outbound({"a": [1, 2]}).encode(JSON)) == {"a": [1, 2]}
+
+
+def test_dashboard_speaks_msgpack_when_asked():
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/dashboard", subprotocols=["alertstream.msgpack"]) as ws:
+        assert ws.accepted_subprotocol == "alertstream.msgpack"
+        snapshot = msgpack.unpackb(ws.receive_bytes())
+        assert snapshot["type"] == "stream_list"
+        # Clients may still send JSON text
+        ws.send_json({"type": "resync"})
+        assert msgpack.unpackb(ws.receive_bytes())["type"] == "stream_list"
+    with client.websocket_connect("/ws/dashboard?format=msgpack") as ws:
+        assert msgpack.unpackb(ws.receive_bytes())["type"] == "stream_list"
+    with client.websocket_connect("/ws/dashboard") as ws:
+        assert ws.receive_json()["type"] == "stream_list"
+
+
+def candidate(n, viewer_id="v1"):
+    return {"type": "ice_candidate", "candidate": {"n": n}, "stream_id": "s1", "viewer_id": viewer_id}
+
+
+def test_ice_candidates_are_batched_per_viewer(monkeypatch):
+    monkeypatch.setattr(wire, "ICE_BATCH_SECONDS", 0.01)
+    ws = FakeWebSocket(query={"ice_batch": "1"})
+
+    async def scenario():
+        peer = Peer(ws, MSGPACK)
+        for n in range(3):
+            await peer.send_ice(candidate(n))
+        await peer.send_ice(candidate(9, viewer_id="v2"))
+        assert ws.sent == []
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert ws.sent == [
+        {"type": "ice_candidates", "candidates": [{"n": 0}, {"n": 1}, {"n": 2}], "stream_id": "s1", "viewer_id": "v1"},
+        candidate(9, viewer_id="v2"),
+    ]
+
+
+def test_other_messages_flush_queued_candidates_first(monkeypatch):
+    monkeypatch.setattr(wire, "ICE_BATCH_SECONDS", 10)
+    ws = FakeWebSocket(query={"ice_batch": "true"})
+
+    async def scenario():
+        peer = Peer(ws, JSON)
+        await peer.send_ice(candidate(0))
+        await peer.send_ice(candidate(1))
+        await peer.send({"type": "offer", "sdp": "x"})
+        assert peer.flush_task is None
+
+    asyncio.run(scenario())
+    assert [m["type"] for m in ws.sent] == ["ice_candidates", "offer"]
+
+
+def test_candidates_are_sent_at_once_without_opt_in():
+    ws = FakeWebSocket()
+
+    async def scenario():
+        peer = Peer(ws, JSON)
+        await peer.send_ice(candidate(0))
+        await peer.send_ice(candidate(1))
+
+    asyncio.run(scenario())
+    assert ws.sent == [candidate(0), candidate(1)]
+
+
+def test_viewer_receives_batched_candidates_over_socket(monkeypatch):
+    # Long enough that all three candidates land in one batch
+    monkeypatch.setattr(wire, "ICE_BATCH_SECONDS", 0.2)
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/broadcast/wire-1") as broadcaster:
+        broadcaster.send_json({"type": "start_stream", "latitude": 0, "longitude": 0})
+        broadcaster.receive_json()
+        with client.websocket_connect("/ws/view/wire-1?ice_batch=1") as viewer:
+            viewer_id = broadcaster.receive_json()["viewer_id"]
+            for n in range(3):
+                broadcaster.send_json({"type": "ice_candidate", "candidate": {"n": n}, "viewer_id": viewer_id})
+            batch = viewer.receive_json()
+            assert batch["type"] == "ice_candidates"
+            assert batch["candidates"] == [{"n": 0}, {"n": 1}, {"n": 2}]
+            broadcaster.send_json({"type": "stop_stream"})
+            assert viewer.receive_json()["type"] == "stream_ended"
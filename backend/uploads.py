@@ -0,0 +1,215 @@
+"""
+Recording uploads streamed to disk.
+Single-request uploads are copied in fixed-size chunks with file I/O off the
+event loop. Resumable uploads (init, append at offset, finalize) let
+broadcasters on flaky links send a recording in segments while they record.
+"""
+
+from fastapi import HTTPException, UploadFile
+from typing import AsyncIterator, BinaryIO, Dict, Optional
+from dataclasses import dataclass, field
+from pathlib import Path
+import asyncio
+import os
+import time
+import uuid
+
+from logs import get_logger
+
+logger = get_logger("Recordings")
+
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+SESSION_TTL_SECONDS = float(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+SWEEP_INTERVAL_SECONDS = float(os.getenv("UPLOAD_SWEEP_INTERVAL_SECONDS", "600"))
+PART_SUFFIX = ".part"
+
+
+async def _write_chunks(path: Path, chunks: AsyncIterator[bytes], mode: str = "wb") -> int:
+    """Write an async stream of bytes to disk in CHUNK_SIZE blocks without blocking the loop."""
+    f: BinaryIO = await asyncio.to_thread(open, path, mode)
+    written = 0
+    buffer = bytearray()
+    try:
+        async for chunk in chunks:
+            buffer += chunk
+            if len(buffer) >= CHUNK_SIZE:
+                await asyncio.to_thread(f.write, bytes(buffer))
+                written += len(buffer)
+                buffer.clear()
+        if buffer:
+            await asyncio.to_thread(f.write, bytes(buffer))
+            written += len(buffer)
+    finally:
+        await asyncio.to_thread(f.close)
+    return written
+
+
+async def _read_upload(upload: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def save_upload(upload: UploadFile, path: Path) -> int:
+    """Stream a multipart upload to disk. Returns the number of bytes written."""
+    return await _write_chunks(path, _read_upload(upload))
+
+
+@dataclass
+class UploadSession:
+    upload_id: str
+    stream_id: str
+    started_at: str
+    latitude: float
+    longitude: float
+    notes: str
+    path: Path
+    offset: int = 0
+    updated_at: float = field(default_factory=time.time)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def info(self) -> dict:
+        return {"upload_id": self.upload_id, "stream_id": self.stream_id, "offset": self.offset, "chunk_size": CHUNK_SIZE}
+
+
+class ChunkedUploads:
+    """In-progress resumable uploads, stored as partial files in a staging directory.
+
+    Sessions live in the worker that started them. Partial files nobody has
+    written to within the TTL (abandoned, or left by a previous run) are
+    deleted by a periodic sweep.
+    """
+
+    def __init__(self, staging_dir: Path):
+        self.staging_dir = staging_dir
+        self.staging_dir.mkdir(exist_ok=True)
+        self.sessions: Dict[str, UploadSession] = {}
+        self.interval = SWEEP_INTERVAL_SECONDS
+        self.task: Optional[asyncio.Task] = None
+        self.expired = 0
+        self.orphans_deleted = 0
+
+    def get(self, upload_id: str) -> UploadSession:
+        session = self.sessions.get(upload_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        return session
+
+    def _check_current(self, session: UploadSession):
+        """Reject a request whose session was finalized, aborted or expired while it waited for the lock."""
+        if self.sessions.get(session.upload_id) is not session:
+            raise HTTPException(status_code=404, detail="Upload not found")
+
+    async def init(self, stream_id: str, started_at: str, latitude: float, longitude: float, notes: str) -> UploadSession:
+        await self.expire()
+        upload_id = uuid.uuid4().hex
+        session = UploadSession(
+            upload_id=upload_id,
+            stream_id=stream_id,
+            started_at=started_at,
+            latitude=latitude,
+            longitude=longitude,
+            notes=notes,
+            path=self.staging_dir / f"{upload_id}{PART_SUFFIX}",
+        )
+        await asyncio.to_thread(session.path.touch)
+        self.sessions[upload_id] = session
+        return session
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> UploadSession:
+        """Append bytes at offset. A mismatched offset is rejected with the current one."""
+        session = self.get(upload_id)
+        async with session.lock:
+            self._check_current(session)
+            if offset != session.offset:
+                raise HTTPException(
+                    status_code=409,
+                    detail={"error": "Offset mismatch", "offset": session.offset},
+                )
+            try:
+                session.offset += await _write_chunks(session.path, chunks, mode="ab")
+            except Exception:
+                # Drop any partially written tail so the client can retry from the known offset
+                await asyncio.to_thread(os.truncate, session.path, session.offset)
+                raise
+            session.updated_at = time.time()
+        return session
+
+    async def finalize(self, upload_id: str, destination: Path) -> UploadSession:
+        """Move the completed file into place and forget the session."""
+        session = self.get(upload_id)
+        async with session.lock:
+            self._check_current(session)
+            await asyncio.to_thread(os.replace, session.path, destination)
+            self.sessions.pop(upload_id, None)
+        return session
+
+    async def abort(self, upload_id: str):
+        session = self.get(upload_id)
+        async with session.lock:
+            self._check_current(session)
+            self.sessions.pop(upload_id, None)
+            await asyncio.to_thread(session.path.unlink, True)
+
+    def _delete_orphans(self, tracked: set, now: float) -> int:
+        deleted = 0
+        for path in self.staging_dir.glob(f"*{PART_SUFFIX}"):
+            try:
+                # Other workers' sessions keep their files fresh by appending to them
+                if path.name in tracked or now - path.stat().st_mtime <= SESSION_TTL_SECONDS:
+                    continue
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            deleted += 1
+        return deleted
+
+    async def expire(self, now: Optional[float] = None):
+        """Discard sessions that have not received data within the TTL, and partial files no session owns."""
+        now = now if now is not None else time.time()
+        for session in list(self.sessions.values()):
+            if now - session.updated_at > SESSION_TTL_SECONDS and not session.lock.locked():
+                async with session.lock:
+                    if self.sessions.get(session.upload_id) is not session:
+                        continue
+                    self.sessions.pop(session.upload_id, None)
+                    await asyncio.to_thread(session.path.unlink, True)
+                self.expired += 1
+        tracked = {session.path.name for session in self.sessions.values()}
+        deleted = await asyncio.to_thread(self._delete_orphans, tracked, now)
+        if deleted:
+            logger.info("Deleted %d abandoned partial uploads", deleted)
+        self.orphans_deleted += deleted
+
+    async def _run(self):
+        while True:
+            try:
+                await self.expire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Upload sweep failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Sweep now (clearing files left by a previous run) and then every interval."""
+        if self.task is None and self.interval > 0:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "expired": self.expired,
+            "orphans_deleted": self.orphans_deleted,
+        }
@@ -0,0 +1,196 @@
+"""
+WebSocket wire formats.
+JSON text frames are the default. A client can ask for MessagePack binary
+frames by offering the "alertstream.msgpack" subprotocol (or with
+?format=msgpack). JSON is encoded with orjson when it is installed.
+Outbound messages are wrapped in an Outbound, so each one is serialized once
+per format however many sockets receive it. Clients that connect with
+?ice_batch=1 get trickle ICE candidates arriving within ICE_BATCH_MS of each
+other as a single "ice_candidates" message.
+"""
+
+from fastapi import WebSocket, WebSocketDisconnect
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import json
+import os
+
+from logs import get_logger
+
+logger = get_logger("Wire")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+SUBPROTOCOLS = {"alertstream.json": JSON, "alertstream.msgpack": MSGPACK}
+
+ICE_BATCH_SECONDS = float(os.getenv("ICE_BATCH_MS", "10")) / 1000
+
+# Process-wide counters reported by stats()
+counts = {"ice_batches": 0, "ice_candidates_batched": 0}
+
+
+def dumps(obj: Any) -> str:
+    """Compact JSON text."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def available(fmt: str) -> bool:
+    return fmt == JSON or (fmt == MSGPACK and msgpack is not None)
+
+
+class Outbound:
+    """A message (dict, or JSON text already serialized) encoded lazily, once per format."""
+
+    __slots__ = ("message", "encoded")
+
+    def __init__(self, message: Union[dict, str]):
+        self.message = message
+        self.encoded: Dict[str, Union[str, bytes]] = {}
+        if isinstance(message, str):
+            self.encoded[JSON] = message
+
+    def encode(self, fmt: str) -> Union[str, bytes]:
+        data = self.encoded.get(fmt)
+        if data is None:
+            if fmt == MSGPACK:
+                message = loads(self.message) if isinstance(self.message, str) else self.message
+                data = msgpack.packb(message)
+            else:
+                data = dumps(self.message)
+            self.encoded[fmt] = data
+        return data
+
+
+def negotiate(websocket: WebSocket) -> Tuple[str, Optional[str]]:
+    """Pick the wire format for a connection. Returns (format, subprotocol to accept with)."""
+    for subprotocol in websocket.scope.get("subprotocols") or []:
+        fmt = SUBPROTOCOLS.get(subprotocol)
+        if fmt is not None and available(fmt):
+            return fmt, subprotocol
+    fmt = websocket.query_params.get("format", JSON)
+    return (fmt if available(fmt) else JSON), None
+
+
+async def accept(websocket: WebSocket) -> str:
+    """Accept a WebSocket with the negotiated wire format and return the format."""
+    fmt, subprotocol = negotiate(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    return fmt
+
+
+async def send(websocket: WebSocket, fmt: str, message: Union[dict, Outbound]):
+    if not isinstance(message, Outbound):
+        message = Outbound(message)
+    data = message.encode(fmt)
+    if isinstance(data, bytes):
+        await websocket.send_bytes(data)
+    else:
+        await websocket.send_text(data)
+
+
+async def receive(websocket: WebSocket, fmt: str) -> Any:
+    """Next decoded message. Clients may always send JSON text, whatever format they receive."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("text") is not None:
+        return loads(message["text"])
+    data = message.get("bytes") or b""
+    return msgpack.unpackb(data) if fmt == MSGPACK else loads(data)
+
+
+class Peer:
+    """A signaling WebSocket with its wire format and optional ICE batching."""
+
+    def __init__(self, websocket: WebSocket, fmt: str):
+        self.websocket = websocket
+        self.format = fmt
+        self.ice_batch = ICE_BATCH_SECONDS > 0 and websocket.query_params.get("ice_batch") in ("1", "true")
+        # viewer_id (or None) -> queued ice_candidate messages
+        self.pending_ice: Dict[Optional[str], List[dict]] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+        # Called when a batched send fails outside any caller (e.g. to drop the dead connection)
+        self.on_send_failed: Optional[Callable[[], Awaitable]] = None
+
+    @classmethod
+    async def accept(cls, websocket: WebSocket) -> "Peer":
+        return cls(websocket, await accept(websocket))
+
+    async def receive(self) -> Any:
+        return await receive(self.websocket, self.format)
+
+    async def send(self, message: Union[dict, Outbound]):
+        """Send a message, after any ICE candidates queued before it."""
+        if self.pending_ice:
+            await self.flush_ice()
+        await send(self.websocket, self.format, message)
+
+    async def send_ice(self, message: dict):
+        """Send an ice_candidate message, batching it with others that follow closely."""
+        if not self.ice_batch:
+            await send(self.websocket, self.format, message)
+            return
+        self.pending_ice.setdefault(message.get("viewer_id"), []).append(message)
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(ICE_BATCH_SECONDS)
+        self.flush_task = None
+        try:
+            await self.flush_ice()
+        except Exception as e:
+            logger.debug("ICE batch send failed: %r", e)
+            if self.on_send_failed is not None:
+                await self.on_send_failed()
+
+    def _cancel_flush(self):
+        if self.flush_task is not None and self.flush_task is not asyncio.current_task():
+            self.flush_task.cancel()
+        self.flush_task = None
+
+    async def flush_ice(self):
+        self._cancel_flush()
+        pending, self.pending_ice = self.pending_ice, {}
+        for messages in pending.values():
+            if len(messages) == 1:
+                await send(self.websocket, self.format, messages[0])
+                continue
+            batch = {key: value for key, value in messages[0].items() if key not in ("type", "candidate")}
+            batch["type"] = "ice_candidates"
+            batch["candidates"] = [m["candidate"] for m in messages]
+            counts["ice_batches"] += 1
+            counts["ice_candidates_batched"] += len(messages)
+            await send(self.websocket, self.format, batch)
+
+    def close(self):
+        """Drop queued candidates once the socket is gone."""
+        self._cancel_flush()
+        self.pending_ice = {}
+
+
+def stats() -> dict:
+    return {
+        "json_encoder": "orjson" if orjson is not None else "json",
+        "msgpack": msgpack is not None,
+        "ice_batch_ms": ICE_BATCH_SECONDS * 1000,
+        **counts,
+    }
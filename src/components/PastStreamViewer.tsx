@@ -1,4 +1,4 @@
-import { X, Clock, MapPin, FileText, Play, Calendar, Download, Trash2 } from "lucide-react";
+import { X, Clock, MapPin, FileText, Play, Calendar, Download, Trash2, Pin, PinOff } from "lucide-react";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
 import { Button } from "@/components/ui/button";
@@ -9,10 +9,12 @@ interface PastStreamViewerProps {
   stream: PastStreamInfo;
   onClose: () => void;
   onDelete: () => void;
+  onTogglePin?: () => void;
 }
 
-export function PastStreamViewer({ stream, onClose, onDelete }: PastStreamViewerProps) {
+export function PastStreamViewer({ stream, onClose, onDelete, onTogglePin }: PastStreamViewerProps) {
   const videoUrl = `${signalingConfig.httpBase}${stream.video_url}`;
+  const posterUrl = stream.thumbnail_url ? `${signalingConfig.httpBase}${stream.thumbnail_url}` : undefined;
 
   const formatDuration = (seconds: number) => {
     if (!seconds || isNaN(seconds)) return "00:00";
@@ -64,6 +66,17 @@ export function PastStreamViewer({ stream, onClose, onDelete }: PastStreamViewer
               <Download className="h-4 w-4" />
               Download
             </Button>
+            {onTogglePin && (
+              <Button 
+                variant="ghost" 
+                size="sm"
+                onClick={onTogglePin}
+                className="text-[hsl(190,100%,50%)] hover:text-[hsl(190,100%,60%)] hover:bg-[hsl(190,100%,50%)]/10 gap-2"
+              >
+                {stream.pinned ? <PinOff className="h-4 w-4" /> : <Pin className="h-4 w-4" />}
+                {stream.pinned ? "Unpin" : "Pin"}
+              </Button>
+            )}
             <Button 
               variant="ghost" 
               size="sm"
@@ -111,6 +124,8 @@ export function PastStreamViewer({ stream, onClose, onDelete }: PastStreamViewer
                   <div className="relative w-full bg-black" style={{ paddingTop: "56.25%" }}>
                     <video
                       src={videoUrl}
+                      poster={posterUrl}
+                      preload="metadata"
                       controls
                       className="absolute inset-0 h-full w-full object-cover"
                     />
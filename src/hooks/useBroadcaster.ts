@@ -49,6 +49,9 @@ export function useBroadcaster({
   const frameAnalysisIntervalRef = useRef<NodeJS.Timeout | null>(null);
   const videoElementRef = useRef<HTMLVideoElement | null>(null);
   const isBroadcastingRef = useRef(false);
+  // Frame-ingest socket; the server tells us how often to sample through it
+  const frameWsRef = useRef<WebSocket | null>(null);
+  const frameIntervalMsRef = useRef(5000);
 
   // Keep refs updated
   useEffect(() => {
@@ -57,6 +60,17 @@ export function useBroadcaster({
     notesRef.current = notes;
   }, [latitude, longitude, notes]);
 
+  const logAnalysisResult = (result: { status?: string; threat_detected?: boolean; analysis?: string }) => {
+    if (result.status === 'superseded') {
+      // A newer frame from this stream replaced it before analysis
+      console.log('[AI Sentry] Frame superseded by a newer one');
+    } else if (result.threat_detected) {
+      console.log('[AI Sentry] ⚠️ Threat detected:', result.analysis);
+    } else {
+      console.log('[AI Sentry] ✓ No threat detected');
+    }
+  };
+
   const captureAndAnalyzeFrame = useCallback(async () => {
     if (!mediaStream || !isBroadcastingRef.current) {
       console.log('[AI Sentry] Skipping - no stream or not broadcasting');
@@ -69,10 +83,10 @@ export function useBroadcaster({
         videoElementRef.current = document.createElement('video');
         videoElementRef.current.srcObject = mediaStream;
         await videoElementRef.current.play();
-      }
 
-      // Wait a bit for video to be ready
-      await new Promise(resolve => setTimeout(resolve, 200));
+        // Wait a bit for video to be ready
+        await new Promise(resolve => setTimeout(resolve, 200));
+      }
 
       const video = videoElementRef.current;
       if (!video.videoWidth || !video.videoHeight) {
@@ -99,6 +113,13 @@ export function useBroadcaster({
         return;
       }
 
+      // Results come back on the frame socket when it is open
+      if (frameWsRef.current?.readyState === WebSocket.OPEN) {
+        console.log('[AI Sentry] Streaming frame for analysis...', blob.size, 'bytes');
+        frameWsRef.current.send(blob);
+        return;
+      }
+
       console.log('[AI Sentry] Sending frame for analysis...', blob.size, 'bytes');
 
       // Send to backend for analysis
@@ -114,12 +135,7 @@ export function useBroadcaster({
       });
 
       if (response.ok) {
-        const result = await response.json();
-        if (result.threat_detected) {
-          console.log('[AI Sentry] ⚠️ Threat detected:', result.analysis);
-        } else {
-          console.log('[AI Sentry] ✓ No threat detected');
-        }
+        logAnalysisResult(await response.json());
       } else {
         console.error('[AI Sentry] Server error:', response.status, await response.text());
       }
@@ -128,22 +144,81 @@ export function useBroadcaster({
     }
   }, [mediaStream, streamId]);
 
-  const startFrameAnalysis = useCallback(() => {
-    // Analyze frame once at 5 second mark
+  const scheduleFrameAnalysis = useCallback((delayMs: number) => {
     if (frameAnalysisIntervalRef.current) {
       clearTimeout(frameAnalysisIntervalRef.current);
     }
     
-    frameAnalysisIntervalRef.current = setTimeout(() => {
-      captureAndAnalyzeFrame();
-    }, 5000);
+    frameAnalysisIntervalRef.current = setTimeout(async () => {
+      await captureAndAnalyzeFrame();
+      if (isBroadcastingRef.current) {
+        scheduleFrameAnalysis(frameIntervalMsRef.current);
+      }
+    }, delayMs);
   }, [captureAndAnalyzeFrame]);
 
+  const startFrameAnalysis = useCallback(() => {
+    frameIntervalMsRef.current = 5000;
+
+    const frameWs = new WebSocket(signalingConfig.framesWs(streamId));
+    frameWsRef.current = frameWs;
+
+    frameWs.onopen = () => {
+      frameWs.send(
+        JSON.stringify({
+          type: "location",
+          latitude: latitudeRef.current,
+          longitude: longitudeRef.current,
+        })
+      );
+    };
+
+    frameWs.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      switch (message.type) {
+        case "rate": {
+          const previous = frameIntervalMsRef.current;
+          frameIntervalMsRef.current = message.interval_ms;
+          console.log('[AI Sentry] Sampling every', message.interval_ms, 'ms:', message.reason);
+          // Don't sit out the rest of a long idle wait once the server wants frames faster
+          if (message.interval_ms < previous && frameAnalysisIntervalRef.current) {
+            scheduleFrameAnalysis(message.interval_ms);
+          }
+          break;
+        }
+        case "result":
+          logAnalysisResult(message);
+          break;
+        case "error":
+          console.error('[AI Sentry] Frame analysis error:', message.message);
+          break;
+        case "ping":
+          frameWs.send(JSON.stringify({ type: "pong" }));
+          break;
+      }
+    };
+
+    frameWs.onclose = () => {
+      // Remaining frames go over HTTP
+      if (frameWsRef.current === frameWs) {
+        frameWsRef.current = null;
+      }
+    };
+
+    // First frame at the 5 second mark, then at the interval the server asks for
+    scheduleFrameAnalysis(5000);
+  }, [streamId, scheduleFrameAnalysis]);
+
   const stopFrameAnalysis = useCallback(() => {
     if (frameAnalysisIntervalRef.current) {
       clearTimeout(frameAnalysisIntervalRef.current);
       frameAnalysisIntervalRef.current = null;
     }
+
+    if (frameWsRef.current) {
+      frameWsRef.current.close();
+      frameWsRef.current = null;
+    }
     
     if (videoElementRef.current) {
       videoElementRef.current.srcObject = null;
@@ -329,6 +404,25 @@ export function useBroadcaster({
           }
           break;
         }
+
+        case "ice_candidates": {
+          const batchPc = peerConnectionsRef.current.get(String(message.viewer_id));
+          if (batchPc && Array.isArray(message.candidates)) {
+            for (const candidate of message.candidates) {
+              try {
+                await batchPc.addIceCandidate(new RTCIceCandidate(candidate as RTCIceCandidateInit));
+              } catch (err) {
+                console.error("[Broadcaster] Failed to add ICE candidate:", err);
+              }
+            }
+          }
+          break;
+        }
+
+        case "ping":
+          // Server heartbeat; unanswered connections are closed as dead
+          wsRef.current?.send(JSON.stringify({ type: "pong" }));
+          break;
       }
     },
     [createPeerConnection]
@@ -478,6 +572,16 @@ export function useBroadcaster({
         })
       );
     }
+    // The frame socket may be served by a different backend worker
+    if (frameWsRef.current?.readyState === WebSocket.OPEN) {
+      frameWsRef.current.send(
+        JSON.stringify({
+          type: "location",
+          latitude: lat,
+          longitude: lng,
+        })
+      );
+    }
   }, []);
 
   // Cleanup on unmount
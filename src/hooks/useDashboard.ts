@@ -20,18 +20,69 @@ export interface PastStreamInfo {
   duration_seconds: number;
   video_filename: string;
   video_url: string;
+  thumbnail_url?: string | null;
+  pinned?: boolean;
 }
 
 export interface ThreatAlert {
+  alert_id?: string;
   stream_id: string;
   latitude: number;
   longitude: number;
   threat_type: string;
+  // When the alert opened
   timestamp: string;
+  nearby_stream_ids?: string[];
+  detection_types?: string[];
+  detections?: number;
+  updated_at?: string;
+  closed_at?: string | null;
+}
+
+function toThreatAlert(message: Record<string, unknown>): ThreatAlert {
+  return {
+    alert_id: message.alert_id as string | undefined,
+    stream_id: message.stream_id as string,
+    latitude: message.latitude as number,
+    longitude: message.longitude as number,
+    threat_type: message.threat_type as string,
+    timestamp: message.timestamp as string,
+    nearby_stream_ids: message.nearby_stream_ids as string[] | undefined,
+    detection_types: message.detection_types as string[] | undefined,
+    detections: message.detections as number | undefined,
+    updated_at: message.updated_at as string | undefined,
+    closed_at: message.closed_at as string | null | undefined,
+  };
+}
+
+type StreamKind = "active" | "past";
+
+function upsertById<T extends { id: string }>(list: T[], item: T): T[] {
+  const index = list.findIndex((s) => s.id === item.id);
+  if (index === -1) return [...list, item];
+  const next = list.slice();
+  next[index] = item;
+  return next;
+}
+
+// Limits what the server sends; fields left out are not filtered on
+export interface DashboardSubscription {
+  // [min_lng, min_lat, max_lng, max_lat]
+  region?: [number, number, number, number];
+  stream_ids?: string[];
+  alert_types?: ("gun" | "suspect")[];
+  include_past?: boolean;
 }
 
 interface UseDashboardOptions {
+  // Sent on every (re)connect; stream lists and alerts outside it are not delivered
+  subscription?: DashboardSubscription;
+  // A new alert opened (repeat detections arrive through onAlertUpdated)
   onAlert?: (alert: ThreatAlert) => void;
+  onAlertUpdated?: (alert: ThreatAlert) => void;
+  onAlertClosed?: (alert: ThreatAlert) => void;
+  // Alerts from GET /alerts/recent after each (re)connect, newest first
+  onRecentAlerts?: (alerts: ThreatAlert[]) => void;
 }
 
 interface UseDashboardReturn {
@@ -40,10 +91,11 @@ interface UseDashboardReturn {
   isConnected: boolean;
   error: string | null;
   deletePastStream: (streamId: string) => Promise<void>;
+  setPastStreamPinned: (streamId: string, pinned: boolean) => Promise<void>;
 }
 
 export function useDashboard(options?: UseDashboardOptions): UseDashboardReturn {
-  const { onAlert } = options || {};
+  const { onAlert, onAlertUpdated, onAlertClosed, onRecentAlerts, subscription } = options || {};
   const [streams, setStreams] = useState<StreamInfo[]>([]);
   const [pastStreams, setPastStreams] = useState<PastStreamInfo[]>([]);
   const [isConnected, setIsConnected] = useState(false);
@@ -51,11 +103,35 @@ export function useDashboard(options?: UseDashboardOptions): UseDashboardReturn
   const wsRef = useRef<WebSocket | null>(null);
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
   const onAlertRef = useRef(onAlert);
+  const onAlertUpdatedRef = useRef(onAlertUpdated);
+  const onAlertClosedRef = useRef(onAlertClosed);
+  const onRecentAlertsRef = useRef(onRecentAlerts);
+  const seqRef = useRef<number | null>(null);
+  // Filtered stream lists skip sequence numbers; the server resends a snapshot if it drops anything
+  const filteredRef = useRef(false);
+  const subscriptionRef = useRef(subscription);
   
   // Keep ref updated
   useEffect(() => {
     onAlertRef.current = onAlert;
-  }, [onAlert]);
+    onAlertUpdatedRef.current = onAlertUpdated;
+    onAlertClosedRef.current = onAlertClosed;
+    onRecentAlertsRef.current = onRecentAlerts;
+  }, [onAlert, onAlertUpdated, onAlertClosed, onRecentAlerts]);
+
+  // Replace the filter on an open connection when it changes
+  useEffect(() => {
+    const previous = subscriptionRef.current;
+    subscriptionRef.current = subscription;
+    const ws = wsRef.current;
+    if (ws?.readyState !== WebSocket.OPEN || JSON.stringify(previous ?? null) === JSON.stringify(subscription ?? null)) {
+      return;
+    }
+    ws.send(JSON.stringify({ type: "unsubscribe" }));
+    if (subscription) {
+      ws.send(JSON.stringify({ type: "subscribe", ...subscription }));
+    }
+  }, [subscription]);
 
   const connect = useCallback(() => {
     // Don't create new connection if already open or connecting
@@ -69,27 +145,82 @@ export function useDashboard(options?: UseDashboardOptions): UseDashboardReturn
 
       ws.onopen = () => {
         console.log("[Dashboard] Connected to signaling server");
+        seqRef.current = null;
+        filteredRef.current = false;
+        if (subscriptionRef.current) {
+          ws.send(JSON.stringify({ type: "subscribe", ...subscriptionRef.current }));
+        }
         setIsConnected(true);
         setError(null);
+        // Catch up on alerts opened or closed while disconnected
+        if (onRecentAlertsRef.current) {
+          fetch(signalingConfig.recentAlertsUrl)
+            .then((response) => (response.ok ? response.json() : Promise.reject(response.status)))
+            .then((data) => onRecentAlertsRef.current?.((data.alerts || []).map(toThreatAlert)))
+            .catch((err) => console.warn("[Dashboard] Failed to load recent alerts:", err));
+        }
       };
 
       ws.onmessage = (event) => {
         try {
           const message = JSON.parse(event.data);
           if (message.type === "stream_list") {
+            seqRef.current = message.seq ?? null;
+            filteredRef.current = Boolean(message.filter);
             setStreams(message.streams || []);
             setPastStreams(message.past_streams || []);
-          } else if (message.type === "alert") {
-            // Handle threat alert from AI Sentry
-            if (onAlertRef.current) {
-              onAlertRef.current({
-                stream_id: message.stream_id,
-                latitude: message.latitude,
-                longitude: message.longitude,
-                threat_type: message.threat_type,
-                timestamp: message.timestamp,
-              });
+          } else if (
+            message.type === "stream_added" ||
+            message.type === "stream_updated" ||
+            message.type === "stream_removed" ||
+            message.type === "stream_positions"
+          ) {
+            if (seqRef.current === null || message.seq <= seqRef.current) {
+              return;
+            }
+            if (!filteredRef.current && message.seq !== seqRef.current + 1) {
+              // Missed an update; ask the server for a full snapshot
+              console.warn("[Dashboard] Sequence gap, requesting resync");
+              seqRef.current = null;
+              ws.send(JSON.stringify({ type: "resync" }));
+              return;
             }
+            seqRef.current = message.seq;
+            const kind = message.kind as StreamKind;
+            if (message.type === "stream_positions") {
+              const positions = new Map<string, { latitude: number; longitude: number }>(
+                (message.positions || []).map((p: { id: string; latitude: number; longitude: number }) => [p.id, p])
+              );
+              setStreams((prev) =>
+                prev.map((s) => {
+                  const p = positions.get(s.id);
+                  return p ? { ...s, latitude: p.latitude, longitude: p.longitude } : s;
+                })
+              );
+            } else if (message.type === "stream_removed") {
+              const removed = new Set<string>(message.ids || []);
+              if (kind === "active") {
+                setStreams((prev) => prev.filter((s) => !removed.has(s.id)));
+              } else {
+                setPastStreams((prev) => prev.filter((s) => !removed.has(s.id)));
+              }
+            } else if (kind === "active") {
+              setStreams((prev) => upsertById(prev, message.stream as StreamInfo));
+            } else {
+              setPastStreams((prev) => upsertById(prev, message.stream as PastStreamInfo));
+            }
+          } else if (message.type === "alert_opened" || message.type === "alert") {
+            // Handle threat alert from AI Sentry
+            onAlertRef.current?.(toThreatAlert(message));
+          } else if (message.type === "alert_updated") {
+            onAlertUpdatedRef.current?.(toThreatAlert(message));
+          } else if (message.type === "alert_closed") {
+            onAlertClosedRef.current?.(toThreatAlert(message));
+          } else if (message.type === "ping") {
+            // Server heartbeat; unanswered connections are closed as dead
+            ws.send(JSON.stringify({ type: "pong" }));
+          } else if (message.type === "error") {
+            console.warn("[Dashboard] Server error:", message.message);
           }
         } catch (err) {
           console.error("[Dashboard] Failed to parse message:", err, "Data:", event.data);
@@ -129,6 +260,16 @@ export function useDashboard(options?: UseDashboardOptions): UseDashboardReturn
     }
   }, []);
 
+  const setPastStreamPinned = useCallback(async (streamId: string, pinned: boolean) => {
+    // Pinned recordings are exempt from retention; the change arrives as a stream_updated delta
+    const response = await fetch(`${signalingConfig.pastStreamsUrl}/${streamId}/pin`, {
+      method: pinned ? "POST" : "DELETE",
+    });
+    if (!response.ok) {
+      throw new Error("Failed to update pin");
+    }
+  }, []);
+
   useEffect(() => {
     connect();
 
@@ -148,5 +289,6 @@ export function useDashboard(options?: UseDashboardOptions): UseDashboardReturn
     isConnected,
     error,
     deletePastStream,
+    setPastStreamPinned,
   };
 }
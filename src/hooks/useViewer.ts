@@ -100,6 +100,18 @@ export function useViewer({
           }
           break;
 
+        case "ice_candidates":
+          if (pcRef.current && Array.isArray(message.candidates)) {
+            for (const candidate of message.candidates) {
+              try {
+                await pcRef.current.addIceCandidate(new RTCIceCandidate(candidate));
+              } catch (err) {
+                console.error("[Viewer] Failed to add ICE candidate:", err);
+              }
+            }
+          }
+          break;
+
         case "stream_ended":
           console.log("[Viewer] Stream ended");
           setIsReceiving(false);
@@ -111,6 +123,11 @@ export function useViewer({
           console.error("[Viewer] Error:", message.message);
           setError(message.message);
           break;
+
+        case "ping":
+          // Server heartbeat; unanswered connections are closed as dead
+          wsRef.current?.send(JSON.stringify({ type: "pong" }));
+          break;
       }
     },
     [onStreamReady, onStreamEnded]
@@ -21,11 +21,15 @@ const HTTP_BASE = SIGNALING_SERVER.replace("ws://", "http://").replace("wss://",
 
 export const signalingConfig = {
   dashboardWs: `${SIGNALING_SERVER}/ws/dashboard`,
-  broadcastWs: (streamId: string) => `${SIGNALING_SERVER}/ws/broadcast/${streamId}`,
-  viewWs: (streamId: string) => `${SIGNALING_SERVER}/ws/view/${streamId}`,
+  // ice_batch=1: the server may group trickle ICE candidates into one "ice_candidates" message
+  broadcastWs: (streamId: string) => `${SIGNALING_SERVER}/ws/broadcast/${streamId}?ice_batch=1`,
+  viewWs: (streamId: string) => `${SIGNALING_SERVER}/ws/view/${streamId}?ice_batch=1`,
+  // Binary JPEG frames in, "rate" and "result" messages out
+  framesWs: (streamId: string) => `${SIGNALING_SERVER}/ws/frames/${streamId}`,
   httpBase: HTTP_BASE,
   uploadUrl: `${HTTP_BASE}/upload-recording`,
   pastStreamsUrl: `${HTTP_BASE}/past-streams`,
+  recentAlertsUrl: `${HTTP_BASE}/alerts/recent`,
   recordingsBaseUrl: `${HTTP_BASE}/recordings`,
 };
 
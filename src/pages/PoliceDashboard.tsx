@@ -50,6 +50,7 @@ import { PastStreamViewer } from "@/components/PastStreamViewer";
 import { StreamMapView } from "@/components/StreamMapView";
 import { useDashboard, type StreamInfo, type PastStreamInfo, type ThreatAlert } from "@/hooks/useDashboard";
 import { useAuth } from "@/contexts/AuthContext";
+import { signalingConfig } from "@/lib/signalingConfig";
 
 // Convert server stream info to StreamData format
 function serverToStreamData(info: StreamInfo): StreamData {
@@ -138,6 +139,22 @@ export default function PoliceDashboard() {
     }
   }, []);
 
+  // Repeat detections and closes update the alert already listed
+  const handleAlertChanged = useCallback((alert: ThreatAlert) => {
+    setAlerts((prev) => prev.map((a) => (a.alert_id && a.alert_id === alert.alert_id ? { ...a, ...alert } : a)));
+  }, []);
+
+  // After a reconnect, list open alerts we missed and refresh the ones we have
+  const handleRecentAlerts = useCallback((recent: ThreatAlert[]) => {
+    setAlerts((prev) => {
+      const byId = new Map(recent.map((a) => [a.alert_id, a]));
+      const known = new Set(prev.map((a) => a.alert_id));
+      const updated = prev.map((a) => (a.alert_id && byId.has(a.alert_id) ? { ...a, ...byId.get(a.alert_id) } : a));
+      const missed = recent.filter((a) => !a.closed_at && !known.has(a.alert_id));
+      return [...missed, ...updated];
+    });
+  }, []);
+
   // Dismiss a single alert
   const dismissAlert = useCallback((alertTimestamp: string) => {
     setAlerts((prev) => prev.filter((a) => a.timestamp !== alertTimestamp));
@@ -149,8 +166,11 @@ export default function PoliceDashboard() {
   }, []);
 
   // Connect to signaling server with alert handler
-  const { streams: serverStreams, pastStreams, isConnected, deletePastStream } = useDashboard({
+  const { streams: serverStreams, pastStreams, isConnected, deletePastStream, setPastStreamPinned } = useDashboard({
     onAlert: handleThreatAlert,
+    onAlertUpdated: handleAlertChanged,
+    onAlertClosed: handleAlertChanged,
+    onRecentAlerts: handleRecentAlerts,
   });
 
   const handleLogout = () => {
@@ -579,8 +599,16 @@ export default function PoliceDashboard() {
                   onClick={() => setSelectedPastStream(stream)}
                 >
                   <CardContent className="p-0">
-                    {/* Thumbnail placeholder */}
+                    {/* Thumbnail (placeholder until the poster is rendered) */}
                     <div className="relative aspect-video bg-[hsl(240,15%,8%)] flex items-center justify-center">
+                      {stream.thumbnail_url && (
+                        <img
+                          src={`${signalingConfig.httpBase}${stream.thumbnail_url}`}
+                          alt=""
+                          loading="lazy"
+                          className="absolute inset-0 h-full w-full object-cover"
+                        />
+                      )}
                       <div className="absolute inset-0 flex items-center justify-center bg-[hsl(240,15%,5%)]/80 group-hover:bg-[hsl(240,15%,5%)]/60 transition-colors">
                         <div className="flex h-12 w-12 items-center justify-center rounded-full bg-[hsl(190,100%,50%)]/15 border border-[hsl(190,100%,50%)]/30 group-hover:bg-[hsl(190,100%,50%)]/25 transition-colors">
                           <Play className="h-5 w-5 text-[hsl(190,100%,50%)]" />
@@ -664,6 +692,12 @@ export default function PoliceDashboard() {
           stream={selectedPastStream}
           onClose={() => setSelectedPastStream(null)}
           onDelete={() => setStreamToDelete(selectedPastStream)}
+          onTogglePin={() => {
+            const pinned = !selectedPastStream.pinned;
+            setPastStreamPinned(selectedPastStream.id, pinned)
+              .then(() => setSelectedPastStream({ ...selectedPastStream, pinned }))
+              .catch((err) => console.error("[Dashboard] Failed to update pin:", err));
+          }}
         />
       )}
 
@@ -771,12 +805,17 @@ export default function PoliceDashboard() {
                   </div>
                   <div className="flex-1 min-w-0">
                     <div className="flex items-center justify-between gap-2">
-                      <span className="text-xs font-bold text-[hsl(350,100%,65%)] uppercase tracking-wide">🚨 Threat</span>
+                      <span className="text-xs font-bold text-[hsl(350,100%,65%)] uppercase tracking-wide">
+                        {alert.closed_at ? "Cleared" : "🚨 Threat"}
+                      </span>
                       <span className="text-[10px] text-[hsl(220,15%,55%)] font-mono bg-[hsl(240,15%,8%)] px-1.5 py-0.5 rounded">
                         {formatAlertTime(alert.timestamp)}
                       </span>
                     </div>
-                    <p className="text-sm text-white mt-1 font-medium">{alert.threat_type}</p>
+                    <p className="text-sm text-white mt-1 font-medium">
+                      {alert.threat_type}
+                      {alert.detections && alert.detections > 1 ? ` ×${alert.detections}` : ""}
+                    </p>
                   </div>
                 </div>
 